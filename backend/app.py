@@ -6,12 +6,17 @@ from dotenv import load_dotenv
 # サービスのインポート
 from services.auth_service import initialize_firebase
 from services.db_service import init_db, db
+from services.search_service import library_search
+from services.related_service import related_videos
 
 # コントローラー（Blueprint）のインポート
 from controllers.main_controller import main_bp
 from controllers.auth_controller import auth_bp
 from controllers.youtube_controller import youtube_bp
 from controllers.subscription_controller import subscription_bp
+from controllers.library_controller import library_bp
+from controllers.admin_controller import admin_bp
+from controllers.history_controller import history_bp
 
 # 環境変数の読み込み
 load_dotenv()
@@ -35,11 +40,18 @@ app.register_blueprint(main_bp)
 app.register_blueprint(youtube_bp)
 app.register_blueprint(auth_bp)
 app.register_blueprint(subscription_bp)
+app.register_blueprint(library_bp)
+app.register_blueprint(admin_bp)
+app.register_blueprint(history_bp)
 
 # データベーステーブルの作成
 with app.app_context():
     db.create_all()
 
+# ライブラリ検索・関連ビデオのインデックスをバックグラウンドで構築
+library_search.start(app)
+related_videos.start(app)
+
 if __name__ == '__main__':
     # Flaskアプリを実行
     app.run(debug=True)
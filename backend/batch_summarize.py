@@ -0,0 +1,274 @@
+"""
+オフライン一括要約スクリプト
+
+ファイル・再生リスト・チャンネルからビデオIDを読み込み、プロセスプールで要約を生成します。
+完了したビデオはチェックポイントファイルに記録されるため、中断しても同じコマンドで再開できます。
+結果はJSONLとして逐次書き出すか、要約ストア（データベース）に直接保存します。
+
+使い方:
+    python batch_summarize.py --ids-file ids.txt --output summaries.jsonl
+    python batch_summarize.py --channel UC_x5XG1OV2P6uZZ5FSM9Ttw --workers 8 --rate-limit 60 --store
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from dotenv import load_dotenv
+
+from services.youtube_service import YouTubeService
+from services.gemini_service import GeminiService
+
+# URLからビデオIDを抽出するパターン
+_VIDEO_ID_RE = re.compile(r'(?:v=|youtu\.be/|shorts/)([A-Za-z0-9_-]{11})')
+
+# ワーカープロセスごとのサービスインスタンス
+_worker = {}
+
+
+def parse_video_id(line):
+    """ビデオIDまたはYouTubeのURLからビデオIDを取り出します。"""
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return None
+    match = _VIDEO_ID_RE.search(line)
+    return match.group(1) if match else line
+
+
+def create_store_app():
+    """要約ストアに保存するための最小限のFlaskアプリケーションを作成します。"""
+    from flask import Flask
+    from services.db_service import init_db, db
+
+    app = Flask('batch_summarize')
+    init_db(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _init_worker(api_key, store):
+    """ワーカープロセスでサービスを初期化します。"""
+    transcript_cache = None
+    if store:
+        from services.store_service import TranscriptCache
+
+        # プロセスの存続期間中アプリケーションコンテキストを保持する
+        app = create_store_app()
+        app.app_context().push()
+        transcript_cache = TranscriptCache()
+
+    _worker['youtube'] = YouTubeService(api_key, transcript_cache=transcript_cache)
+    _worker['gemini'] = GeminiService()
+    _worker['store'] = store
+
+
+def _summarize(video_id, format_type):
+    """ワーカープロセスで1件のビデオを要約します。"""
+    started = time.monotonic()
+    try:
+        summary = _worker['gemini'].generate_summary(video_id, _worker['youtube'], format_type=format_type)
+    except Exception as e:
+        return {'video_id': video_id, 'status': 'error', 'error': str(e), 'elapsed': time.monotonic() - started}
+
+    if 'error' in summary:
+        return {'video_id': video_id, 'status': 'error', 'error': summary['error'], 'elapsed': time.monotonic() - started}
+
+    if _worker['store']:
+        from services.store_service import save_summary
+        # 保存に失敗したビデオは完了として記録せず、再開時に処理し直す
+        if save_summary(video_id, summary, format_type=format_type) is None:
+            return {'video_id': video_id, 'status': 'error', 'error': '要約の保存に失敗しました',
+                    'elapsed': time.monotonic() - started}
+
+    return {'video_id': video_id, 'status': 'ok', 'summary': summary, 'elapsed': time.monotonic() - started}
+
+
+class RateLimiter:
+    """1分あたりのリクエスト数を制限する単純なレートリミッター"""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if now < self._next:
+            time.sleep(self._next - now)
+        self._next = max(now, self._next) + self.interval
+
+
+def load_checkpoint(path):
+    """チェックポイントファイルから完了済みのビデオIDを読み込みます。"""
+    completed = set()
+    if not os.path.exists(path):
+        return completed
+
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # 中断時に途中まで書かれた行は無視する
+                continue
+            if entry.get('status') == 'ok':
+                completed.add(entry['video_id'])
+    return completed
+
+
+def collect_video_ids(args, youtube_service):
+    """コマンドライン引数で指定された入力元からビデオIDを集めます（重複は除外）。"""
+    video_ids = []
+
+    if args.ids_file:
+        with open(args.ids_file, encoding='utf-8') as f:
+            video_ids.extend(video_id for video_id in map(parse_video_id, f) if video_id)
+
+    if args.playlist:
+        video_ids.extend(youtube_service.get_playlist_video_ids(args.playlist, max_results=args.limit))
+
+    if args.channel:
+        uploads = youtube_service.get_channel_uploads_playlist_id(args.channel)
+        if not uploads:
+            raise SystemExit(f'エラー: チャンネルが見つかりません: {args.channel}')
+        video_ids.extend(youtube_service.get_playlist_video_ids(uploads, max_results=args.limit))
+
+    video_ids = list(dict.fromkeys(video_ids))
+    return video_ids[:args.limit] if args.limit else video_ids
+
+
+def print_report(stats, elapsed, usd_per_million_tokens):
+    """スループットとコストのレポートを標準エラー出力に表示します。"""
+    processed = stats['ok'] + stats['error']
+    tokens = sum(stats['tokens_by_model'].values())
+
+    print('\n=== 一括要約レポート ===', file=sys.stderr)
+    print(f'対象: {stats["total"]}件 (チェックポイントによりスキップ: {stats["skipped"]}件)', file=sys.stderr)
+    print(f'成功: {stats["ok"]}件 / 失敗: {stats["error"]}件', file=sys.stderr)
+    print(f'経過時間: {elapsed:.1f}秒', file=sys.stderr)
+    if processed and elapsed > 0:
+        print(f'スループット: {processed / elapsed * 60:.1f}件/分', file=sys.stderr)
+    if processed:
+        print(f'平均処理時間: {stats["busy_seconds"] / processed:.1f}秒/件', file=sys.stderr)
+    print(f'トークン使用量: {tokens}', file=sys.stderr)
+    for model_id, model_tokens in stats['tokens_by_model'].most_common():
+        print(f'  {model_id}: {model_tokens}', file=sys.stderr)
+    if usd_per_million_tokens is not None:
+        print(f'推定コスト: ${tokens / 1_000_000 * usd_per_million_tokens:.2f}', file=sys.stderr)
+    if stats['errors']:
+        print('失敗したビデオ:', file=sys.stderr)
+        for video_id, error in stats['errors'][:20]:
+            print(f'  {video_id}: {error}', file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YouTubeビデオの要約を一括生成します')
+    parser.add_argument('--ids-file', help='ビデオIDまたはURLを1行に1件記載したファイル')
+    parser.add_argument('--playlist', help='再生リストID')
+    parser.add_argument('--channel', help='チャンネルID（アップロード済みの全ビデオが対象）')
+    parser.add_argument('--limit', type=int, help='処理するビデオ数の上限')
+    parser.add_argument('--format', dest='format_type', choices=['json', 'markdown'], default='json',
+                        help='要約のフォーマット（デフォルト: json）')
+    parser.add_argument('--workers', type=int, default=4, help='ワーカープロセス数（デフォルト: 4）')
+    parser.add_argument('--rate-limit', type=float, default=30,
+                        help='1分あたりの最大要約リクエスト数（0で無制限、デフォルト: 30）')
+    parser.add_argument('--output', help='結果を書き出すJSONLファイル（"-"で標準出力）')
+    parser.add_argument('--store', action='store_true', help='結果を要約ストア（データベース）に保存する')
+    parser.add_argument('--checkpoint', help='チェックポイントファイル（デフォルト: 出力ファイル名.checkpoint）')
+    parser.add_argument('--usd-per-million-tokens', type=float, help='推定コストの計算に使う100万トークンあたりの単価')
+    args = parser.parse_args()
+
+    if not (args.ids_file or args.playlist or args.channel):
+        parser.error('--ids-file、--playlist、--channelのいずれかを指定してください')
+    if not (args.output or args.store):
+        parser.error('--outputまたは--storeを指定してください')
+
+    load_dotenv()
+    api_key = os.getenv('YOUTUBE_API_KEY')
+
+    checkpoint_path = args.checkpoint or (
+        f'{args.output}.checkpoint' if args.output and args.output != '-' else 'batch_summarize.checkpoint'
+    )
+    completed = load_checkpoint(checkpoint_path)
+
+    video_ids = collect_video_ids(args, YouTubeService(api_key))
+    todo = [video_id for video_id in video_ids if video_id not in completed]
+
+    stats = {
+        'total': len(video_ids),
+        'skipped': len(video_ids) - len(todo),
+        'ok': 0,
+        'error': 0,
+        'busy_seconds': 0.0,
+        'tokens_by_model': Counter(),
+        'errors': []
+    }
+    print(f'{len(todo)}件のビデオを処理します（完了済み: {stats["skipped"]}件）', file=sys.stderr)
+
+    output = None
+    if args.output == '-':
+        output = sys.stdout
+    elif args.output:
+        output = open(args.output, 'a', encoding='utf-8')
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+
+    limiter = RateLimiter(args.rate_limit)
+    started = time.monotonic()
+    remaining = iter(todo)
+
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker,
+                                 initargs=(api_key, args.store)) as pool:
+            pending = set()
+            exhausted = False
+            while True:
+                # 実行中のジョブがワーカー数を超えないようにレート制限しながら投入
+                while not exhausted and len(pending) < args.workers:
+                    video_id = next(remaining, None)
+                    if video_id is None:
+                        exhausted = True
+                        break
+                    limiter.wait()
+                    pending.add(pool.submit(_summarize, video_id, args.format_type))
+
+                if not pending:
+                    break
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    stats[result['status']] += 1
+                    stats['busy_seconds'] += result['elapsed']
+
+                    if result['status'] == 'ok':
+                        summary = result['summary']
+                        stats['tokens_by_model'][summary.get('model_id', 'unknown')] += summary.get('token_count') or 0
+                        if output:
+                            output.write(json.dumps(summary, ensure_ascii=False) + '\n')
+                            output.flush()
+                    else:
+                        stats['errors'].append((result['video_id'], result['error']))
+
+                    checkpoint.write(json.dumps({
+                        'video_id': result['video_id'],
+                        'status': result['status']
+                    }) + '\n')
+                    checkpoint.flush()
+
+                    print(f'[{stats["ok"] + stats["error"]}/{len(todo)}] {result["video_id"]}: {result["status"]}',
+                          file=sys.stderr)
+    except KeyboardInterrupt:
+        print('\n中断しました。同じコマンドを再実行すると続きから再開します。', file=sys.stderr)
+    finally:
+        checkpoint.close()
+        if output and output is not sys.stdout:
+            output.close()
+        print_report(stats, time.monotonic() - started, args.usd_per_million_tokens)
+
+
+if __name__ == '__main__':
+    main()
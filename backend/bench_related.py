@@ -0,0 +1,75 @@
+"""
+関連ビデオインデックス（TfidfIndex）のベンチマークスクリプト
+
+合成したトランスクリプトのトークン列で10k件と100k件のインデックスを構築し、
+インデックス構築時間とtop-kクエリのレイテンシを計測します。
+
+使い方:
+    python bench_related.py [ドキュメント数 ...]
+"""
+import sys
+import time
+
+import numpy as np
+
+from services.related_service import TfidfIndex
+
+# 合成コーパスの設定
+VOCABULARY_SIZE = 50000
+TOKENS_PER_DOC = 1500
+QUERY_COUNT = 200
+TOP_K = 10
+
+
+def synthetic_documents(doc_count, seed=0):
+    """Zipf分布に従う語彙からトークン列を生成します。"""
+    rng = np.random.default_rng(seed)
+    vocabulary = np.array([f't{i}' for i in range(VOCABULARY_SIZE)])
+    for i in range(doc_count):
+        ranks = rng.zipf(1.2, size=TOKENS_PER_DOC) % VOCABULARY_SIZE
+        yield f'video{i}', vocabulary[ranks].tolist()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+def run(doc_count):
+    index = TfidfIndex()
+
+    started = time.perf_counter()
+    for doc_id, tokens in synthetic_documents(doc_count):
+        index.add_tokens(doc_id, tokens)
+    index.most_similar('video0', k=TOP_K)  # 行列の結合と重み付けを含める
+    build_seconds = time.perf_counter() - started
+
+    rng = np.random.default_rng(1)
+    query_ids = [f'video{i}' for i in rng.integers(0, doc_count, size=QUERY_COUNT)]
+
+    latencies = []
+    for doc_id in query_ids:
+        started = time.perf_counter()
+        index.most_similar(doc_id, k=TOP_K)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    index.most_similar_many(query_ids[:32], k=TOP_K)
+    batch_seconds = time.perf_counter() - started
+
+    # 増分追加後の最初のクエリ（IDFと正規化の再計算を含む）
+    index.add_tokens('video_new', next(synthetic_documents(1, seed=2))[1])
+    started = time.perf_counter()
+    index.most_similar('video_new', k=TOP_K)
+    incremental_seconds = time.perf_counter() - started
+
+    print(f'ドキュメント数: {doc_count}')
+    print(f'  構築時間: {build_seconds:.1f}秒 (非ゼロ要素数: {index._matrix.nnz})')
+    print(f'  単一クエリ p50: {percentile(latencies, 50):.2f}ms / p95: {percentile(latencies, 95):.2f}ms')
+    print(f'  32件バッチクエリ: {batch_seconds * 1000:.2f}ms ({batch_seconds * 1000 / 32:.2f}ms/件)')
+    print(f'  増分追加後の初回クエリ: {incremental_seconds * 1000:.2f}ms')
+
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    for size in sizes:
+        run(size)
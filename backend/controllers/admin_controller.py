@@ -0,0 +1,89 @@
+from flask import Blueprint, Response, request, jsonify
+from services.auth_service import admin_required
+from services.db_service import get_pool_stats
+from services.scheduler_service import summary_scheduler
+from services.admission_service import get_admission_stats
+from services.circuit_breaker import get_circuit_stats
+from services.search_page_service import search_pager
+from services.transcript_prefetch_service import transcript_prefetcher
+from services.profiling_service import profiler, collapsed_stacks
+from services.context_cache_service import context_cache_registry
+
+# Blueprintを作成
+admin_bp = Blueprint('admin_bp', __name__, url_prefix='/api/admin')
+
+@admin_bp.route('/metrics', methods=['GET'])
+@admin_required
+def get_metrics():
+    """
+    運用メトリクスを返します。
+    このエンドポイントはadmin_requiredデコレータで保護されています。
+    
+    戻り値:
+    - データベースのコネクションプール統計、要約キューの状態、
+      ルートクラスごとのキューの深さと拒否数、上流サービスごとのサーキットの状態、
+      検索結果とトランスクリプトの先読みのヒット率、プロファイラーとコンテキストキャッシュの状態を含むJSONレスポンス
+    """
+    try:
+        return jsonify({
+            'db_pool': get_pool_stats(),
+            'summary_scheduler': summary_scheduler.snapshot(),
+            'admission': get_admission_stats(),
+            'circuits': get_circuit_stats(),
+            'search_prefetch': search_pager.snapshot(),
+            'transcript_prefetch': transcript_prefetcher.snapshot(),
+            'profiler': profiler.snapshot(),
+            'context_cache': context_cache_registry.snapshot()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'メトリクス取得エラー: {str(e)}'}), 500
+
+@admin_bp.route('/profiles', methods=['GET'])
+@admin_required
+def list_profiles():
+    """
+    保存しているリクエストのプロファイルの一覧を新しい順に返します。
+    
+    クエリパラメータ:
+    - endpoint: エンドポイント名で絞り込む（オプション、例: "youtube_bp.summarize_video"）
+    
+    戻り値:
+    - プロファイラーの状態と、各プロファイルの経過時間・CPU時間・待ち時間の内訳を含むJSONレスポンス
+    """
+    profiles = profiler.list_profiles(endpoint=request.args.get('endpoint'))
+    return jsonify({
+        'profiler': profiler.snapshot(),
+        'profiles': [profile.to_dict() for profile in profiles]
+    })
+
+@admin_bp.route('/profiles/collapsed', methods=['GET'])
+@admin_required
+def get_collapsed_profiles():
+    """
+    保存しているプロファイルのスタックをまとめて折りたたみ形式で返します。
+    flamegraph.plやspeedscopeにそのまま読み込めます。
+    
+    クエリパラメータ:
+    - endpoint: エンドポイント名で絞り込む（オプション）
+    """
+    profiles = profiler.list_profiles(endpoint=request.args.get('endpoint'))
+    return Response(collapsed_stacks(profiles), mimetype='text/plain')
+
+@admin_bp.route('/profiles/<int:profile_id>', methods=['GET'])
+@admin_required
+def get_profile(profile_id):
+    """
+    1件のプロファイルを返します。
+    
+    クエリパラメータ:
+    - format: "json"（デフォルト、待ち時間の内訳とサンプル数の多いスタック）または
+      "collapsed"（フレームグラフ用の折りたたみ形式のテキスト）
+    """
+    profile = profiler.get_profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'プロファイルが見つかりません'}), 404
+    
+    if request.args.get('format') == 'collapsed':
+        return Response(collapsed_stacks([profile]), mimetype='text/plain')
+    return jsonify(profile.to_dict(top_stacks=20))
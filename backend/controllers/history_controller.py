@@ -0,0 +1,152 @@
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from datetime import datetime, timedelta, timezone
+from services.admission_service import admission_controlled
+from services.auth_service import auth_required, get_user_id_from_token
+from services.history_service import InvalidCursorError, list_history, get_history_entry, iter_history_for_export
+from services.export_service import stream_ndjson, stream_markdown_zip
+
+# 1ページの最大件数の上限
+MAX_HISTORY_PAGE_SIZE = 100
+
+# Blueprintを作成
+history_bp = Blueprint('history_bp', __name__, url_prefix='/api/history')
+
+@history_bp.route('', methods=['GET'])
+@auth_required
+@admission_controlled('crud')
+def get_history():
+    """
+    ユーザーの要約履歴を新しい順に返します。
+    一覧にはMarkdown本文などは含まれません。全文は詳細エンドポイントで取得します。
+    
+    クエリパラメータ:
+    - limit: 1ページの件数（オプション、デフォルト: 20、最大: 100）
+    - cursor: 前のページのレスポンスのnext_cursor（オプション）
+    
+    戻り値:
+    - 履歴の一覧と次のページのカーソルを含むJSONレスポンス
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), MAX_HISTORY_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limitパラメータは整数である必要があります'}), 400
+    
+    try:
+        # トークンからユーザーIDを取得
+        user_id = get_user_id_from_token()
+        
+        return jsonify(list_history(user_id, limit=limit, cursor=request.args.get('cursor')))
+    
+    except InvalidCursorError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'要約履歴の取得に失敗しました: {str(e)}'}), 500
+
+@history_bp.route('/<int:history_id>', methods=['GET'])
+@auth_required
+@admission_controlled('crud')
+def get_history_detail(history_id):
+    """
+    要約履歴の1件を、Markdown本文を含む要約の全文とともに返します。
+    モデルは呼び出さず、保存済みの要約を返します。
+    
+    URLパラメータ:
+    - history_id: 履歴ID
+    
+    戻り値:
+    - 要約の全文を含むJSONレスポンス
+    """
+    try:
+        # トークンからユーザーIDを取得
+        user_id = get_user_id_from_token()
+        
+        entry = get_history_entry(user_id, history_id)
+        if not entry:
+            return jsonify({'error': '指定された履歴が見つかりません'}), 404
+        
+        return jsonify(entry.to_dict())
+    
+    except Exception as e:
+        return jsonify({'error': f'要約履歴の取得に失敗しました: {str(e)}'}), 500
+
+
+def _parse_date_param(name, end_of_range=False):
+    """
+    日付（YYYY-MM-DD）または日時（ISO 8601）のクエリパラメータを解析します。
+    範囲の終わりに日付のみが指定された場合は、その日の終わりまでを含めます。
+    タイムゾーン付きの日時は、created_atと比較できるようタイムゾーンなしのUTCに変換します。
+    
+    例外:
+    - ValueError: 形式が不正な場合
+    """
+    value = request.args.get(name)
+    if not value:
+        return None
+    
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name}パラメータはISO 8601形式の日付または日時である必要があります')
+    
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+@history_bp.route('/export', methods=['GET'])
+@auth_required
+@admission_controlled('export')
+def export_history():
+    """
+    ユーザーの要約履歴をストリーミングでエクスポートします。
+    データベースのサーバーサイドカーソルから1件ずつ書き出すため、件数が多くてもメモリ使用量は一定です。
+    
+    クエリパラメータ:
+    - format: "ndjson"（1行1件のJSON）または"zip"（Markdownファイルのzip）（オプション、デフォルト: "ndjson"）
+    - channel_id: チャンネルIDで絞り込む（オプション）
+    - since: この日付以降に記録された履歴に絞り込む（オプション、ISO 8601形式）
+    - until: この日付までに記録された履歴に絞り込む（オプション、ISO 8601形式）
+    - after: この履歴IDより後から再開する（オプション、中断したエクスポートの再開用）
+    
+    戻り値:
+    - NDJSONまたはZIPのストリーミングレスポンス（履歴IDの昇順）
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ['ndjson', 'zip']:
+        return jsonify({'error': 'formatパラメータは"ndjson"または"zip"である必要があります'}), 400
+    
+    try:
+        since = _parse_date_param('since')
+        until = _parse_date_param('until', end_of_range=True)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return jsonify({'error': 'afterパラメータは整数である必要があります'}), 400
+    
+    # トークンからユーザーIDを取得
+    user_id = get_user_id_from_token()
+    
+    rows = iter_history_for_export(
+        user_id,
+        channel_id=request.args.get('channel_id'),
+        since=since,
+        until=until,
+        after=after
+    )
+    
+    filename = f'summaries-{datetime.utcnow():%Y%m%d%H%M%S}'
+    if export_format == 'zip':
+        body, mimetype, filename = stream_markdown_zip(rows), 'application/zip', f'{filename}.zip'
+    else:
+        body, mimetype, filename = stream_ndjson(rows), 'application/x-ndjson', f'{filename}.ndjson'
+    
+    # レスポンスの送信中もデータベースセッションを使えるようリクエストコンテキストを保持する
+    response = Response(stream_with_context(body), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
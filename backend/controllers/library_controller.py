@@ -0,0 +1,114 @@
+from flask import Blueprint, request, jsonify
+import time
+from services.admission_service import admission_controlled
+from services.auth_service import auth_required
+from services.search_service import library_search
+from services.related_service import related_videos
+from services.index_sync_service import IndexLoadingError
+
+# 検索結果の最大件数の上限
+MAX_LIBRARY_RESULTS = 50
+
+# 関連ビデオの最大件数の上限
+MAX_RELATED_RESULTS = 20
+
+# Blueprintを作成
+library_bp = Blueprint('library_bp', __name__, url_prefix='/api/library')
+
+def _index_loading_response(error):
+    """
+    起動直後でインデックスを構築中の場合の503レスポンスを作成します。
+    """
+    response = jsonify({
+        'error': f'{error}。{error.retry_after}秒後に再試行してください',
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+@library_bp.route('/search', methods=['POST'])
+@auth_required
+@admission_controlled('search')
+def search_library():
+    """
+    保存済みの要約とトランスクリプトを全文検索します。
+    YouTube APIは呼び出さず、ローカルのインデックスのみを使用します。
+    
+    JSONボディパラメータ:
+    - q: 検索クエリ（必須、日本語可）
+    - limit: 返す結果の最大数（オプション、デフォルト: 10、最大: 50）
+    
+    戻り値:
+    - スコア順の検索結果とハイライト済みスニペットを含むJSONレスポンス
+    """
+    # リクエストボディからJSONデータを取得
+    data = request.get_json()
+    
+    # JSONからパラメータを抽出
+    query = data.get('q')
+    limit = data.get('limit', 10)
+    
+    # パラメータの検証
+    if not query:
+        return jsonify({'error': 'クエリパラメータ(q)がありません'}), 400
+    
+    try:
+        limit = max(1, min(int(limit), MAX_LIBRARY_RESULTS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'limitパラメータは整数である必要があります'}), 400
+    
+    try:
+        started = time.perf_counter()
+        results = library_search.search(query, limit=limit)
+        took_ms = (time.perf_counter() - started) * 1000
+        
+        return jsonify({
+            'query': query,
+            'count': len(results),
+            'took_ms': round(took_ms, 2),
+            'results': results
+        })
+    
+    except IndexLoadingError as e:
+        return _index_loading_response(e)
+    except Exception as e:
+        return jsonify({'error': f'ライブラリ検索エラー: {str(e)}'}), 500
+
+@library_bp.route('/related/<video_id>', methods=['GET'])
+@auth_required
+@admission_controlled('search')
+def get_related_videos(video_id):
+    """
+    キャッシュ済みトランスクリプトのTF-IDF類似度に基づいて関連ビデオを返します。
+    YouTube APIの検索は呼び出しません。
+    
+    URLパラメータ:
+    - video_id: 基準となるYouTubeビデオID
+    
+    クエリパラメータ:
+    - k: 返す結果の最大数（オプション、デフォルト: 5、最大: 20）
+    
+    戻り値:
+    - 類似度順の関連ビデオを含むJSONレスポンス
+    """
+    try:
+        k = max(1, min(int(request.args.get('k', 5)), MAX_RELATED_RESULTS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'kパラメータは整数である必要があります'}), 400
+    
+    try:
+        related = related_videos.related(video_id, k=k)
+        
+        if related is None:
+            return jsonify({'error': 'このビデオのトランスクリプトはまだ保存されていません'}), 404
+        
+        return jsonify({
+            'video_id': video_id,
+            'count': len(related),
+            'related': related
+        })
+    
+    except IndexLoadingError as e:
+        return _index_loading_response(e)
+    except Exception as e:
+        return jsonify({'error': f'関連ビデオ取得エラー: {str(e)}'}), 500
@@ -11,6 +11,14 @@ def index():
         'endpoints': {
             'search': '/api/search (JSONボディを持つPOST)',
             'summarize': '/api/summarize (JSONボディを持つPOST)',
+            'summarize_live': '/api/summarize/live (JSONボディを持つPOST)',
+            'ask': '/api/ask (JSONボディを持つPOST)',
+            'library_search': '/api/library/search (JSONボディを持つPOST)',
+            'related': '/api/library/related/<video_id> (GET)',
+            'history': '/api/history (GET)',
+            'history_detail': '/api/history/<history_id> (GET)',
+            'history_export': '/api/history/export (GET)',
+            'digest': '/api/subscriptions/<channel_id>/digest (GET)',
             'auth_verify': '/api/auth/verify (Authorizationヘッダーを持つPOST)'
         }
     })
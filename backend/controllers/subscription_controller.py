@@ -1,19 +1,39 @@
 from flask import Blueprint, request, jsonify
+from googleapiclient.errors import HttpError
+from services.admission_service import admission_controlled
+from services.profiling_service import profiled
+from services.circuit_breaker import CircuitOpenError, circuit_open_response
 from services.auth_service import auth_required, get_user_id_from_token
 from models.channel_subscription import ChannelSubscription
-from services.db_service import db
+from services.db_service import db, read_bind_arguments
+from sqlalchemy import select
 from services.youtube_service import YouTubeService
+from services.gemini_service import GeminiService
+from services.store_service import TranscriptCache, DEFAULT_SUMMARY_LANGUAGE, LANGUAGE_CODE_RE
+from services.digest_service import default_max_new_summaries, get_cached_digest, is_fresh, build_digest
+from services.scheduler_service import summary_scheduler, QueueTimeoutError
+from services.usage_service import BudgetExceededError, reserve_request, release_request, record_tokens
+from datetime import datetime, timedelta
 import os
 
 # 環境変数からYouTube APIキーを取得
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
-youtube_service = YouTubeService(YOUTUBE_API_KEY)
+# ダイジェストで要約を補う際にもトランスクリプトキャッシュを使う
+youtube_service = YouTubeService(YOUTUBE_API_KEY, transcript_cache=TranscriptCache())
+gemini_service = GeminiService()
+
+# ダイジェストの対象期間の日数の上限
+MAX_DIGEST_DAYS = 31
+
+# 1回のダイジェストで新たに要約するビデオ数の上限
+MAX_DIGEST_NEW_SUMMARIES = 10
 
 # Blueprintを作成
 subscription_bp = Blueprint('subscription_bp', __name__, url_prefix='/api')
 
 @subscription_bp.route('/subscriptions', methods=['GET'])
 @auth_required
+@admission_controlled('crud')
 def get_subscriptions():
     """
     ユーザーのチャンネル登録一覧を取得します。
@@ -25,8 +45,11 @@ def get_subscriptions():
         # トークンからユーザーIDを取得
         user_id = get_user_id_from_token()
         
-        # ユーザーのチャンネル登録を取得
-        subscriptions = ChannelSubscription.query.filter_by(user_id=user_id).all()
+        # ユーザーのチャンネル登録を取得（レプリカが設定されていればレプリカから読み取る）
+        subscriptions = db.session.scalars(
+            select(ChannelSubscription).filter_by(user_id=user_id),
+            bind_arguments=read_bind_arguments()
+        ).all()
         
         # 結果を辞書のリストに変換
         result = [subscription.to_dict() for subscription in subscriptions]
@@ -41,6 +64,7 @@ def get_subscriptions():
 
 @subscription_bp.route('/subscriptions', methods=['POST'])
 @auth_required
+@admission_controlled('crud')
 def subscribe_channel():
     """
     チャンネルを登録します。
@@ -69,7 +93,7 @@ def subscribe_channel():
         channel_info = youtube_service.get_channel_info(channel_id)
         
         if not channel_info:
-            return jsonify({'error': 'チャンネル情報の取得に失敗しました'}), 404
+            return jsonify({'error': 'チャンネルが見つかりません'}), 404
         
         # 既存の登録をチェック
         existing = ChannelSubscription.query.filter_by(
@@ -100,12 +124,17 @@ def subscribe_channel():
             'subscription': subscription.to_dict()
         }), 201
     
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
+    except HttpError as e:
+        return jsonify({'error': f'YouTube APIエラー: {str(e)}'}), 500
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'チャンネル登録に失敗しました: {str(e)}'}), 500
 
 @subscription_bp.route('/subscriptions/<channel_id>', methods=['DELETE'])
 @auth_required
+@admission_controlled('crud')
 def unsubscribe_channel(channel_id):
     """
     チャンネル登録を解除します。
@@ -141,3 +170,143 @@ def unsubscribe_channel(channel_id):
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'チャンネル登録解除に失敗しました: {str(e)}'}), 500
+
+def _digest_response(digest, subscription, uploads, since, **extra):
+    """ダイジェストとアップロードの一覧からレスポンスを作成します。"""
+    result = digest.to_dict()
+    summarized = set(result['summarized_video_ids'])
+    result.update({
+        'channel_title': subscription.channel_title,
+        'since': since.isoformat(),
+        'videos': [
+            {
+                'video_id': upload['video_id'],
+                'video_url': f"https://www.youtube.com/watch?v={upload['video_id']}",
+                'title': upload['title'],
+                'published_at': upload['published_at'],
+                'summarized': upload['video_id'] in summarized
+            }
+            for upload in uploads
+        ]
+    })
+    result.update(extra)
+    return result
+
+@subscription_bp.route('/subscriptions/<channel_id>/digest', methods=['GET'])
+@profiled
+@auth_required
+@admission_controlled('summarize')
+def get_channel_digest(channel_id):
+    """
+    登録したチャンネルが指定期間に公開したビデオのダイジェストを返します。
+    
+    保存済みのビデオ要約を1回のモデル呼び出しでまとめます。要約のないビデオは1回のリクエストにつき
+    max_new件まで要約して補い、残りはpending_video_idsとして返します（再度リクエストすると続きを補います）。
+    対象期間のアップロードが変わるまでは保存済みのダイジェストを返し、モデルは呼び出しません。
+    
+    URLパラメータ:
+    - channel_id: 登録済みのYouTubeチャンネルID
+    
+    クエリパラメータ:
+    - days: 対象期間の日数（オプション、デフォルト: 7、最大: 31）
+    - language: ダイジェストの言語コード（オプション、デフォルト: "ja"）
+    - max_new: 新たに要約するビデオ数の上限（オプション、デフォルト: DIGEST_MAX_NEW_SUMMARIES、最大: 10）
+    
+    戻り値:
+    - ダイジェストと対象期間のビデオ一覧を含むJSONレスポンス
+    """
+    language = request.args.get('language') or DEFAULT_SUMMARY_LANGUAGE
+    if not LANGUAGE_CODE_RE.match(language):
+        return jsonify({'error': 'languageパラメータは"ja"や"en"などの言語コードである必要があります'}), 400
+    
+    try:
+        days = max(1, min(int(request.args.get('days', 7)), MAX_DIGEST_DAYS))
+        max_new = max(0, min(int(request.args.get('max_new', default_max_new_summaries())), MAX_DIGEST_NEW_SUMMARIES))
+    except ValueError:
+        return jsonify({'error': 'daysとmax_newパラメータは整数である必要があります'}), 400
+    
+    # トークンからユーザーIDを取得
+    user_id = get_user_id_from_token()
+    
+    subscription = ChannelSubscription.query.filter_by(user_id=user_id, channel_id=channel_id).first()
+    if not subscription:
+        return jsonify({'error': 'チャンネル登録が見つかりません'}), 404
+    
+    since = datetime.utcnow() - timedelta(days=days)
+    uploads = []
+    previous = None
+    try:
+        # 対象期間のアップロードを取得（アップロード再生リストを使うため1ページ1ユニット）
+        uploads = youtube_service.get_recent_uploads(channel_id, since)
+        if uploads is None:
+            return jsonify({'error': 'チャンネルが見つかりません'}), 404
+        
+        video_ids = [upload['video_id'] for upload in uploads]
+        previous = get_cached_digest(channel_id, language, days)
+        
+        # 新しいアップロードがなければ保存済みのダイジェストを返す
+        if is_fresh(previous, video_ids):
+            return jsonify(_digest_response(previous, subscription, uploads, since, cached=True))
+        
+        if not uploads:
+            return jsonify({
+                'channel_id': channel_id,
+                'channel_title': subscription.channel_title,
+                'language': language,
+                'window_days': days,
+                'since': since.isoformat(),
+                'overview': None,
+                'themes': [],
+                'highlights': [],
+                'videos': [],
+                'complete': True,
+                'cached': False
+            })
+        
+        # ユーザーの1日あたりの予算を確認してリクエストを予約
+        try:
+            reserve_request(user_id)
+        except BudgetExceededError as e:
+            return jsonify({'error': str(e), 'budget': e.budget}), 429
+        
+        try:
+            # 要約と同じユーザーごとのキューで順番を待ってから、要約を補ってダイジェストを作成
+            with summary_scheduler.slot(user_id) as ticket:
+                digest, tokens = build_digest(
+                    channel_id,
+                    subscription.channel_title,
+                    uploads,
+                    youtube_service,
+                    gemini_service,
+                    language=language,
+                    window_days=days,
+                    max_new=max_new,
+                    previous=previous
+                )
+        except Exception:
+            release_request(user_id)
+            raise
+        
+        # モデルを呼び出さなかった場合は予約を取り消す
+        if not tokens:
+            release_request(user_id)
+        
+        return jsonify(_digest_response(
+            digest, subscription, uploads, since,
+            cached=False,
+            queue=ticket.to_dict(),
+            budget=record_tokens(user_id, tokens)
+        ))
+    
+    except QueueTimeoutError as e:
+        return jsonify({'error': str(e), 'queue': summary_scheduler.queue_status(user_id)}), 503
+    except CircuitOpenError as e:
+        # 上流サービスの停止中は、保存済みのダイジェストがあれば古い結果として返す
+        if previous is not None and previous.overview is not None:
+            return jsonify(_digest_response(previous, subscription, uploads, since, stale=True, stale_reason=str(e)))
+        return circuit_open_response(e)
+    except HttpError as e:
+        return jsonify({'error': f'YouTube APIエラー: {str(e)}'}), 500
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'ダイジェスト生成エラー: {str(e)}'}), 500
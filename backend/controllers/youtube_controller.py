@@ -1,66 +1,155 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from googleapiclient.errors import HttpError
 import os
-from services.auth_service import auth_required
+from services.admission_service import admission_controlled
+from services.profiling_service import profiled
+from services.circuit_breaker import CircuitOpenError, circuit_open_response
+from services.auth_service import auth_required, get_user_id_from_token
 from services.youtube_service import YouTubeService
 from services.gemini_service import GeminiService
+from services.store_service import (
+    TranscriptCache, DEFAULT_SUMMARY_LANGUAGE, LANGUAGE_CODE_RE, save_summary, get_summary, find_translation_source
+)
+from services.scheduler_service import summary_scheduler, QueueTimeoutError
+from services.history_service import record_history
+from services.transcript_prefetch_service import transcript_prefetcher
+from services.live_summary_service import LiveSummaryError, update_live_summary, get_live_state
+from services.search_page_service import search_pager, InvalidCursorError, encode_search_cursor, decode_search_cursor
+from services.usage_service import BudgetExceededError, get_budget, reserve_request, release_request, record_tokens
 
 # 環境変数からYouTube APIキーを取得
 YOUTUBE_API_KEY = os.getenv('YOUTUBE_API_KEY')
 
 # サービスインスタンスをコントローラー内で初期化
-youtube_service = YouTubeService(YOUTUBE_API_KEY)
+# 取得したトランスクリプトはデータベースにキャッシュする
+youtube_service = YouTubeService(YOUTUBE_API_KEY, transcript_cache=TranscriptCache())
 gemini_service = GeminiService()
 
+# 検索結果の1ページの最大件数の上限（YouTube APIのmaxResultsの上限）
+MAX_SEARCH_RESULTS = 50
+
+# トランスクリプトを先読みする検索結果の件数の上限
+MAX_TRANSCRIPT_PREFETCH = 10
+
 # Blueprintを作成
 youtube_bp = Blueprint('youtube_bp', __name__, url_prefix='/api')
 
+def _stale_summary(video_id, format_type, language, reason):
+    """
+    上流サービスが利用できない場合に、保存済みの要約を古い結果として返します。
+    指定した言語の要約がなければ、他の言語の要約を返します。
+    
+    戻り値:
+    - staleマーカー付きの要約（保存済みの要約がない場合はNone）
+    """
+    try:
+        summary = get_summary(video_id, format_type, language) or \
+            find_translation_source(video_id, format_type, language)
+    except Exception as e:
+        print(f"保存済み要約の取得エラー: {str(e)}")
+        return None
+    
+    if not summary:
+        return None
+    
+    result = summary.to_dict()
+    result['stale'] = True
+    result['stale_reason'] = reason
+    result['cached_at'] = summary.updated_at.isoformat() if summary.updated_at else None
+    return result
+
+def _add_history(result, user_id, summary):
+    """要約をユーザーの履歴に記録し、履歴IDをレスポンスに含めます。"""
+    entry = record_history(user_id, summary)
+    if entry:
+        result['history_id'] = entry.id
+
 @youtube_bp.route('/search', methods=['POST'])
+@profiled
 @auth_required
+@admission_controlled('search')
 def search_videos():
     """
     キーワードに基づいてYouTubeビデオを検索します。
     
     JSONボディパラメータ:
-    - q: 検索クエリ（必須）
-    - max_results: 返す結果の最大数（オプション、デフォルト: 10）
+    - q: 検索クエリ（必須、cursorを指定する場合は不要）
+    - max_results: 返す結果の最大数（オプション、デフォルト: 10、最大: 50）
     - channel_id: チャンネルIDでフィルタリング（オプション）
     - published_after: この日付以降に公開されたビデオでフィルタリング（オプション、ISO 8601形式）
+    - cursor: 前のページのレスポンスのnext_cursor（オプション、指定した場合は他のパラメータを無視）
+    - prefetch_transcripts: トランスクリプトを先読みする上位の件数（オプション、0で無効、最大: 10、
+      デフォルト: TRANSCRIPT_PREFETCH_TOP_N）
     
     戻り値:
-    - ビデオ情報を含むJSONレスポンス
+    - ビデオ情報と次のページのカーソルを含むJSONレスポンス
     """
     # リクエストボディからJSONデータを取得
     data = request.get_json()
+    cursor = data.get('cursor')
     
-    # JSONからパラメータを抽出
-    query = data.get('q')
-    max_results = data.get('max_results', 10)
-    channel_id = data.get('channel_id')
-    published_after = data.get('published_after')
+    if cursor:
+        # カーソルから検索パラメータとページトークンを復元
+        try:
+            params, page_token = decode_search_cursor(cursor)
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        # JSONからパラメータを抽出
+        params = {
+            'query': data.get('q'),
+            'max_results': data.get('max_results', 10),
+            'channel_id': data.get('channel_id'),
+            'published_after': data.get('published_after')
+        }
+        page_token = None
+        
+        # クエリパラメータの検証
+        if not params['query']:
+            return jsonify({'error': 'クエリパラメータ(q)がありません'}), 400
     
-    # クエリパラメータの検証
-    if not query:
-        return jsonify({'error': 'クエリパラメータ(q)がありません'}), 400
+    try:
+        params['max_results'] = max(1, min(int(params['max_results']), MAX_SEARCH_RESULTS))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'max_resultsパラメータは整数である必要があります'}), 400
+    
+    prefetch_transcripts = data.get('prefetch_transcripts')
+    if prefetch_transcripts is not None:
+        try:
+            prefetch_transcripts = max(0, min(int(prefetch_transcripts), MAX_TRANSCRIPT_PREFETCH))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'prefetch_transcriptsパラメータは整数である必要があります'}), 400
     
     try:
-        # サービスを使用してビデオを検索
-        result = youtube_service.search_videos(
-            query=query,
-            max_results=max_results,
-            channel_id=channel_id,
-            published_after=published_after
-        )
+        # 先読み済みのページがあればそれを使い、なければサービスを使用してビデオを検索
+        result, prefetched = search_pager.fetch_page(youtube_service, params, page_token)
         
-        return jsonify(result)
+        next_page_token = result.pop('next_page_token', None)
+        result['next_cursor'] = encode_search_cursor(params, next_page_token) if next_page_token else None
+        result['prefetched'] = prefetched
+        
+        # レスポンスを返した後に、上位のビデオのトランスクリプトと次のページを先読みする
+        response = jsonify(result)
+        app = current_app._get_current_object()
+        video_ids = [video['id'] for video in result['videos']]
+        response.call_on_close(
+            lambda: transcript_prefetcher.schedule(app, youtube_service, video_ids, top_n=prefetch_transcripts)
+        )
+        if next_page_token:
+            response.call_on_close(lambda: search_pager.prefetch(youtube_service, params, next_page_token))
+        return response
     
+    except CircuitOpenError as e:
+        return circuit_open_response(e)
     except HttpError as e:
         return jsonify({'error': f'YouTube APIエラー: {str(e)}'}), 500
     except Exception as e:
         return jsonify({'error': f'サーバーエラー: {str(e)}'}), 500
 
 @youtube_bp.route('/summarize', methods=['POST'])
+@profiled
 @auth_required
+@admission_controlled('summarize')
 def summarize_video():
     """
     Vertex AI Geminiを使用してYouTubeビデオの要約を生成します。
@@ -68,9 +157,16 @@ def summarize_video():
     JSONボディパラメータ:
     - video_id: YouTubeビデオID（必須）
     - format_type: 要約のフォーマット（オプション、"json"または"markdown"、デフォルト: "json"）
+    - language: 要約の言語コード（オプション、例: "ja"、"en"、デフォルト: "ja"）
+    - refresh: trueの場合、保存済みの要約を使わずに再生成する（オプション、デフォルト: false）
+    
+    保存済みの要約が指定した言語にあればそのまま返し（"cached": true）、
+    他の言語にあればトランスクリプトを使わずにその要約を翻訳します。
+    どの言語の要約もない場合のみトランスクリプトから要約を生成します。
     
     戻り値:
     - 要約情報を含むJSONレスポンス
+    - 上流サービスが利用できない場合は、保存済みの要約に"stale": trueを付けて返す
     """
     # リクエストボディからJSONデータを取得
     data = request.get_json()
@@ -78,6 +174,8 @@ def summarize_video():
     # JSONからパラメータを抽出
     video_id = data.get('video_id')
     format_type = data.get('format_type', 'json')
+    language = data.get('language') or DEFAULT_SUMMARY_LANGUAGE
+    refresh = bool(data.get('refresh', False))
     
     # video_idパラメータの検証
     if not video_id:
@@ -87,11 +185,285 @@ def summarize_video():
     if format_type not in ['json', 'markdown']:
         return jsonify({'error': 'format_typeパラメータは"json"または"markdown"である必要があります'}), 400
     
+    # languageパラメータの検証
+    if not isinstance(language, str) or not LANGUAGE_CODE_RE.match(language):
+        return jsonify({'error': 'languageパラメータは"ja"や"en"などの言語コードである必要があります'}), 400
+    
+    # トークンからユーザーIDを取得
+    user_id = get_user_id_from_token()
+    
+    # 指定した言語の要約が保存済みであれば、予算を消費せずにそのまま返す
+    if not refresh:
+        try:
+            cached = get_summary(video_id, format_type, language)
+        except Exception as e:
+            print(f"保存済み要約の取得エラー: {str(e)}")
+            cached = None
+        if cached:
+            result = cached.to_dict()
+            result['cached'] = True
+            _add_history(result, user_id, cached)
+            return jsonify(result)
+    
+    # ユーザーの1日あたりの予算を確認してリクエストを予約
+    try:
+        reserve_request(user_id)
+    except BudgetExceededError as e:
+        return jsonify({'error': str(e), 'budget': e.budget}), 429
+    except Exception as e:
+        return jsonify({'error': f'利用量の確認に失敗しました: {str(e)}'}), 500
+    
     try:
-        # Geminiサービスを使用して要約を生成
-        result = gemini_service.generate_summary(video_id, youtube_service, format_type=format_type)
+        # ユーザーごとのキューで順番を待ってから、Geminiサービスを使用して要約を生成
+        with summary_scheduler.slot(user_id) as ticket:
+            # 他の言語の要約があれば、トランスクリプトより入力トークンの少ない要約の翻訳で済ませる
+            source = None if refresh else find_translation_source(video_id, format_type, language)
+            if source:
+                result = gemini_service.translate_summary(source.to_dict(), language, format_type=format_type)
+            else:
+                # 検索時に先読みしたトランスクリプトがあれば使う（先読み中なら完了を待つ）
+                transcript_prefetcher.claim(video_id)
+                result = gemini_service.generate_summary(
+                    video_id, youtube_service, language=language, format_type=format_type
+                )
+        
+        if 'error' in result:
+            release_request(user_id)
+            return jsonify(result)
+        
+        # 生成した要約を言語ごとに保存（ライブラリ検索・翻訳元としても使用）し、ユーザーの履歴に記録
+        summary = save_summary(video_id, result, format_type=format_type, language=language)
+        if summary:
+            _add_history(result, user_id, summary)
+        
+        # キューでの待機状況と残り予算をレスポンスに含める
+        result['queue'] = ticket.to_dict()
+        result['budget'] = record_tokens(user_id, result.get('token_count'))
         
         return jsonify(result)
     
+    except QueueTimeoutError as e:
+        release_request(user_id)
+        return jsonify({'error': str(e), 'queue': summary_scheduler.queue_status(user_id)}), 503
+    except CircuitOpenError as e:
+        release_request(user_id)
+        # 上流サービスの停止中は、保存済みの要約があれば古い結果として返す
+        stale = _stale_summary(video_id, format_type, language, str(e))
+        if stale:
+            return jsonify(stale)
+        return circuit_open_response(e)
     except Exception as e:
+        release_request(user_id)
+        stale = _stale_summary(video_id, format_type, language, str(e))
+        if stale:
+            return jsonify(stale)
         return jsonify({'error': f'要約生成エラー: {str(e)}'}), 500
+
+@youtube_bp.route('/summarize/live', methods=['POST'])
+@profiled
+@auth_required
+@admission_controlled('summarize')
+def summarize_live():
+    """
+    ライブ配信・プレミア公開中のビデオの要約を、前回から伸びたトランスクリプトの分だけ更新します。
+    
+    要約済みの最後のセグメントより後のトランスクリプトだけを区間に分けて、これまでの要約に畳み込みます。
+    配信中に定期的に呼び出すことを想定しており、1回の更新のコストは新しい区間の長さに比例します。
+    配信終了後に最後まで畳み込むと"status": "completed"になり、/api/summarizeの保存済みの要約としても使われます。
+    
+    JSONボディパラメータ:
+    - video_id: YouTubeビデオID（必須）
+    - language: 要約の言語コード（オプション、デフォルト: "ja"）
+    
+    戻り値:
+    - これまでの要約（brief_summary、key_points、main_topics、区間ごとのtimeline）と、
+      今回畳み込んだ区間数（windows_folded）、未要約の文字数（pending_chars）を含むJSONレスポンス
+    """
+    # リクエストボディからJSONデータを取得
+    data = request.get_json()
+    
+    video_id = data.get('video_id')
+    language = data.get('language') or DEFAULT_SUMMARY_LANGUAGE
+    
+    # パラメータの検証
+    if not video_id:
+        return jsonify({'error': 'video_idパラメータがありません'}), 400
+    if not isinstance(language, str) or not LANGUAGE_CODE_RE.match(language):
+        return jsonify({'error': 'languageパラメータは"ja"や"en"などの言語コードである必要があります'}), 400
+    
+    # トークンからユーザーIDを取得
+    user_id = get_user_id_from_token()
+    
+    # ユーザーの1日あたりの予算を確認してリクエストを予約
+    try:
+        reserve_request(user_id)
+    except BudgetExceededError as e:
+        return jsonify({'error': str(e), 'budget': e.budget}), 429
+    except Exception as e:
+        return jsonify({'error': f'利用量の確認に失敗しました: {str(e)}'}), 500
+    
+    try:
+        # 要約と同じユーザーごとのキューで順番を待ってから、新しい区間を要約に畳み込む
+        with summary_scheduler.slot(user_id) as ticket:
+            update = update_live_summary(video_id, youtube_service, gemini_service, language=language)
+        
+        # モデルを呼び出さなかった場合は予約を取り消す
+        if not update['tokens']:
+            release_request(user_id)
+        
+        state = update['state']
+        result = state.to_dict() if state else {
+            'video_id': video_id,
+            'video_url': f'https://www.youtube.com/watch?v={video_id}',
+            'language': language,
+            'status': 'live',
+            'brief_summary': None,
+            'timeline': [],
+            'window_count': 0
+        }
+        result.update({
+            'updated': update['windows'] > 0,
+            'windows_folded': update['windows'],
+            'pending_chars': update['pending_chars'],
+            'queue': ticket.to_dict(),
+            'budget': record_tokens(user_id, update['tokens'])
+        })
+        return jsonify(result)
+    
+    except LiveSummaryError as e:
+        release_request(user_id)
+        return jsonify({'error': str(e)}), e.status_code
+    except QueueTimeoutError as e:
+        release_request(user_id)
+        return jsonify({'error': str(e), 'queue': summary_scheduler.queue_status(user_id)}), 503
+    except CircuitOpenError as e:
+        release_request(user_id)
+        # 上流サービスの停止中は、これまでの要約があれば古い結果として返す
+        state = get_live_state(video_id, language)
+        if state and state.brief_summary:
+            result = state.to_dict()
+            result.update({'stale': True, 'stale_reason': str(e)})
+            return jsonify(result)
+        return circuit_open_response(e)
+    except HttpError as e:
+        release_request(user_id)
+        return jsonify({'error': f'YouTube APIエラー: {str(e)}'}), 500
+    except Exception as e:
+        release_request(user_id)
+        return jsonify({'error': f'ライブ要約エラー: {str(e)}'}), 500
+
+@youtube_bp.route('/summarize/live/<video_id>', methods=['GET'])
+@auth_required
+@admission_controlled('crud')
+def get_live_summary(video_id):
+    """
+    ライブ配信の要約の現在の状態を、更新せずに返します。モデルとYouTube APIは呼び出しません。
+    
+    クエリパラメータ:
+    - language: 要約の言語コード（オプション、デフォルト: "ja"）
+    """
+    language = request.args.get('language') or DEFAULT_SUMMARY_LANGUAGE
+    if not LANGUAGE_CODE_RE.match(language):
+        return jsonify({'error': 'languageパラメータは"ja"や"en"などの言語コードである必要があります'}), 400
+    
+    state = get_live_state(video_id, language)
+    if state is None:
+        return jsonify({'error': 'ライブ要約が見つかりません'}), 404
+    return jsonify(state.to_dict())
+
+@youtube_bp.route('/usage', methods=['GET'])
+@auth_required
+@admission_controlled('crud')
+def get_usage():
+    """
+    ユーザーの要約キューの状態（待機中のリクエストの現在の順番を含む）と当日の残り予算を返します。
+    
+    戻り値:
+    - キューの状態と予算情報を含むJSONレスポンス
+    """
+    try:
+        # トークンからユーザーIDを取得
+        user_id = get_user_id_from_token()
+        
+        return jsonify({
+            'queue': summary_scheduler.queue_status(user_id),
+            'budget': get_budget(user_id)
+        })
+    
+    except Exception as e:
+        return jsonify({'error': f'利用状況の取得に失敗しました: {str(e)}'}), 500
+
+@youtube_bp.route('/ask', methods=['POST'])
+@profiled
+@auth_required
+@admission_controlled('summarize')
+def ask_video():
+    """
+    ビデオについての質問に、トランスクリプトの関連部分だけを使って回答します。
+    要約と同じユーザーごとのキューと1日あたりの予算の対象です。
+    
+    JSONボディパラメータ:
+    - video_id: YouTubeビデオID（必須）
+    - question: 質問（必須）
+    - top_k: モデルに渡すトランスクリプトのチャンク数（オプション、デフォルト: 4、最大: 10）
+    
+    戻り値:
+    - 回答と根拠となるタイムスタンプ、キューでの待機状況と残り予算を含むJSONレスポンス
+    """
+    # リクエストボディからJSONデータを取得
+    data = request.get_json()
+    
+    # JSONからパラメータを抽出
+    video_id = data.get('video_id')
+    question = data.get('question')
+    top_k = data.get('top_k', 4)
+    
+    # パラメータの検証
+    if not video_id:
+        return jsonify({'error': 'video_idパラメータがありません'}), 400
+    
+    if not question:
+        return jsonify({'error': 'questionパラメータがありません'}), 400
+    
+    try:
+        top_k = max(1, min(int(top_k), 10))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'top_kパラメータは整数である必要があります'}), 400
+    
+    # トークンからユーザーIDを取得
+    user_id = get_user_id_from_token()
+    
+    # ユーザーの1日あたりの予算を確認してリクエストを予約
+    try:
+        reserve_request(user_id)
+    except BudgetExceededError as e:
+        return jsonify({'error': str(e), 'budget': e.budget}), 429
+    except Exception as e:
+        return jsonify({'error': f'利用量の確認に失敗しました: {str(e)}'}), 500
+    
+    try:
+        # 要約と同じユーザーごとのキューで順番を待ってから、先読み中のトランスクリプトがあれば完了を待ち、
+        # Geminiサービスを使用して回答を生成
+        with summary_scheduler.slot(user_id) as ticket:
+            transcript_prefetcher.claim(video_id)
+            result = gemini_service.answer_question(video_id, question, youtube_service, top_k=top_k)
+        
+        if 'error' in result:
+            release_request(user_id)
+            return jsonify(result)
+        
+        # キューでの待機状況と残り予算をレスポンスに含める
+        result['queue'] = ticket.to_dict()
+        result['budget'] = record_tokens(user_id, result.get('token_count'))
+        
+        return jsonify(result)
+    
+    except QueueTimeoutError as e:
+        release_request(user_id)
+        return jsonify({'error': str(e), 'queue': summary_scheduler.queue_status(user_id)}), 503
+    except CircuitOpenError as e:
+        release_request(user_id)
+        return circuit_open_response(e)
+    except Exception as e:
+        release_request(user_id)
+        return jsonify({'error': f'回答生成エラー: {str(e)}'}), 500
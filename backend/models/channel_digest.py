@@ -0,0 +1,63 @@
+from services.db_service import db
+from datetime import datetime
+
+class ChannelDigest(db.Model):
+    """
+    チャンネルダイジェストモデル
+    
+    チャンネルの一定期間のアップロードの要約をまとめたダイジェストを、チャンネル・言語・期間の組み合わせごとに保存します。
+    対象期間のアップロードが変わるまで（新しいアップロードがあるまで）キャッシュとして再利用します。
+    """
+    __tablename__ = 'channel_digests'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    channel_id = db.Column(db.String(128), nullable=False)
+    language = db.Column(db.String(16), nullable=False, default='ja')
+    window_days = db.Column(db.Integer, nullable=False)
+    # 生成時点の対象期間のアップロード（新しい順）
+    video_ids = db.Column(db.JSON, nullable=False, default=list)
+    # ダイジェストに含めた要約のビデオ
+    summarized_video_ids = db.Column(db.JSON, nullable=False, default=list)
+    # トランスクリプトがないなどの理由で要約できなかったビデオ
+    unavailable_video_ids = db.Column(db.JSON, nullable=False, default=list)
+    overview = db.Column(db.Text, nullable=True)
+    themes = db.Column(db.JSON, nullable=True)
+    highlights = db.Column(db.JSON, nullable=True)
+    model_id = db.Column(db.String(64), nullable=True)
+    token_count = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # チャンネル・言語・期間の組み合わせでユニーク制約
+    __table_args__ = (
+        db.UniqueConstraint('channel_id', 'language', 'window_days', name='uq_channel_language_window'),
+    )
+    
+    def __repr__(self):
+        return f'<ChannelDigest {self.channel_id} [{self.language}/{self.window_days}d]>'
+    
+    @property
+    def pending_video_ids(self):
+        """まだ要約がなく、ダイジェストに含まれていないビデオ"""
+        done = set(self.summarized_video_ids or []) | set(self.unavailable_video_ids or [])
+        return [video_id for video_id in (self.video_ids or []) if video_id not in done]
+    
+    def to_dict(self):
+        """
+        モデルを辞書に変換
+        """
+        return {
+            'channel_id': self.channel_id,
+            'language': self.language,
+            'window_days': self.window_days,
+            'overview': self.overview,
+            'themes': self.themes or [],
+            'highlights': self.highlights or [],
+            'summarized_video_ids': self.summarized_video_ids or [],
+            'unavailable_video_ids': self.unavailable_video_ids or [],
+            'pending_video_ids': self.pending_video_ids,
+            'complete': not self.pending_video_ids,
+            'model_id': self.model_id,
+            'token_count': self.token_count,
+            'generated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -0,0 +1,90 @@
+from services.db_service import db
+from datetime import datetime
+
+class LiveSummaryState(db.Model):
+    """
+    ライブ配信要約の状態モデル
+    
+    ライブ配信やプレミア公開のトランスクリプトを区間ごとに要約して畳み込んだ、ビデオ・言語ごとの要約の途中経過を保存します。
+    processed_untilまでのセグメントは要約済みで、次回はそれより後のセグメントだけをモデルに送ります。
+    同じ配信を同時に更新した場合に区間を二重に畳み込まないよう、versionで楽観的ロックを行います。
+    """
+    __tablename__ = 'live_summary_states'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.String(64), nullable=False)
+    language = db.Column(db.String(16), nullable=False, default='ja')
+    video_title = db.Column(db.String(255), nullable=True)
+    channel_id = db.Column(db.String(128), nullable=True)
+    channel_title = db.Column(db.String(255), nullable=True)
+    # "live"（配信中）または"completed"（配信終了後に最後まで要約済み）
+    status = db.Column(db.String(16), nullable=False, default='live')
+    # 要約済みの最後のセグメントの開始秒数と、要約済みのセグメント数
+    processed_until = db.Column(db.Float, nullable=True)
+    segment_offset = db.Column(db.Integer, nullable=False, default=0)
+    brief_summary = db.Column(db.Text, nullable=True)
+    key_points = db.Column(db.JSON, nullable=True)
+    main_topics = db.Column(db.JSON, nullable=True)
+    # 区間ごとの要約（start、end、timestamp、summary）
+    timeline = db.Column(db.JSON, nullable=False, default=list)
+    window_count = db.Column(db.Integer, nullable=False, default=0)
+    model_id = db.Column(db.String(64), nullable=True)
+    # これまでの区間の要約で使用したトークン数の合計
+    token_count = db.Column(db.Integer, nullable=False, default=0)
+    version = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # ビデオと言語の組み合わせでユニーク制約
+    __table_args__ = (
+        db.UniqueConstraint('video_id', 'language', name='uq_live_video_language'),
+    )
+    __mapper_args__ = {'version_id_col': version}
+    
+    def __repr__(self):
+        return f'<LiveSummaryState {self.video_id} [{self.language}] {self.status}>'
+    
+    def to_summary_result(self):
+        """
+        GeminiService.generate_summaryと同じ形式の辞書に変換（配信終了後に通常の要約として保存するため）
+        """
+        result = {
+            'brief_summary': self.brief_summary,
+            'key_points': self.key_points or [],
+            'main_topics': self.main_topics or [],
+            'model_id': self.model_id,
+            'token_count': self.token_count,
+            'language': self.language,
+            'video_id': self.video_id,
+            'video_url': f'https://www.youtube.com/watch?v={self.video_id}'
+        }
+        if self.video_title:
+            result['video_title'] = self.video_title
+        if self.channel_id:
+            result['channel_id'] = self.channel_id
+            result['channel_title'] = self.channel_title
+        return result
+    
+    def to_dict(self):
+        """
+        モデルを辞書に変換
+        """
+        return {
+            'video_id': self.video_id,
+            'video_url': f'https://www.youtube.com/watch?v={self.video_id}',
+            'video_title': self.video_title,
+            'channel_id': self.channel_id,
+            'channel_title': self.channel_title,
+            'language': self.language,
+            'status': self.status,
+            'processed_until': self.processed_until,
+            'segment_offset': self.segment_offset,
+            'brief_summary': self.brief_summary,
+            'key_points': self.key_points or [],
+            'main_topics': self.main_topics or [],
+            'timeline': self.timeline or [],
+            'window_count': self.window_count,
+            'model_id': self.model_id,
+            'token_count': self.token_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
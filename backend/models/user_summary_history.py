@@ -0,0 +1,41 @@
+from services.db_service import db
+from datetime import datetime
+
+class UserSummaryHistory(db.Model):
+    """
+    要約履歴モデル
+    
+    ユーザーが要約したビデオを、保存済みの要約（VideoSummary）と紐付けて記録します。
+    """
+    __tablename__ = 'user_summary_history'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False)
+    summary_id = db.Column(db.Integer, db.ForeignKey('video_summaries.id', ondelete='CASCADE'), nullable=False)
+    # 最初に記録した日時（変更しない。一覧のページネーションは記録順のidで行う）
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    # 最後に要約または再訪した日時
+    last_viewed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    summary = db.relationship('VideoSummary', lazy='joined')
+    
+    __table_args__ = (
+        # 同じ要約は1ユーザーにつき1件のみ記録
+        db.UniqueConstraint('user_id', 'summary_id', name='uq_user_summary'),
+        # 履歴一覧のキーセットページネーション用（新しい順）
+        db.Index('ix_user_summary_history_user_id', 'user_id', 'id'),
+    )
+    
+    def __repr__(self):
+        return f'<UserSummaryHistory {self.user_id} - {self.summary_id}>'
+    
+    def to_dict(self):
+        """
+        モデルを辞書に変換（要約の全文を含む）
+        """
+        result = self.summary.to_dict() if self.summary else {}
+        result['history_id'] = self.id
+        result['summary_id'] = self.summary_id
+        result['recorded_at'] = self.created_at.isoformat() if self.created_at else None
+        result['viewed_at'] = self.last_viewed_at.isoformat() if self.last_viewed_at else None
+        return result
@@ -0,0 +1,36 @@
+from services.db_service import db
+from datetime import datetime
+
+class UserUsage(db.Model):
+    """
+    ユーザー利用量モデル
+    
+    ユーザーごと・日ごとの要約リクエスト数とトークン使用量を保存します。
+    """
+    __tablename__ = 'user_usage'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.String(128), nullable=False)
+    usage_date = db.Column(db.Date, nullable=False)
+    request_count = db.Column(db.Integer, nullable=False, default=0)
+    token_count = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # ユーザーと日付の組み合わせでユニーク制約
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'usage_date', name='uq_user_usage_date'),
+    )
+    
+    def __repr__(self):
+        return f'<UserUsage {self.user_id} {self.usage_date}>'
+    
+    def to_dict(self):
+        """
+        モデルを辞書に変換
+        """
+        return {
+            'user_id': self.user_id,
+            'usage_date': self.usage_date.isoformat() if self.usage_date else None,
+            'request_count': self.request_count,
+            'token_count': self.token_count
+        }
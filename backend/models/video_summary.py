@@ -0,0 +1,53 @@
+from services.db_service import db
+from datetime import datetime
+
+class VideoSummary(db.Model):
+    """
+    ビデオ要約モデル
+    
+    Geminiで生成した要約を、ビデオ・フォーマット・言語の組み合わせごとに保存します。
+    """
+    __tablename__ = 'video_summaries'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.String(64), nullable=False, index=True)
+    format_type = db.Column(db.String(16), nullable=False, default='json')
+    language = db.Column(db.String(16), nullable=False, default='ja')
+    video_title = db.Column(db.String(512), nullable=True)
+    channel_id = db.Column(db.String(128), nullable=True)
+    channel_title = db.Column(db.String(255), nullable=True)
+    brief_summary = db.Column(db.Text, nullable=True)
+    key_points = db.Column(db.JSON, nullable=True)
+    main_topics = db.Column(db.JSON, nullable=True)
+    markdown_content = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    # ビデオ・フォーマット・言語の組み合わせでユニーク制約
+    __table_args__ = (
+        db.UniqueConstraint('video_id', 'format_type', 'language', name='uq_video_format_language'),
+    )
+    
+    def __repr__(self):
+        return f'<VideoSummary {self.video_id} [{self.format_type}/{self.language}]>'
+    
+    def to_dict(self):
+        """
+        モデルを辞書に変換（/api/summarizeのレスポンスと同じ形式）
+        """
+        result = {
+            'brief_summary': self.brief_summary,
+            'key_points': self.key_points or [],
+            'main_topics': self.main_topics or [],
+            'video_id': self.video_id,
+            'video_url': f'https://www.youtube.com/watch?v={self.video_id}',
+            'video_title': self.video_title,
+            'channel_id': self.channel_id,
+            'channel_title': self.channel_title,
+            'language': self.language,
+            'format_type': self.format_type,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+        if self.markdown_content:
+            result['markdown_content'] = self.markdown_content
+        return result
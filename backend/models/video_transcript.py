@@ -0,0 +1,34 @@
+from services.db_service import db
+from datetime import datetime
+
+class VideoTranscript(db.Model):
+    """
+    ビデオトランスクリプトモデル
+    
+    YouTubeから取得したトランスクリプトを保存し、再取得を避けるためのキャッシュとして利用します。
+    """
+    __tablename__ = 'video_transcripts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    video_id = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    language = db.Column(db.String(16), nullable=True)
+    transcript = db.Column(db.Text, nullable=False)
+    # youtube_transcript_apiが返すセグメント（text, start, duration）のリスト
+    segments = db.Column(db.JSON, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<VideoTranscript {self.video_id} ({self.language})>'
+    
+    def to_result(self):
+        """
+        YouTubeService.get_transcriptと同じ形式の辞書に変換
+        """
+        return {
+            'success': True,
+            'transcript': self.transcript,
+            'language': self.language,
+            'error': None,
+            'raw_data': self.segments or []
+        }
@@ -0,0 +1,192 @@
+"""
+アドミッション制御サービス - ルートの種類ごとの同時実行数制限と負荷時のリクエスト拒否
+
+要約・検索・CRUD・エクスポートのルートクラスごとに同時実行数と待機キューの上限を持ち、
+キューがいっぱいのリクエストは処理を始める前に503とRetry-Afterで拒否します。
+要約が集中しても、軽いエンドポイントのワーカーとレイテンシは影響を受けません。
+"""
+import math
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import Response, jsonify
+
+from services.profiling_service import profile_span
+
+# ルートクラスごとのデフォルト設定（同時実行数, 待機キューの上限, 待機の上限秒数）
+DEFAULT_ROUTE_CLASSES = {
+    'summarize': (8, 16, 30.0),
+    'search': (16, 32, 5.0),
+    'crud': (32, 64, 2.0),
+    # ストリーミングのエクスポートはダウンロードが終わるまで実行枠を使うため、CRUDとは別に少数に制限する
+    'export': (4, 4, 2.0)
+}
+
+# 平均処理時間の指数移動平均の係数
+EWMA_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """リクエストが受け付けられなかった場合に送出される例外"""
+
+    def __init__(self, route_class, retry_after):
+        super().__init__(f'{route_class}リクエストが混雑しています')
+        self.route_class = route_class
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    1つのルートクラスの同時実行数と待機キューを管理します。
+
+    実行中のリクエストが上限に達している場合は待機キューに入り、キューも上限に達している場合、
+    または待機時間が上限を超えた場合はAdmissionRejectedを送出します。
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, queue_timeout):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._cond = threading.Condition()
+        self._running = 0
+        self._waiting = 0
+        self._avg_service = None
+        self.admitted = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    def retry_after(self):
+        """
+        待機中のリクエストがすべて処理されるまでの見込み秒数を計算します。
+        ロックを保持した状態で呼び出します。
+        """
+        avg_service = self._avg_service if self._avg_service is not None else 1.0
+        return max(1, math.ceil((self._waiting + 1) / self.max_concurrent * avg_service))
+
+    def acquire(self):
+        """
+        実行枠を取得します。
+
+        Raises:
+            AdmissionRejected: キューがいっぱい、または待機時間が上限を超えた場合
+        """
+        with self._cond:
+            if self._running < self.max_concurrent and not self._waiting:
+                self._running += 1
+                self.admitted += 1
+                return
+
+            if self._waiting >= self.max_queue:
+                self.shed += 1
+                raise AdmissionRejected(self.name, self.retry_after())
+
+            self._waiting += 1
+            deadline = time.monotonic() + self.queue_timeout
+            try:
+                while self._running >= self.max_concurrent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed += 1
+                        self.timeouts += 1
+                        raise AdmissionRejected(self.name, self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+
+            self._running += 1
+            self.admitted += 1
+
+    def release(self, service_seconds):
+        """実行枠を解放し、処理時間を平均に反映します。"""
+        with self._cond:
+            self._running -= 1
+            if self._avg_service is None:
+                self._avg_service = service_seconds
+            else:
+                self._avg_service += EWMA_ALPHA * (service_seconds - self._avg_service)
+            self._cond.notify()
+
+    def snapshot(self):
+        """キューの深さと拒否数を辞書で返します。"""
+        with self._cond:
+            return {
+                'running': self._running,
+                'queue_depth': self._waiting,
+                'max_concurrent': self.max_concurrent,
+                'max_queue': self.max_queue,
+                'admitted': self.admitted,
+                'shed': self.shed,
+                'queue_timeouts': self.timeouts,
+                'avg_service_ms': round(self._avg_service * 1000, 1) if self._avg_service is not None else None
+            }
+
+
+def _create_controllers():
+    """環境変数（例: ADMISSION_SUMMARIZE_CONCURRENCY）でデフォルト設定を上書きしてコントローラーを作成します。"""
+    controllers = {}
+    for name, (concurrency, queue, timeout) in DEFAULT_ROUTE_CLASSES.items():
+        prefix = f'ADMISSION_{name.upper()}'
+        controllers[name] = AdmissionController(
+            name,
+            max_concurrent=int(os.getenv(f'{prefix}_CONCURRENCY', concurrency)),
+            max_queue=int(os.getenv(f'{prefix}_QUEUE', queue)),
+            queue_timeout=float(os.getenv(f'{prefix}_QUEUE_TIMEOUT', timeout))
+        )
+    return controllers
+
+
+# アプリケーション全体で共有するルートクラスごとのコントローラー
+admission_controllers = _create_controllers()
+
+
+def admission_controlled(route_class):
+    """
+    ルートにアドミッション制御を適用するデコレータ。
+    受け付けられなかったリクエストには503とRetry-Afterヘッダーを返します。
+    認証されていないリクエストが実行枠や待機キューを使わないよう、auth_requiredより内側に適用します。
+    ストリーミングレスポンスでは、本文を送り終えるまで（クライアントが切断した場合も含む）実行枠を保持します。
+
+    Args:
+        route_class (str): ルートクラス（"summarize"、"search"、"crud"、"export"）
+    """
+    controller = admission_controllers[route_class]
+
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            try:
+                with profile_span('queue'):
+                    controller.acquire()
+            except AdmissionRejected as e:
+                response = jsonify({
+                    'error': f'サーバーが混雑しています。{e.retry_after}秒後に再試行してください',
+                    'retry_after': e.retry_after
+                })
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response, 503
+
+            started = time.monotonic()
+            try:
+                response = f(*args, **kwargs)
+            except BaseException:
+                controller.release(time.monotonic() - started)
+                raise
+
+            # ストリーミングの本文はビューが戻った後に生成されるため、レスポンスを閉じるときに解放する
+            if isinstance(response, Response) and response.is_streamed:
+                response.call_on_close(lambda: controller.release(time.monotonic() - started))
+            else:
+                controller.release(time.monotonic() - started)
+            return response
+
+        return decorated_function
+
+    return decorator
+
+
+def get_admission_stats():
+    """ルートクラスごとのメトリクスを返します。"""
+    return {name: controller.snapshot() for name, controller in admission_controllers.items()}
@@ -2,6 +2,7 @@
 Firebase認証サービス - IDトークンの検証用
 """
 import os
+import hmac
 import firebase_admin
 from firebase_admin import credentials, auth
 from functools import wraps
@@ -77,6 +78,28 @@ def auth_required(f):
     
     return decorated_function
 
+# 運用者向けルートのためのデコレータ
+def admin_required(f):
+    """
+    運用者向けのFlaskルートのためのデコレータ。
+    X-Admin-TokenヘッダーをADMIN_API_TOKEN環境変数と比較します。
+    ADMIN_API_TOKENが設定されていない場合、ルートは無効になります。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        admin_token = os.getenv('ADMIN_API_TOKEN')
+        if not admin_token:
+            return jsonify({'error': '管理用APIは無効です'}), 403
+        
+        # リクエストヘッダーから管理トークンを取得して比較
+        provided = request.headers.get('X-Admin-Token', '')
+        if not hmac.compare_digest(provided.encode(), admin_token.encode()):
+            return jsonify({'error': '無効な管理トークンです'}), 401
+        
+        return f(*args, **kwargs)
+    
+    return decorated_function
+
 # デコレータなしでトークンを検証する関数（テストまたはカスタム処理用）
 def verify_token(token):
     """
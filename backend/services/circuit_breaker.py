@@ -0,0 +1,238 @@
+"""
+サーキットブレーカー - YouTube・トランスクリプト・Geminiの上流サービスの障害を検知して早期に失敗させる
+
+直近の呼び出しの失敗率または低速呼び出しの割合が閾値を超えるとオープン状態になり、
+一定時間は上流を呼び出さずにCircuitOpenErrorを送出します。その後ハーフオープン状態で
+少数の試行呼び出しを行い、成功すればクローズ状態に戻ります。
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from flask import jsonify
+
+from services.profiling_service import profile_span
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# 上流サービスごとの低速呼び出しとみなす秒数のデフォルト
+DEFAULT_SLOW_CALL_SECONDS = {
+    'youtube': 5.0,
+    'transcript': 10.0,
+    'gemini': 60.0
+}
+
+
+class CircuitOpenError(Exception):
+    """サーキットがオープン状態のため上流を呼び出さなかった場合に送出される例外"""
+
+    def __init__(self, upstream, retry_after):
+        super().__init__(f'{upstream}は一時的に利用できません')
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    1つの上流サービスのサーキットブレーカー。
+
+    Args:
+        name (str): 上流サービス名
+        failure_rate_threshold (float): オープンにする失敗率
+        slow_call_seconds (float): 低速呼び出しとみなす秒数
+        slow_rate_threshold (float): オープンにする低速呼び出しの割合
+        window_size (int): 判定に使う直近の呼び出し数
+        min_calls (int): 判定に必要な最小呼び出し数
+        open_seconds (float): オープン状態を維持する秒数
+        half_open_max_calls (int): ハーフオープン状態で許可する同時試行数
+        is_failure (callable, optional): 例外を失敗として数えるかを判定する関数
+    """
+
+    def __init__(self, name, failure_rate_threshold=0.5, slow_call_seconds=10.0, slow_rate_threshold=0.8,
+                 window_size=20, min_calls=5, open_seconds=30.0, half_open_max_calls=1, is_failure=None):
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate_threshold = slow_rate_threshold
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.is_failure = is_failure or (lambda e: True)
+
+        self._outcomes = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = None
+        self._half_open_calls = 0
+        # 状態が変わるたびに増やし、前の状態で許可された呼び出しの結果を無視するために使う
+        self._generation = 0
+        self._lock = threading.Lock()
+        self.opened_count = 0
+        self.rejected_count = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            self._refresh_state()
+            return self._state
+
+    def _refresh_state(self):
+        """オープン期間が過ぎていればハーフオープンに移行します。ロックを保持した状態で呼び出します。"""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            self._generation += 1
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._generation += 1
+        self.opened_count += 1
+
+    def _retry_after(self):
+        remaining = self.open_seconds - (time.monotonic() - self._opened_at) if self._opened_at else 1
+        return max(1, math.ceil(remaining))
+
+    def _before_call(self):
+        """
+        呼び出しを許可するか判定します。
+
+        Returns:
+            int: 許可した時点の状態の世代（_after_callに渡す）
+        """
+        with self._lock:
+            self._refresh_state()
+            if self._state == OPEN:
+                self.rejected_count += 1
+                raise CircuitOpenError(self.name, self._retry_after())
+            if self._state == HALF_OPEN:
+                if self._half_open_calls >= self.half_open_max_calls:
+                    self.rejected_count += 1
+                    raise CircuitOpenError(self.name, 1)
+                self._half_open_calls += 1
+            return self._generation
+
+    def _after_call(self, generation, failed, elapsed):
+        """
+        呼び出し結果を記録し、状態を更新します。
+
+        許可した後に状態が変わった呼び出し（オープンになる前から実行中だった呼び出しなど）の結果は、
+        ハーフオープン状態の試行として扱わず、直近の呼び出しにも数えません。
+        """
+        slow = elapsed >= self.slow_call_seconds
+        with self._lock:
+            if generation != self._generation:
+                return
+
+            if self._state == HALF_OPEN:
+                self._half_open_calls -= 1
+                if failed or slow:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                    self._generation += 1
+                return
+
+            self._outcomes.append((failed, slow))
+            if len(self._outcomes) < self.min_calls:
+                return
+
+            failure_rate = sum(1 for f, _ in self._outcomes if f) / len(self._outcomes)
+            slow_rate = sum(1 for _, s in self._outcomes if s) / len(self._outcomes)
+            if failure_rate >= self.failure_rate_threshold or slow_rate >= self.slow_rate_threshold:
+                self._open()
+
+    def call(self, func, *args, **kwargs):
+        """
+        サーキットブレーカーを通して関数を呼び出します。
+
+        Raises:
+            CircuitOpenError: サーキットがオープン状態の場合
+        """
+        generation = self._before_call()
+        started = time.monotonic()
+        try:
+            # プロファイル中のリクエストでは上流サービスの待ち時間として記録する
+            with profile_span(self.name):
+                result = func(*args, **kwargs)
+        except Exception as e:
+            self._after_call(generation, self.is_failure(e), time.monotonic() - started)
+            raise
+        self._after_call(generation, False, time.monotonic() - started)
+        return result
+
+    def snapshot(self):
+        """状態と直近の失敗率・低速率を辞書で返します。"""
+        with self._lock:
+            self._refresh_state()
+            calls = len(self._outcomes)
+            return {
+                'state': self._state,
+                'recent_calls': calls,
+                'failure_rate': round(sum(1 for f, _ in self._outcomes if f) / calls, 3) if calls else 0.0,
+                'slow_rate': round(sum(1 for _, s in self._outcomes if s) / calls, 3) if calls else 0.0,
+                'opened_count': self.opened_count,
+                'rejected_count': self.rejected_count
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name, is_failure=None):
+    """
+    上流サービス名に対応するサーキットブレーカーを取得します（なければ作成します）。
+
+    設定は環境変数（例: CIRCUIT_GEMINI_SLOW_CALL_SECONDS、CIRCUIT_FAILURE_RATE）で変更できます。
+
+    Args:
+        name (str): 上流サービス名（"youtube"、"transcript"、"gemini"）
+        is_failure (callable, optional): 例外を失敗として数えるかを判定する関数
+    """
+    with _breakers_lock:
+        if name not in _breakers:
+            prefix = f'CIRCUIT_{name.upper()}'
+            _breakers[name] = CircuitBreaker(
+                name,
+                failure_rate_threshold=float(os.getenv('CIRCUIT_FAILURE_RATE', '0.5')),
+                slow_call_seconds=float(os.getenv(f'{prefix}_SLOW_CALL_SECONDS',
+                                                  DEFAULT_SLOW_CALL_SECONDS.get(name, 10.0))),
+                slow_rate_threshold=float(os.getenv('CIRCUIT_SLOW_RATE', '0.8')),
+                window_size=int(os.getenv('CIRCUIT_WINDOW_SIZE', '20')),
+                min_calls=int(os.getenv('CIRCUIT_MIN_CALLS', '5')),
+                open_seconds=float(os.getenv('CIRCUIT_OPEN_SECONDS', '30')),
+                is_failure=is_failure
+            )
+        return _breakers[name]
+
+
+def get_circuit_stats():
+    """上流サービスごとのサーキットブレーカーの状態を返します。"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+
+def circuit_open_response(error):
+    """
+    サーキットがオープン状態の場合の503レスポンスを作成します。
+
+    Args:
+        error (CircuitOpenError): 送出された例外
+
+    Returns:
+        tuple: (Retry-Afterヘッダー付きのレスポンス, 503)
+    """
+    response = jsonify({
+        'error': f'{error}。{error.retry_after}秒後に再試行してください',
+        'upstream': error.upstream,
+        'retry_after': error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
@@ -0,0 +1,206 @@
+"""
+コンテキストキャッシュサービス - 長いトランスクリプトをGeminiのコンテキストキャッシュに登録して使い回す
+
+同じビデオについてフォーマットや言語を変えて要約するたびに、トランスクリプト全体が入力トークンとして
+送り直されます。長いトランスクリプトはGemini APIのcachedContentsに一度だけ登録し、以降のプロンプトでは
+キャッシュ名を参照して短いプロンプトだけを送ります。
+
+キャッシュの保存にも料金がかかるため、キャッシュを作成するのは一定時間内に同じビデオのトランスクリプトを
+2回目に使うとき（GEMINI_CONTEXT_CACHE_MIN_USES）からです。このプロセスが作成したキャッシュは
+有効期限と使用中の参照数とともに記録し、上限を超えた場合は使用中でない古いものから削除します。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheHandle:
+    """Gemini APIに登録した1件のコンテキストキャッシュ"""
+
+    def __init__(self, name, video_id, model_id, token_count, ttl):
+        self.name = name
+        self.video_id = video_id
+        self.model_id = model_id
+        self.token_count = token_count
+        self.expires_at = time.monotonic() + ttl
+        self.refcount = 0
+        self.hits = 0
+
+    def remaining(self):
+        """有効期限までの残り秒数を返します。"""
+        return self.expires_at - time.monotonic()
+
+
+class ContextCacheRegistry:
+    """
+    ビデオ・モデルごとのコンテキストキャッシュのハンドルを管理します。
+
+    ハンドルは参照数が0になるまで削除せず、有効期限が近いハンドルは新しいリクエストに渡しません。
+    """
+
+    def __init__(self, enabled=None, min_tokens=None, min_uses=None, ttl=None, max_entries=None,
+                 expiry_margin=None, retry_seconds=None):
+        self.enabled = (enabled if enabled is not None else
+                        os.getenv('GEMINI_CONTEXT_CACHE_ENABLED', 'true').lower() == 'true')
+        self.min_tokens = int(min_tokens if min_tokens is not None else os.getenv('GEMINI_CONTEXT_CACHE_MIN_TOKENS', '32768'))
+        self.min_uses = int(min_uses if min_uses is not None else os.getenv('GEMINI_CONTEXT_CACHE_MIN_USES', '2'))
+        self.ttl = int(ttl if ttl is not None else os.getenv('GEMINI_CONTEXT_CACHE_TTL_SECONDS', '3600'))
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv('GEMINI_CONTEXT_CACHE_MAX_ENTRIES', '32'))
+        # 残りがこの秒数を切ったハンドルは、リクエストの途中で期限切れにならないよう使わない
+        self.expiry_margin = float(expiry_margin if expiry_margin is not None else os.getenv('GEMINI_CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS', '60'))
+        # キャッシュの作成に失敗したモデルは、この秒数の間は作成を試みない
+        self.retry_seconds = float(retry_seconds if retry_seconds is not None else os.getenv('GEMINI_CONTEXT_CACHE_RETRY_SECONDS', '300'))
+
+        self._handles = OrderedDict()
+        self._uses = OrderedDict()
+        self._creating = {}
+        self._disabled_until = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self.create_failures = 0
+
+    def _note_use(self, video_id):
+        """
+        ビデオのトランスクリプトの使用を記録し、TTL内の使用回数を返します。ロックを保持した状態で呼び出します。
+        """
+        now = time.monotonic()
+        count, last_used = self._uses.pop(video_id, (0, now))
+        count = count + 1 if now - last_used <= self.ttl else 1
+        self._uses[video_id] = (count, now)
+        while len(self._uses) > self.max_entries * 16:
+            self._uses.popitem(last=False)
+        return count
+
+    def _evict(self):
+        """
+        上限を超えたハンドルのうち、使用中でない古いものを取り除いて返します。ロックを保持した状態で呼び出します。
+        """
+        evicted = []
+        for key in list(self._handles):
+            if len(self._handles) <= self.max_entries:
+                break
+            if self._handles[key].refcount == 0:
+                evicted.append(self._handles.pop(key))
+                self.evicted += 1
+        return evicted
+
+    def acquire(self, video_id, model_id, prompt_tokens, create, delete):
+        """
+        ビデオのトランスクリプトのキャッシュを取得します。必要であれば作成します。
+        使い終わったらrelease()を呼び出してください。
+
+        Args:
+            video_id (str): YouTubeビデオID
+            model_id (str): キャッシュを使うモデルID（キャッシュはモデルごとに作成される）
+            prompt_tokens (int): トランスクリプトの推定トークン数
+            create (callable): TTL秒数を受け取ってキャッシュを作成し、(キャッシュ名, トークン数)を返す関数
+            delete (callable): キャッシュ名を受け取ってキャッシュを削除する関数
+
+        Returns:
+            CacheHandle: 使用できるキャッシュ
+            None: キャッシュを使わない場合（トランスクリプトが短い、初回の使用、作成に失敗したなど）
+        """
+        if not self.enabled or prompt_tokens < self.min_tokens:
+            return None
+
+        key = (video_id, model_id)
+        with self._lock:
+            uses = self._note_use(video_id)
+            handle = self._handles.get(key)
+            if handle is not None:
+                if handle.remaining() > self.expiry_margin:
+                    self._handles.move_to_end(key)
+                    handle.refcount += 1
+                    handle.hits += 1
+                    self.hits += 1
+                    return handle
+                # 期限切れ間近のハンドルは使用中のリクエストが終われば参照されなくなる
+                self._handles.pop(key)
+                self.expired += 1
+
+            if uses < self.min_uses or time.monotonic() < self._disabled_until.get(model_id, 0):
+                self.misses += 1
+                return None
+            creating = self._creating.setdefault(key, threading.Lock())
+
+        # 同じビデオのキャッシュを同時に重複して作成しない
+        with creating:
+            with self._lock:
+                handle = self._handles.get(key)
+                if handle is not None and handle.remaining() > self.expiry_margin:
+                    handle.refcount += 1
+                    handle.hits += 1
+                    self.hits += 1
+                    return handle
+                # 先に作成を試みたリクエストが失敗していた場合
+                if time.monotonic() < self._disabled_until.get(model_id, 0):
+                    self.misses += 1
+                    return None
+
+            try:
+                name, token_count = create(self.ttl)
+            except Exception as e:
+                print(f"コンテキストキャッシュ作成エラー: {str(e)}")
+                with self._lock:
+                    self.create_failures += 1
+                    self.misses += 1
+                    self._disabled_until[model_id] = time.monotonic() + self.retry_seconds
+                    self._creating.pop(key, None)
+                return None
+
+            with self._lock:
+                handle = CacheHandle(name, video_id, model_id, token_count, self.ttl)
+                handle.refcount = 1
+                self._handles[key] = handle
+                self.created += 1
+                self._creating.pop(key, None)
+                evicted = self._evict()
+
+        # 取り除いたキャッシュは有効期限を待たずに削除して保存料金を止める
+        for old in evicted:
+            try:
+                delete(old.name)
+            except Exception as e:
+                print(f"コンテキストキャッシュ削除エラー: {str(e)}")
+        return handle
+
+    def release(self, handle):
+        """acquire()で取得したハンドルの参照を解放します。"""
+        with self._lock:
+            handle.refcount -= 1
+
+    def invalidate(self, handle):
+        """
+        サーバー側で期限切れ・削除済みだったハンドルを取り除きます。
+        以降のリクエストでは必要に応じて作成し直します。
+        """
+        with self._lock:
+            key = (handle.video_id, handle.model_id)
+            if self._handles.get(key) is handle:
+                self._handles.pop(key)
+                self.expired += 1
+
+    def snapshot(self):
+        """キャッシュの件数とヒット数を辞書で返します。"""
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._handles),
+                'in_use': sum(1 for handle in self._handles.values() if handle.refcount > 0),
+                'cached_tokens': sum(handle.token_count or 0 for handle in self._handles.values()),
+                'created': self.created,
+                'hits': self.hits,
+                'misses': self.misses,
+                'expired': self.expired,
+                'evicted': self.evicted,
+                'create_failures': self.create_failures
+            }
+
+
+# アプリケーション全体で共有するコンテキストキャッシュのレジストリ
+context_cache_registry = ContextCacheRegistry()
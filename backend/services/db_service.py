@@ -1,27 +1,288 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from collections import deque
 import os
+import threading
+import time
+
+from services.profiling_service import current_profile, record_span
 
 # SQLAlchemyインスタンスを作成
 db = SQLAlchemy()
 
+# 読み取り専用クエリを振り分けるレプリカのバインド名
+REPLICA_BIND = 'replica'
+
+# 初期化済みのFlaskアプリケーション（フォーク後のエンジン破棄に使用）
+_app = None
+
+
+class PoolMetrics:
+    """
+    コネクションプールのチェックアウト待ち時間、コネクションの保持時間とタイムアウト数を記録します。
+    """
+
+    def __init__(self, window=1000):
+        self._waits = deque(maxlen=window)
+        self._holds = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.connections_opened = 0
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self._waits.append(seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def record_hold(self, seconds):
+        with self._lock:
+            self._holds.append(seconds)
+
+    def record_connect(self):
+        with self._lock:
+            self.connections_opened += 1
+
+    def snapshot(self):
+        with self._lock:
+            waits = sorted(self._waits)
+            holds = sorted(self._holds)
+
+        def percentile(samples, q):
+            if not samples:
+                return None
+            return round(samples[min(int(len(samples) * q / 100), len(samples) - 1)] * 1000, 2)
+
+        return {
+            'checkouts': self.checkouts,
+            'timeouts': self.timeouts,
+            'connections_opened': self.connections_opened,
+            'wait_p50_ms': percentile(waits, 50),
+            'wait_p95_ms': percentile(waits, 95),
+            'wait_max_ms': round(waits[-1] * 1000, 2) if waits else None,
+            'hold_p50_ms': percentile(holds, 50),
+            'hold_p95_ms': percentile(holds, 95)
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """
+    チェックアウト待ち時間を計測するQueuePool。
+
+    チェックアウトの前に発火するプールイベントはないため、待ち時間は公開APIのconnect()の前後で計測します。
+    チェックアウト・チェックイン・新しいコネクションの記録はプールイベント（_instrument_engine）で行います。
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        # 利用率の計算に使う設定値（プールの内部属性は参照しない）
+        self.max_overflow = kwargs.get('max_overflow', 10)
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record_wait(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # dispose()時に作り直されたプールでも計測を引き継ぐ
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def _instrument_engine(engine):
+    """
+    エンジンのコネクションプールにイベントリスナーを登録します。
+    エンジンに登録したリスナーはdispose()で作り直されたプールにも引き継がれます。
+    """
+    def metrics():
+        return getattr(engine.pool, 'metrics', None)
+
+    @event.listens_for(engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+
+    @event.listens_for(engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        pool_metrics = metrics()
+        if started is not None and pool_metrics is not None:
+            pool_metrics.record_hold(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_connection, connection_record):
+        pool_metrics = metrics()
+        if pool_metrics is not None:
+            pool_metrics.record_connect()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # プロファイル中のリクエストのクエリのみ開始時刻を記録する
+    if current_profile() is not None:
+        conn.info.setdefault('profile_query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('profile_query_started')
+    if started:
+        record_span('database', started.pop(), time.perf_counter())
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('profile_query_started'):
+        connection.info['profile_query_started'].pop()
+
+
+def _build_uri(host, port, name, user, password):
+    # psycopg3を使用するように接続文字列を作成
+    return f'postgresql+psycopg://{user}:{password}@{host}:{port}/{name}'
+
+
+def _engine_options():
+    """
+    環境変数からエンジンとコネクションプールの設定を作成します。
+
+    Returns:
+        dict: SQLALCHEMY_ENGINE_OPTIONSに設定する辞書
+    """
+    connect_args = {
+        'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
+    }
+
+    # psycopgのプリペアドステートメント設定（PgBouncerのトランザクションモードでは"none"で無効化）
+    prepare_threshold = os.getenv('DB_PREPARE_THRESHOLD')
+    if prepare_threshold:
+        connect_args['prepare_threshold'] = None if prepare_threshold.lower() == 'none' else int(prepare_threshold)
+
+    return {
+        'poolclass': InstrumentedQueuePool,
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '5')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        'pool_pre_ping': os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        'connect_args': connect_args
+    }
+
+
+def _dispose_engines_after_fork():
+    """
+    フォークした子プロセスで親から引き継いだコネクションを破棄します。
+
+    close=Falseにより親プロセスのコネクションは閉じずに手放し、子プロセスでは新しいプールが作られます。
+    """
+    if _app is None:
+        return
+
+    with _app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
 def init_db(app):
     """
     Flaskアプリケーションにデータベース設定を適用し、SQLAlchemyを初期化します。
-    
+
     Args:
         app: Flaskアプリケーションインスタンス
     """
+    global _app
+
     # 環境変数からデータベース接続情報を取得
     db_host = os.getenv('DB_HOST', 'localhost')
     db_port = os.getenv('DB_PORT', '5432')
     db_name = os.getenv('DB_NAME', 'youtubeapp')
     db_user = os.getenv('DB_USER', 'postgres')
     db_password = os.getenv('DB_PASSWORD', 'postgres')
-    
+
     # SQLAlchemy設定
-    # psycopg3を使用するように接続文字列を更新
-    app.config['SQLALCHEMY_DATABASE_URI'] = f'postgresql+psycopg://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}'
+    app.config['SQLALCHEMY_DATABASE_URI'] = _build_uri(db_host, db_port, db_name, db_user, db_password)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = _engine_options()
+
+    # 読み取り専用クエリ用のレプリカ（DB_REPLICA_HOSTが設定されている場合のみ）
+    replica_host = os.getenv('DB_REPLICA_HOST')
+    if replica_host:
+        app.config['SQLALCHEMY_BINDS'] = {
+            REPLICA_BIND: {
+                'url': _build_uri(
+                    replica_host,
+                    os.getenv('DB_REPLICA_PORT', db_port),
+                    db_name,
+                    os.getenv('DB_REPLICA_USER', db_user),
+                    os.getenv('DB_REPLICA_PASSWORD', db_password)
+                ),
+                **_engine_options()
+            }
+        }
+
     # SQLAlchemyをアプリケーションに初期化
     db.init_app(app)
+
+    # コネクションプールの使用状況を記録するイベントを登録する
+    with app.app_context():
+        for engine in db.engines.values():
+            _instrument_engine(engine)
+
+    # マルチワーカーサーバーでフォークされた場合に備えてエンジンを破棄する
+    if _app is None and hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_dispose_engines_after_fork)
+    _app = app
+
+
+def read_bind_arguments():
+    """
+    読み取り専用クエリをレプリカに振り分けるためのbind_argumentsを返します。
+    レプリカが設定されていない場合は空の辞書を返し、プライマリが使われます。
+
+    使用例:
+        db.session.scalars(select(Model), bind_arguments=read_bind_arguments())
+    """
+    engine = db.engines.get(REPLICA_BIND)
+    return {'bind': engine} if engine is not None else {}
+
+
+def get_pool_stats():
+    """
+    エンジンごとのコネクションプールの使用状況を返します。
+
+    Returns:
+        dict: バインド名（プライマリは"primary"）からプール統計への辞書
+    """
+    stats = {}
+    for name, engine in db.engines.items():
+        pool = engine.pool
+        entry = {'status': pool.status()}
+
+        if isinstance(pool, QueuePool):
+            # max_overflowが負（上限なし）の場合は上限がないため、使用率はNoneとする
+            max_overflow = getattr(pool, 'max_overflow', 0)
+            capacity = pool.size() + max_overflow if max_overflow >= 0 else None
+            checked_out = pool.checkedout()
+            entry.update({
+                'size': pool.size(),
+                'checked_out': checked_out,
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'utilization': round(checked_out / capacity, 3) if capacity else None
+            })
+
+        if isinstance(pool, InstrumentedQueuePool):
+            entry.update(pool.metrics.snapshot())
+
+        stats[name or 'primary'] = entry
+    return stats
@@ -0,0 +1,142 @@
+"""
+チャンネルダイジェストサービス - 保存済みのビデオ要約からチャンネルの期間ごとのダイジェストを作成・キャッシュする
+
+ダイジェストはトランスクリプトではなく保存済みの要約（brief_summary、key_points、main_topics）を
+1回のモデル呼び出しでまとめて作成します。要約のないビデオは1回のリクエストにつき数件ずつ要約して補い、
+対象期間のアップロードが変わらない限り作成済みのダイジェストを再利用します。
+"""
+import os
+
+from sqlalchemy.exc import IntegrityError
+
+from services.db_service import db
+from services.store_service import save_summary
+from models.channel_digest import ChannelDigest
+from models.video_summary import VideoSummary
+
+
+def default_max_new_summaries():
+    """1回のダイジェストのリクエストで新たに要約するビデオ数の上限"""
+    return int(os.getenv('DIGEST_MAX_NEW_SUMMARIES', '3'))
+
+
+def get_stored_summaries(video_ids, language):
+    """
+    各ビデオの保存済みの要約を1件ずつ選びます。指定した言語、JSON形式、新しいものの順に優先します。
+
+    Args:
+        video_ids (list): YouTubeビデオID
+        language (str): ダイジェストの言語
+
+    Returns:
+        dict: ビデオIDをキーとするVideoSummary
+    """
+    if not video_ids:
+        return {}
+
+    best = {}
+    for summary in VideoSummary.query.filter(VideoSummary.video_id.in_(video_ids)).all():
+        rank = (
+            summary.language != language,
+            summary.format_type != 'json',
+            -(summary.updated_at.timestamp() if summary.updated_at else 0)
+        )
+        if summary.video_id not in best or rank < best[summary.video_id][0]:
+            best[summary.video_id] = (rank, summary)
+    return {video_id: summary for video_id, (_, summary) in best.items()}
+
+
+def get_cached_digest(channel_id, language, window_days):
+    """保存済みのダイジェストを取得します。存在しない場合はNoneを返します。"""
+    return ChannelDigest.query.filter_by(
+        channel_id=channel_id,
+        language=language,
+        window_days=window_days
+    ).first()
+
+
+def is_fresh(digest, video_ids):
+    """
+    ダイジェストをそのまま返せるかを判定します。
+    生成時から対象期間のアップロードが変わっておらず、要約待ちのビデオがない場合に有効です。
+    """
+    return digest is not None and digest.overview is not None and \
+        list(digest.video_ids or []) == list(video_ids) and not digest.pending_video_ids
+
+
+def build_digest(channel_id, channel_title, uploads, youtube_service, gemini_service,
+                 language='ja', window_days=7, max_new=None, previous=None):
+    """
+    要約のないビデオを最大max_new件要約してから、保存済みの要約を1回のモデル呼び出しでダイジェストにまとめて保存します。
+    ダイジェストに含める要約が前回から変わっていない場合はモデルを呼び出しません。
+
+    Args:
+        channel_id (str): YouTubeチャンネルID
+        channel_title (str): チャンネル名
+        uploads (list): 対象期間のアップロード（YouTubeService.get_recent_uploadsの結果）
+        youtube_service (YouTubeService): YouTubeServiceのインスタンス
+        gemini_service (GeminiService): GeminiServiceのインスタンス
+        language (str): ダイジェストの言語
+        window_days (int): 対象期間の日数
+        max_new (int, optional): 新たに要約するビデオ数の上限
+        previous (ChannelDigest, optional): 保存済みのダイジェスト
+
+    Returns:
+        tuple: (保存したChannelDigest, 使用したトークン数)
+
+    Raises:
+        Exception: 要約またはダイジェストの生成でエラーが発生した場合
+    """
+    max_new = default_max_new_summaries() if max_new is None else max_new
+    video_ids = [upload['video_id'] for upload in uploads]
+    published = {upload['video_id']: upload['published_at'] for upload in uploads}
+
+    # 以前に要約できなかったビデオは再試行しない
+    unavailable = set(previous.unavailable_video_ids or []) & set(video_ids) if previous else set()
+    stored = get_stored_summaries(video_ids, language)
+    tokens = 0
+
+    # 要約のないビデオを新しい順に補う（残りは次回以降のリクエストで補う）
+    missing = [video_id for video_id in video_ids if video_id not in stored and video_id not in unavailable]
+    for video_id in missing[:max_new]:
+        result = gemini_service.generate_summary(video_id, youtube_service, language=language, format_type='json')
+        if 'error' in result:
+            unavailable.add(video_id)
+            continue
+        tokens += result.get('token_count') or 0
+        summary = save_summary(video_id, result, format_type='json', language=language)
+        if summary:
+            stored[video_id] = summary
+
+    summarized = [video_id for video_id in video_ids if video_id in stored]
+    digest = previous or ChannelDigest(channel_id=channel_id, language=language, window_days=window_days)
+
+    # ダイジェストに含める要約が変わった場合のみ集約し直す
+    if summarized and (digest.overview is None or list(digest.summarized_video_ids or []) != summarized):
+        result = gemini_service.generate_digest(
+            channel_title,
+            [dict(stored[video_id].to_dict(), published_at=published[video_id]) for video_id in summarized],
+            language=language,
+            window_days=window_days
+        )
+        tokens += result.get('token_count') or 0
+        digest.overview = result.get('overview')
+        digest.themes = result.get('themes') or []
+        digest.highlights = result.get('highlights') or []
+        digest.model_id = result.get('model_id')
+        digest.token_count = result.get('token_count')
+        digest.summarized_video_ids = summarized
+
+    digest.video_ids = video_ids
+    digest.unavailable_video_ids = sorted(unavailable)
+
+    try:
+        if digest.id is None:
+            db.session.add(digest)
+        db.session.commit()
+    except IntegrityError:
+        # 同時リクエストで先に保存された場合はそちらを返す
+        db.session.rollback()
+        digest = get_cached_digest(channel_id, language, window_days)
+
+    return digest, tokens
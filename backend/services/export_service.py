@@ -0,0 +1,116 @@
+"""
+エクスポートサービス - 要約をNDJSONまたはMarkdownファイルのZIPとしてストリーミングする
+
+どちらの形式も1件ずつ書き出して即座にyieldするジェネレーターのため、
+エクスポート全体をメモリ上に組み立てることはありません。
+"""
+import json
+import re
+import zipfile
+
+# ファイル名に使えない文字
+_UNSAFE_FILENAME_RE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def summary_to_record(row):
+    """エクスポートする1件の要約を辞書に変換します。"""
+    return {
+        'history_id': row.history_id,
+        'video_id': row.video_id,
+        'video_url': f'https://www.youtube.com/watch?v={row.video_id}',
+        'video_title': row.video_title,
+        'channel_id': row.channel_id,
+        'channel_title': row.channel_title,
+        'format_type': row.format_type,
+        'language': row.language,
+        'brief_summary': row.brief_summary,
+        'key_points': row.key_points or [],
+        'main_topics': row.main_topics or [],
+        'markdown_content': row.markdown_content,
+        'created_at': _iso(row.created_at),
+        'recorded_at': _iso(row.recorded_at),
+        'viewed_at': _iso(row.viewed_at)
+    }
+
+
+def render_markdown(row):
+    """
+    要約をMarkdown文書にします。Markdown形式の要約は本文をそのまま使い、
+    JSON形式の要約は簡潔な要約・重要なポイント・主なトピックから組み立てます。
+    """
+    if row.markdown_content:
+        return row.markdown_content
+
+    lines = [
+        f'# {row.video_title or row.video_id}',
+        '',
+        f'- 動画URL: https://www.youtube.com/watch?v={row.video_id}'
+    ]
+    if row.channel_title:
+        lines.append(f'- チャンネル: {row.channel_title}')
+    lines += ['', '## 要約', '', row.brief_summary or '']
+    if row.key_points:
+        lines += ['', '## 重要なポイント', ''] + [f'- {point}' for point in row.key_points]
+    if row.main_topics:
+        lines += ['', '## 主なトピック', ''] + [f'- {topic}' for topic in row.main_topics]
+    return '\n'.join(lines) + '\n'
+
+
+def markdown_filename(row):
+    """
+    ZIP内のファイル名を返します。履歴IDを先頭に付けるため、ファイルはエクスポート順に並び、
+    中断した場合は最後のファイルの履歴IDから再開位置がわかります。
+    """
+    title = _UNSAFE_FILENAME_RE.sub('_', row.video_title or '').strip('_')[:60]
+    name = f'{row.history_id:08d}_{row.video_id}_{row.language}'
+    return f'{name}_{title}.md' if title else f'{name}.md'
+
+
+def stream_ndjson(rows):
+    """要約を1行1件のJSON（NDJSON）として1件ずつyieldします。"""
+    for row in rows:
+        yield json.dumps(summary_to_record(row), ensure_ascii=False) + '\n'
+
+
+class _ChunkWriter:
+    """
+    ZipFileの書き込み先となるシーク不可能なバッファ。
+    書き込まれたバイト列をためておき、ジェネレーターが取り出すたびに空にします。
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_markdown_zip(rows):
+    """
+    要約をMarkdownファイルにしてZIPとして1ファイルずつyieldします。
+
+    ZipFileはシークできない書き込み先にはデータディスクリプタ付きで書き出すため、
+    各ファイルを書き終えた時点でそのバイト列を送信できます。
+    """
+    writer = _ChunkWriter()
+    with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in rows:
+            info = zipfile.ZipInfo(markdown_filename(row), date_time=(row.viewed_at or row.created_at).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, render_markdown(row).encode('utf-8'))
+            yield writer.drain()
+    # 中央ディレクトリ
+    yield writer.drain()
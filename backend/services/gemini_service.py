@@ -1,11 +1,63 @@
 import os
 import json
+import re
 import requests
 from dotenv import load_dotenv
+from services.qa_service import transcript_retriever, format_timestamp
+from services.model_router import ModelRouter, estimate_tokens
+from services.circuit_breaker import get_breaker, CircuitOpenError
+from services.context_cache_service import context_cache_registry
 
 # Load environment variables
 load_dotenv()
 
+
+class GeminiAPIError(Exception):
+    """Error response from the Gemini API."""
+    
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _is_gemini_failure(error):
+    """Client errors (4xx except 429) are caused by the request, not by the Gemini API."""
+    if isinstance(error, GeminiAPIError):
+        return error.status_code == 429 or error.status_code >= 500
+    return True
+
+
+def _is_cache_miss(error):
+    """The referenced cached content has expired or was deleted on the server."""
+    return isinstance(error, GeminiAPIError) and (
+        error.status_code == 404 or (error.status_code in (400, 403) and 'cache' in str(error).lower())
+    )
+
+
+# Circuit breaker shared by all GeminiService instances and model tiers
+gemini_breaker = get_breaker('gemini', is_failure=_is_gemini_failure)
+
+# Stands in for the transcript in prompts that reference a cached transcript
+CACHED_TRANSCRIPT_REFERENCE = "（コンテキストとして登録したこの動画のトランスクリプトを参照してください）"
+
+# Display names used in prompts; other language codes are passed to the model as-is
+LANGUAGE_NAMES = {
+    'ja': '日本語',
+    'en': '英語',
+    'zh': '中国語',
+    'ko': '韓国語',
+    'es': 'スペイン語',
+    'fr': 'フランス語',
+    'de': 'ドイツ語',
+    'pt': 'ポルトガル語'
+}
+
+
+def language_name(language):
+    """Return the display name of a language code for use in prompts."""
+    return LANGUAGE_NAMES.get(language.split('-')[0].lower(), language)
+
+
 class GeminiService:
     """Service class for handling Vertex AI Gemini model operations."""
     
@@ -13,7 +65,17 @@ class GeminiService:
         """Initialize the Gemini service with configuration from environment variables."""
         self.api_key = os.getenv('GEMINI_API_KEY')
         self.model_id = os.getenv('GEMINI_MODEL_ID', 'gemini-1.5-pro')
-        self.api_endpoint = f"https://generativelanguage.googleapis.com/v1beta/models/{self.model_id}:generateContent"
+        self.api_endpoint = self._endpoint(self.model_id)
+        self.router = ModelRouter(primary_model=self.model_id)
+        self.request_timeout = float(os.getenv('GEMINI_REQUEST_TIMEOUT', '120'))
+    
+    def _endpoint(self, model_id):
+        """Return the generateContent endpoint for a model."""
+        return f"https://generativelanguage.googleapis.com/v1beta/models/{model_id}:generateContent"
+    
+    def _cached_contents_endpoint(self, name=None):
+        """Return the cachedContents endpoint, or the endpoint of one cached content."""
+        return f"https://generativelanguage.googleapis.com/v1beta/{name or 'cachedContents'}"
     
     def _get_transcript(self, video_id, youtube_service):
         """
@@ -36,6 +98,8 @@ class GeminiService:
             else:
                 print(f"Transcript error: {transcript_result['error']}")
                 return None
+        except CircuitOpenError:
+            raise
         except Exception as e:
             print(f"Error getting transcript: {str(e)}")
             return None
@@ -54,10 +118,294 @@ class GeminiService:
         try:
             # Use the YouTube service to get video details
             return youtube_service._get_video_details(video_id)
+        except CircuitOpenError:
+            raise
         except Exception as e:
             print(f"Error getting video details: {str(e)}")
             return None
     
+    def _call_model(self, model_id, prompt, cached_content=None):
+        """
+        Send a prompt to a specific Gemini model through the Gemini circuit breaker.
+        
+        Args:
+            model_id (str): Gemini model ID
+            prompt (str): Prompt text
+            cached_content (str, optional): Name of a cached content created for the same model
+            
+        Returns:
+            dict: Raw response data
+            
+        Raises:
+            CircuitOpenError: If the Gemini circuit is open
+            GeminiAPIError: If the API returns an error
+        """
+        return gemini_breaker.call(self._post_prompt, model_id, prompt, cached_content)
+    
+    def _post_prompt(self, model_id, prompt, cached_content=None):
+        """Post a prompt to the generateContent endpoint and return the raw response data."""
+        # Prepare request payload
+        payload = {
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{"text": prompt}]
+                }
+            ]
+        }
+        if cached_content:
+            payload["cachedContent"] = cached_content
+        
+        # Make API request with API key authentication
+        response = requests.post(
+            f"{self._endpoint(model_id)}?key={self.api_key}",
+            headers={"Content-Type": "application/json"},
+            json=payload,
+            timeout=self.request_timeout
+        )
+        
+        # Check for errors
+        if response.status_code != 200:
+            error_message = response.json().get('error', {}).get('message', f"API error: {response.status_code}")
+            raise GeminiAPIError(error_message, response.status_code)
+        
+        return response.json()
+    
+    def _create_cached_content(self, model_id, video_id, video_details, transcript, ttl):
+        """
+        Register a transcript as cached content for a model.
+        
+        Returns:
+            tuple: (cached content name, token count of the cached content)
+            
+        Raises:
+            CircuitOpenError: If the Gemini circuit is open
+            GeminiAPIError: If the API returns an error (e.g. the model does not support caching)
+        """
+        return gemini_breaker.call(self._post_cached_content, model_id, video_id, video_details, transcript, ttl)
+    
+    def _post_cached_content(self, model_id, video_id, video_details, transcript, ttl):
+        """Post a transcript to the cachedContents endpoint."""
+        payload = {
+            "model": f"models/{model_id}",
+            "displayName": f"transcript-{video_id}",
+            "contents": [
+                {
+                    "role": "user",
+                    "parts": [{
+                        "text": f"以下はYouTube動画「{video_details.get('title', '不明')}」（動画ID: {video_id}）のトランスクリプトです。\n\n{transcript}"
+                    }]
+                }
+            ],
+            "ttl": f"{ttl}s"
+        }
+        
+        response = requests.post(
+            f"{self._cached_contents_endpoint()}?key={self.api_key}",
+            headers={"Content-Type": "application/json"},
+            json=payload,
+            timeout=self.request_timeout
+        )
+        
+        if response.status_code != 200:
+            error_message = response.json().get('error', {}).get('message', f"API error: {response.status_code}")
+            raise GeminiAPIError(error_message, response.status_code)
+        
+        data = response.json()
+        return data["name"], data.get("usageMetadata", {}).get("totalTokenCount")
+    
+    def _delete_cached_content(self, name):
+        """Delete a cached content so that it stops accruing storage before its TTL."""
+        response = requests.delete(
+            f"{self._cached_contents_endpoint(name)}?key={self.api_key}",
+            timeout=self.request_timeout
+        )
+        if response.status_code not in (200, 404):
+            raise GeminiAPIError(f"API error: {response.status_code}", response.status_code)
+    
+    def _acquire_transcript_cache(self, video_id, video_details, transcript, model_id):
+        """
+        Get a cached content handle for a long transcript, creating it when the video is reused.
+        
+        Args:
+            model_id (str): Model the prompt will be sent to (caches are bound to a model)
+        
+        Returns:
+            CacheHandle: Handle to release with context_cache_registry.release(), or None
+        """
+        return context_cache_registry.acquire(
+            video_id,
+            model_id,
+            estimate_tokens(transcript),
+            create=lambda ttl: self._create_cached_content(model_id, video_id, video_details, transcript, ttl),
+            delete=self._delete_cached_content
+        )
+    
+    def _call_with_cache(self, model_id, prompt, cache=None):
+        """
+        Call a model with the cached-transcript prompt when a cache exists for that model.
+        Falls back to the full prompt when the cache has expired on the server.
+        """
+        if cache is not None:
+            handle, cached_prompt = cache
+            if handle.model_id == model_id:
+                try:
+                    return self._call_model(model_id, cached_prompt, cached_content=handle.name)
+                except GeminiAPIError as e:
+                    if not _is_cache_miss(e):
+                        raise
+                    print(f"Cached content {handle.name} is no longer available: {str(e)}")
+                    context_cache_registry.invalidate(handle)
+        return self._call_model(model_id, prompt)
+    
+    def _generate_content(self, prompt, format_type="json", cache=None):
+        """
+        Generate text for a prompt, routing it to a model tier by its size and format.
+        
+        With a cache the call is pinned to the model the cache was created for and is not hedged,
+        since a hedge to another model would have to re-send the whole transcript.
+        
+        Args:
+            prompt (str): Prompt text
+            format_type (str, optional): Requested output format ("json" or "markdown")
+            cache (tuple, optional): (CacheHandle, prompt that references the cached transcript)
+            
+        Returns:
+            tuple: (text of the first candidate, metadata with model_id, hedged and usage)
+            
+        Raises:
+            Exception: If the API returns an error
+        """
+        prompt_tokens = estimate_tokens(prompt)
+        response_data, model_id, hedged = self.router.execute(
+            lambda model: self._call_with_cache(model, prompt, cache),
+            prompt_tokens,
+            format_type,
+            model_id=cache[0].model_id if cache is not None else None
+        )
+        
+        # Parse the response
+        response_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
+        metadata = {
+            "model_id": model_id,
+            "hedged": hedged,
+            "usage": response_data.get("usageMetadata", {})
+        }
+        return response_text, metadata
+    
+    def _parse_json_response(self, response_text, fallback=None):
+        """
+        Extract a JSON object from the model response text.
+        
+        Args:
+            response_text (str): Text returned by the model
+            fallback (dict, optional): Data to return if no JSON could be found
+            
+        Returns:
+            dict: Parsed data, or the fallback (a basic summary structure by default)
+        """
+        try:
+            # Try to parse the entire response as JSON
+            return json.loads(response_text)
+        except json.JSONDecodeError:
+            # If that fails, try to extract JSON from the text
+            json_match = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL)
+            if json_match:
+                return json.loads(json_match.group(1))
+            
+            if fallback is not None:
+                return fallback
+            
+            # If no JSON found, create a basic structure with the full text
+            return {
+                "brief_summary": response_text[:200] + "...",
+                "key_points": ["Could not parse structured data from model response"],
+                "main_topics": ["Could not parse structured data from model response"]
+            }
+    
+    def _build_summary_prompt(self, video_id, video_details, transcript_text, format_type, language_instruction):
+        """
+        Build the summary prompt for a format.
+        
+        Args:
+            video_id (str): YouTube video ID
+            video_details (dict): Video details
+            transcript_text (str): Transcript, or CACHED_TRANSCRIPT_REFERENCE when it is cached
+            format_type (str): Format type for the summary ("json" or "markdown")
+            language_instruction (str): Instruction for the output language
+            
+        Returns:
+            str: Prompt text
+        """
+        # Create a prompt for Gemini based on format type
+        if format_type == "markdown":
+            prompt = f"""
+            以下のYouTube動画のトランスクリプトに基づいて、Markdown形式で詳細な要約を生成してください。
+            この要約は情報共有や外部への展開に適した形式にしてください。
+
+            - 動画タイトル: {video_details.get('title', '不明')}
+            - 動画ID: {video_id}
+            - チャンネル名: {video_details.get('channel_title', '不明')}
+            - 公開日: {video_details.get('published_at', '不明')}
+
+            - トランスクリプト: {transcript_text}
+
+            以下の構造でMarkdown形式の要約を作成してください：
+
+            1. 見出し（# 動画タイトル）
+            2. 概要情報（公開日、チャンネル名、動画URLなど）
+            3. 簡潔な要約（2～3段落）- 動画の主要な内容を簡潔に説明
+            4. 重要なポイント（箇条書き）- 動画から得られる主要な学びや情報
+            5. 詳細な内容（小見出しと説明）- 動画の主要なセクションごとに詳細な説明
+            6. 結論 - 動画の結論や視聴者へのメッセージ
+            7. 関連リソース（もし言及されていれば）
+
+            Markdownの構文を正しく使用してください：
+            - 見出しには # ## ### を適切に使用
+            - 重要な点は **太字** で強調
+            - 引用が必要な場合は > を使用
+            - コードやコマンドは ``` で囲む
+            - 表やリンクも適切に使用
+
+            要約は情報が豊富で、読みやすく、共有しやすいものにしてください。
+            技術的な内容や専門用語がある場合は、簡潔な説明を追加してください。
+            {language_instruction}
+
+            また、以下のJSON形式でメタデータも提供してください：
+            ```json
+            {{
+                "brief_summary": "...",
+                "key_points": ["...", "...", "..."],
+                "main_topics": ["...", "...", "..."],
+                "markdown_content": "（上記で生成したMarkdown形式の要約全体）"
+            }}
+            ```
+            """
+        else:
+            prompt = f"""
+            以下のYouTube動画のトランスクリプトに基づいて、簡潔な要約を生成してください。
+
+            - 動画タイトル: {video_details.get('title', '不明')}
+            - 動画ID: {video_id}
+
+            - トランスクリプト: {transcript_text}
+
+            以下を提供してください：
+            1. 簡潔な要約（2～3文）
+            2. 重要なポイント（3～5箇条書き）
+            3. 主な議論内容
+            {language_instruction}
+
+            以下のJSON形式で回答を記述してください：
+            {{
+                "brief_summary": "...",
+                "key_points": ["...", "...", "..."],
+                "main_topics": ["...", "...", "..."]
+            }}
+            """
+        
+        return prompt
+    
     def generate_summary(self, video_id, youtube_service, language=None, format_type="json"):
         """
         Generate a summary for a YouTube video using Vertex AI Gemini.
@@ -85,125 +433,336 @@ class GeminiService:
             if not video_details:
                 return {"error": "Could not retrieve video details"}
             
-            # Create a prompt for Gemini based on format type
-            if format_type == "markdown":
-                prompt = f"""
-                以下のYouTube動画のトランスクリプトに基づいて、Markdown形式で詳細な要約を生成してください。
-                この要約は情報共有や外部への展開に適した形式にしてください。
-
-                - 動画タイトル: {video_details.get('title', '不明')}
-                - 動画ID: {video_id}
-                - チャンネル名: {video_details.get('channel_title', '不明')}
-                - 公開日: {video_details.get('published_at', '不明')}
-
-                - トランスクリプト: {transcript}
-
-                以下の構造でMarkdown形式の要約を作成してください：
-
-                1. 見出し（# 動画タイトル）
-                2. 概要情報（公開日、チャンネル名、動画URLなど）
-                3. 簡潔な要約（2～3段落）- 動画の主要な内容を簡潔に説明
-                4. 重要なポイント（箇条書き）- 動画から得られる主要な学びや情報
-                5. 詳細な内容（小見出しと説明）- 動画の主要なセクションごとに詳細な説明
-                6. 結論 - 動画の結論や視聴者へのメッセージ
-                7. 関連リソース（もし言及されていれば）
-
-                Markdownの構文を正しく使用してください：
-                - 見出しには # ## ### を適切に使用
-                - 重要な点は **太字** で強調
-                - 引用が必要な場合は > を使用
-                - コードやコマンドは ``` で囲む
-                - 表やリンクも適切に使用
-
-                要約は情報が豊富で、読みやすく、共有しやすいものにしてください。
-                技術的な内容や専門用語がある場合は、簡潔な説明を追加してください。
-                
-                また、以下のJSON形式でメタデータも提供してください：
-                ```json
-                {{
-                    "brief_summary": "...",
-                    "key_points": ["...", "...", "..."],
-                    "main_topics": ["...", "...", "..."],
-                    "markdown_content": "（上記で生成したMarkdown形式の要約全体）"
-                }}
-                ```
-                """
-            else:
-                prompt = f"""
-                以下のYouTube動画のトランスクリプトに基づいて、簡潔な要約を生成してください。
-
-                - 動画タイトル: {video_details.get('title', '不明')}
-                - 動画ID: {video_id}
-
-                - トランスクリプト: {transcript}
-
-                以下を提供してください：
-                1. 簡潔な要約（2～3文）
-                2. 重要なポイント（3～5箇条書き）
-                3. 主な議論内容
-
-                以下のJSON形式で回答を記述してください：
-                {{
-                    "brief_summary": "...",
-                    "key_points": ["...", "...", "..."],
-                    "main_topics": ["...", "...", "..."]
-                }}
-                """
-            
-            # Prepare request payload
-            payload = {
-                "contents": [
-                    {
-                        "role": "user",
-                        "parts": [{"text": prompt}]
-                    }
-                ]
-            }
-            
-            # Make API request with API key authentication
-            response = requests.post(
-                f"{self.api_endpoint}?key={self.api_key}",
-                headers={"Content-Type": "application/json"},
-                json=payload
-            )
+            # The prompts are written in Japanese; ask for another output language explicitly
+            language_instruction = ""
+            if language and language != "ja":
+                language_instruction = f"要約（JSONの値とMarkdown本文）はすべて{language_name(language)}（言語コード: {language}）で記述してください。"
             
-            # Check for errors
-            if response.status_code != 200:
-                error_message = response.json().get('error', {}).get('message', f"API error: {response.status_code}")
-                raise Exception(error_message)
+            prompt = self._build_summary_prompt(video_id, video_details, transcript, format_type, language_instruction)
             
-            # Parse the response
-            response_data = response.json()
-            response_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
+            # Reference the transcript cached with the model API instead of re-sending it when possible.
+            # The model is chosen once here so that the cache is created for the model that is called.
+            model_id = self.router.choose_model(estimate_tokens(prompt), format_type)
+            cache_handle = self._acquire_transcript_cache(video_id, video_details, transcript, model_id)
+            cache = None
+            if cache_handle is not None:
+                cache = (cache_handle, self._build_summary_prompt(
+                    video_id, video_details, CACHED_TRANSCRIPT_REFERENCE, format_type, language_instruction
+                ))
             
-            # Extract JSON from the response
+            # Call the model and extract structured data from the response
             try:
-                # Try to parse the entire response as JSON
-                summary_data = json.loads(response_text)
-            except json.JSONDecodeError:
-                # If that fails, try to extract JSON from the text
-                import re
-                json_match = re.search(r'```json\n(.*?)\n```', response_text, re.DOTALL)
-                if json_match:
-                    summary_data = json.loads(json_match.group(1))
-                else:
-                    # If no JSON found, create a basic structure with the full text
-                    summary_data = {
-                        "brief_summary": response_text[:200] + "...",
-                        "key_points": ["Could not parse structured data from model response"],
-                        "main_topics": ["Could not parse structured data from model response"]
-                    }
+                response_text, metadata = self._generate_content(prompt, format_type=format_type, cache=cache)
+            finally:
+                if cache_handle is not None:
+                    context_cache_registry.release(cache_handle)
+            
+            summary_data = self._parse_json_response(response_text)
+            summary_data["model_id"] = metadata["model_id"]
+            summary_data["token_count"] = metadata["usage"].get("totalTokenCount") or estimate_tokens(prompt)
+            if metadata["usage"].get("cachedContentTokenCount"):
+                summary_data["cached_token_count"] = metadata["usage"]["cachedContentTokenCount"]
             
             # Add video details to the response
+            summary_data["language"] = language or "ja"
             summary_data["video_id"] = video_id
             summary_data["video_url"] = f"https://www.youtube.com/watch?v={video_id}"
             
-            # Add video title to the response
+            # Add video title and channel to the response
             if video_details and 'title' in video_details:
                 summary_data["video_title"] = video_details['title']
+            if video_details and video_details.get('channel_id'):
+                summary_data["channel_id"] = video_details['channel_id']
+                summary_data["channel_title"] = video_details.get('channel_title')
             
             return summary_data
             
         except Exception as e:
             print(f"Error generating summary: {str(e)}")
             raise e
+    
+    def translate_summary(self, source_summary, language, format_type="json"):
+        """
+        Translate a stored summary into another language instead of re-summarizing the transcript.
+        
+        Args:
+            source_summary (dict): Stored summary (VideoSummary.to_dict())
+            language (str): Target language code
+            format_type (str, optional): Format type of the translated summary ("json" or "markdown")
+            
+        Returns:
+            dict: Summary information in the same shape as generate_summary
+            
+        Raises:
+            Exception: If there's an error translating the summary
+        """
+        try:
+            fields = {
+                "brief_summary": source_summary.get("brief_summary") or "",
+                "key_points": source_summary.get("key_points") or [],
+                "main_topics": source_summary.get("main_topics") or []
+            }
+            if format_type == "markdown":
+                fields["markdown_content"] = source_summary.get("markdown_content") or ""
+            
+            prompt = f"""
+            以下のYouTube動画の要約を{language_name(language)}（言語コード: {language}）に翻訳してください。
+
+            - 動画タイトル: {source_summary.get('video_title') or '不明'}
+
+            要約:
+            {json.dumps(fields, ensure_ascii=False, indent=2)}
+
+            JSONのキーと構造、Markdownの構文はそのまま保ち、値のみを翻訳してください。
+            固有名詞や専門用語は必要に応じて原語を括弧内に残してください。
+            翻訳後の要約を同じJSON形式で回答してください。
+            """
+            
+            response_text, metadata = self._generate_content(prompt, format_type=format_type)
+            summary_data = self._parse_json_response(response_text, fallback={})
+            if not summary_data.get("brief_summary"):
+                # Never cache the untranslated text under the target language
+                raise ValueError("Could not parse the translated summary from model response")
+            summary_data["model_id"] = metadata["model_id"]
+            summary_data["token_count"] = metadata["usage"].get("totalTokenCount") or estimate_tokens(prompt)
+            summary_data["language"] = language
+            summary_data["translated_from"] = source_summary.get("language")
+            
+            # Carry over the video details from the source summary
+            video_id = source_summary.get("video_id")
+            summary_data["video_id"] = video_id
+            summary_data["video_url"] = f"https://www.youtube.com/watch?v={video_id}"
+            for key in ("video_title", "channel_id", "channel_title"):
+                if source_summary.get(key):
+                    summary_data[key] = source_summary[key]
+            
+            return summary_data
+            
+        except Exception as e:
+            print(f"Error translating summary: {str(e)}")
+            raise e
+    
+    def generate_digest(self, channel_title, summaries, language="ja", window_days=7):
+        """
+        Combine stored per-video summaries of a channel into one digest with a single model call.
+        
+        Args:
+            channel_title (str): Channel title
+            summaries (list): Dicts with video_id, video_title, published_at, brief_summary,
+                              key_points and main_topics, newest first
+            language (str, optional): Language of the digest
+            window_days (int, optional): Number of days covered by the digest
+            
+        Returns:
+            dict: overview, themes and highlights, with model_id and token_count
+            
+        Raises:
+            Exception: If there's an error generating the digest
+        """
+        try:
+            # Only the compact summaries are sent, never the transcripts
+            compact = [
+                {
+                    "video_id": summary["video_id"],
+                    "title": summary.get("video_title"),
+                    "published_at": summary.get("published_at"),
+                    "brief_summary": summary.get("brief_summary"),
+                    "key_points": summary.get("key_points") or [],
+                    "main_topics": summary.get("main_topics") or []
+                }
+                for summary in summaries
+            ]
+            
+            prompt = f"""
+            以下は、YouTubeチャンネル「{channel_title or '不明'}」が過去{window_days}日間に公開した動画の要約です。
+            これらをもとに、このチャンネルがこの期間に何を取り上げたかをまとめたダイジェストを作成してください。
+
+            動画の要約:
+            {json.dumps(compact, ensure_ascii=False, indent=2)}
+
+            以下を提供してください：
+            1. 期間全体の概要（2～4文）
+            2. 主なテーマ（複数の動画にまたがる話題ごとに、タイトル・説明・関連する動画のvideo_id）
+            3. 特に注目すべき動画や発表（3～5箇条書き）
+            要約（JSONの値）はすべて{language_name(language)}（言語コード: {language}）で記述してください。
+
+            以下のJSON形式で回答を記述してください：
+            {{
+                "overview": "...",
+                "themes": [
+                    {{"title": "...", "summary": "...", "video_ids": ["...", "..."]}}
+                ],
+                "highlights": ["...", "...", "..."]
+            }}
+            """
+            
+            response_text, metadata = self._generate_content(prompt, format_type="json")
+            digest = self._parse_json_response(response_text, fallback={
+                "overview": response_text[:500],
+                "themes": [],
+                "highlights": []
+            })
+            digest["model_id"] = metadata["model_id"]
+            digest["token_count"] = metadata["usage"].get("totalTokenCount") or estimate_tokens(prompt)
+            return digest
+            
+        except Exception as e:
+            print(f"Error generating digest: {str(e)}")
+            raise e
+    
+    def fold_live_window(self, video_details, state, window, language="ja"):
+        """
+        Fold a new window of a live stream's transcript into its rolling summary with one model call.
+        
+        Only the rolling summary and the new window are sent, so the input grows with the new
+        content rather than with the length of the stream so far.
+        
+        Args:
+            video_details (dict): Video details from YouTubeService._get_video_details
+            state (dict): Current rolling summary with brief_summary, key_points and main_topics
+                          (empty for the first window)
+            window (dict): New transcript window with text, start and end (seconds)
+            language (str, optional): Language of the summary
+            
+        Returns:
+            dict: Updated brief_summary, key_points and main_topics, window_summary of the new
+                  window, with model_id and token_count
+            
+        Raises:
+            Exception: If there's an error generating the summary
+        """
+        try:
+            rolling = {
+                "brief_summary": state.get("brief_summary") or "",
+                "key_points": state.get("key_points") or [],
+                "main_topics": state.get("main_topics") or []
+            }
+            
+            prompt = f"""
+            以下はYouTubeのライブ配信「{video_details.get('title') or '不明'}」の要約の途中経過と、
+            その後に配信された区間（{format_timestamp(window['start'])}～{format_timestamp(window['end'])}）のトランスクリプトです。
+            新しい区間の内容を反映して、配信開始からここまでの要約を更新してください。
+
+            これまでの要約:
+            {json.dumps(rolling, ensure_ascii=False, indent=2)}
+
+            新しい区間のトランスクリプト:
+            {window['text']}
+
+            以下を提供してください：
+            1. 配信開始からここまでの簡潔な要約（2～4文）
+            2. 重要なポイント（3～7箇条書き、これまでのポイントも必要に応じて残す）
+            3. 主な議論内容
+            4. 新しい区間だけの要約（1～2文）
+            要約（JSONの値）はすべて{language_name(language)}（言語コード: {language}）で記述してください。
+
+            以下のJSON形式で回答を記述してください：
+            {{
+                "brief_summary": "...",
+                "key_points": ["...", "...", "..."],
+                "main_topics": ["...", "...", "..."],
+                "window_summary": "..."
+            }}
+            """
+            
+            response_text, metadata = self._generate_content(prompt, format_type="json")
+            summary_data = self._parse_json_response(response_text, fallback={})
+            if not summary_data.get("brief_summary"):
+                # Keep the previous state rather than folding in an unparsed response
+                raise ValueError("Could not parse the live summary from model response")
+            summary_data["model_id"] = metadata["model_id"]
+            summary_data["token_count"] = metadata["usage"].get("totalTokenCount") or estimate_tokens(prompt)
+            return summary_data
+            
+        except Exception as e:
+            print(f"Error folding live window: {str(e)}")
+            raise e
+    
+    def answer_question(self, video_id, question, youtube_service, top_k=4):
+        """
+        Answer a question about a YouTube video using only the relevant transcript chunks.
+        
+        Args:
+            video_id (str): YouTube video ID
+            question (str): Question about the video
+            youtube_service (YouTubeService): Instance of YouTubeService
+            top_k (int, optional): Number of transcript chunks to send to the model
+            
+        Returns:
+            dict: Answer with timestamps of the supporting chunks
+            
+        Raises:
+            Exception: If there's an error generating the answer
+        """
+        try:
+            # Get the time-stamped transcript segments
+            transcript_result = youtube_service.get_transcript(video_id, language_codes=['ja', 'en'])
+            if not transcript_result['success']:
+                return {"error": "Could not retrieve video transcript"}
+            
+            segments = transcript_result.get('raw_data') or []
+            chunks, total_chunks = transcript_retriever.retrieve(video_id, segments, question, top_k=top_k)
+            if not chunks:
+                return {"error": "Could not retrieve video transcript"}
+            
+            video_details = self._get_video_details(video_id, youtube_service) or {}
+            
+            context = "\n\n".join(
+                f"[{chunk['timestamp']}] {chunk['text']}" for chunk in chunks
+            )
+            prompt = f"""
+            以下はYouTube動画のトランスクリプトから、質問に関連する部分だけを抜き出したものです。
+            各部分の先頭の[ ]内は動画内のタイムスタンプです。
+
+            - 動画タイトル: {video_details.get('title', '不明')}
+            - 動画ID: {video_id}
+
+            - トランスクリプトの抜粋:
+            {context}
+
+            - 質問: {question}
+
+            抜粋の内容だけに基づいて、質問と同じ言語で簡潔に回答してください。
+            抜粋から回答できない場合は、その旨を回答してください。
+            回答の根拠となった部分のタイムスタンプを必ず含めてください。
+
+            以下のJSON形式で回答を記述してください：
+            {{
+                "answer": "...",
+                "timestamps": ["m:ss", "..."]
+            }}
+            """
+            
+            response_text, metadata = self._generate_content(prompt)
+            answer_data = self._parse_json_response(
+                response_text,
+                fallback={"answer": response_text, "timestamps": []}
+            )
+            
+            # Link each supporting chunk to its position in the video
+            answer_data["sources"] = [
+                {
+                    "timestamp": chunk['timestamp'],
+                    "start": chunk['start'],
+                    "end": chunk['end'],
+                    "text": chunk['text'],
+                    "url": f"https://www.youtube.com/watch?v={video_id}&t={int(chunk['start'])}s"
+                }
+                for chunk in chunks
+            ]
+            answer_data["video_id"] = video_id
+            answer_data["model_id"] = metadata["model_id"]
+            answer_data["token_count"] = metadata["usage"].get("totalTokenCount") or estimate_tokens(prompt)
+            answer_data["question"] = question
+            answer_data["chunks_used"] = len(chunks)
+            answer_data["chunks_total"] = total_chunks
+            answer_data["context_chars"] = len(context)
+            answer_data["transcript_chars"] = len(transcript_result.get('transcript') or '')
+            if video_details.get('title'):
+                answer_data["video_title"] = video_details['title']
+            
+            return answer_data
+            
+        except Exception as e:
+            print(f"Error answering question: {str(e)}")
+            raise e
@@ -0,0 +1,217 @@
+"""
+要約履歴サービス - ユーザーごとの要約履歴の記録、キーセットページネーションによる一覧取得とエクスポート
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from services.db_service import db, read_bind_arguments
+from models.user_summary_history import UserSummaryHistory
+from models.video_summary import VideoSummary
+
+
+class InvalidCursorError(ValueError):
+    """ページネーションのカーソルが不正な場合に送出される例外"""
+
+
+def encode_cursor(entry_id):
+    """一覧の最後の項目の位置を不透明なカーソル文字列にします。"""
+    payload = json.dumps([entry_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    カーソル文字列を履歴IDに戻します。
+
+    以前の形式の(created_at, id)のカーソルは、履歴IDのみを使います。
+
+    Raises:
+        InvalidCursorError: カーソルが不正な場合
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded))
+        return int(payload[-1])
+    except (ValueError, TypeError, IndexError, KeyError) as e:
+        raise InvalidCursorError('cursorパラメータが不正です') from e
+
+
+def record_history(user_id, summary):
+    """
+    ユーザーの要約履歴に要約を記録します。記録済みの場合は最後に見た日時（last_viewed_at）のみを更新します。
+
+    履歴の記録に失敗しても要約のレスポンスは返せるよう、例外はログ出力のみ行います。
+
+    Args:
+        user_id (str): ユーザーID
+        summary (VideoSummary): 保存済みの要約
+
+    Returns:
+        UserSummaryHistory: 記録した履歴
+        None: 記録に失敗した場合
+    """
+    try:
+        entry = UserSummaryHistory.query.filter_by(user_id=user_id, summary_id=summary.id).first()
+        if entry is None:
+            entry = UserSummaryHistory(user_id=user_id, summary_id=summary.id)
+            db.session.add(entry)
+        entry.last_viewed_at = datetime.utcnow()
+        db.session.commit()
+        return entry
+    except IntegrityError:
+        # 同時リクエストで既に記録された場合
+        db.session.rollback()
+        return UserSummaryHistory.query.filter_by(user_id=user_id, summary_id=summary.id).first()
+    except Exception as e:
+        db.session.rollback()
+        print(f"要約履歴の記録エラー: {str(e)}")
+        return None
+
+
+def list_history(user_id, limit=20, cursor=None):
+    """
+    ユーザーの要約履歴を記録の新しい順に取得します。
+
+    一覧にはMarkdown本文やキーポイントを含めず、必要な列だけを取得します。
+    ページの続きは履歴IDによるキーセットで取得するため、ページが深くなってもOFFSETのように遅くならず、
+    ページを取得している間に要約が再訪されても項目がページ間を移動しません。
+
+    Args:
+        user_id (str): ユーザーID
+        limit (int): 1ページの件数
+        cursor (str, optional): 前のページのnext_cursor
+
+    Returns:
+        dict: 履歴の一覧と次のページのカーソル（最後のページの場合はNone）
+
+    Raises:
+        InvalidCursorError: カーソルが不正な場合
+    """
+    query = (
+        select(
+            UserSummaryHistory.id,
+            UserSummaryHistory.created_at,
+            UserSummaryHistory.last_viewed_at,
+            VideoSummary.id.label('summary_id'),
+            VideoSummary.video_id,
+            VideoSummary.video_title,
+            VideoSummary.channel_id,
+            VideoSummary.channel_title,
+            VideoSummary.format_type,
+            VideoSummary.language,
+            VideoSummary.brief_summary
+        )
+        .join(VideoSummary, VideoSummary.id == UserSummaryHistory.summary_id)
+        .where(UserSummaryHistory.user_id == user_id)
+    )
+
+    if cursor:
+        query = query.where(UserSummaryHistory.id < decode_cursor(cursor))
+
+    # 次のページがあるかを判定するために1件多く取得する
+    rows = db.session.execute(
+        query.order_by(UserSummaryHistory.id.desc()).limit(limit + 1)
+    ).all()
+
+    items = [{
+        'history_id': row.id,
+        'summary_id': row.summary_id,
+        'video_id': row.video_id,
+        'video_url': f'https://www.youtube.com/watch?v={row.video_id}',
+        'video_title': row.video_title,
+        'channel_id': row.channel_id,
+        'channel_title': row.channel_title,
+        'format_type': row.format_type,
+        'language': row.language,
+        'brief_summary': row.brief_summary,
+        'recorded_at': row.created_at.isoformat() if row.created_at else None,
+        'viewed_at': row.last_viewed_at.isoformat() if row.last_viewed_at else None
+    } for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last.id)
+
+    return {
+        'items': items,
+        'count': len(items),
+        'next_cursor': next_cursor
+    }
+
+
+def iter_history_for_export(user_id, channel_id=None, since=None, until=None, after=None, batch_size=200):
+    """
+    エクスポート用にユーザーの要約履歴を要約の全文とともに履歴IDの昇順で返すジェネレーター。
+
+    サーバーサイドカーソルでbatch_size件ずつ読み込むため、履歴が大量でもメモリ使用量は一定です。
+    履歴IDの昇順で返すため、中断した場合は最後に受け取った履歴IDをafterに指定して再開できます。
+
+    Args:
+        user_id (str): ユーザーID
+        channel_id (str, optional): チャンネルIDで絞り込む
+        since (datetime, optional): この日時以降に記録された履歴に絞り込む
+        until (datetime, optional): この日時より前に記録された履歴に絞り込む
+        after (int, optional): この履歴IDより後から再開する
+        batch_size (int): 1回に読み込む行数
+
+    Yields:
+        Row: 履歴と要約の列（history_id、recorded_at、viewed_at、VideoSummaryの各列）
+    """
+    query = (
+        select(
+            UserSummaryHistory.id.label('history_id'),
+            UserSummaryHistory.created_at.label('recorded_at'),
+            UserSummaryHistory.last_viewed_at.label('viewed_at'),
+            VideoSummary.video_id,
+            VideoSummary.video_title,
+            VideoSummary.channel_id,
+            VideoSummary.channel_title,
+            VideoSummary.format_type,
+            VideoSummary.language,
+            VideoSummary.brief_summary,
+            VideoSummary.key_points,
+            VideoSummary.main_topics,
+            VideoSummary.markdown_content,
+            VideoSummary.created_at
+        )
+        .join(VideoSummary, VideoSummary.id == UserSummaryHistory.summary_id)
+        .where(UserSummaryHistory.user_id == user_id)
+    )
+
+    if channel_id:
+        query = query.where(VideoSummary.channel_id == channel_id)
+    if since:
+        query = query.where(UserSummaryHistory.created_at >= since)
+    if until:
+        query = query.where(UserSummaryHistory.created_at < until)
+    if after:
+        query = query.where(UserSummaryHistory.id > after)
+
+    query = query.order_by(UserSummaryHistory.id).execution_options(yield_per=batch_size, stream_results=True)
+
+    # 大量の読み取りなのでレプリカが設定されていればレプリカから読み取る
+    result = db.session.execute(query, bind_arguments=read_bind_arguments())
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def get_history_entry(user_id, history_id):
+    """
+    ユーザーの要約履歴の1件を要約の全文とともに取得します。
+
+    Args:
+        user_id (str): ユーザーID
+        history_id (int): 履歴ID
+
+    Returns:
+        UserSummaryHistory: 履歴
+        None: 存在しない場合、または他のユーザーの履歴の場合
+    """
+    return UserSummaryHistory.query.filter_by(id=history_id, user_id=user_id).first()
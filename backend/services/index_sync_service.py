@@ -0,0 +1,164 @@
+"""
+インデックス同期サービス - データベースの更新をプロセス内のインデックスに増分で反映する
+
+前回の同期で見たupdated_atの最大値（ウォーターマーク）より後の行だけを読み出すと、遅れてコミットされた
+トランザクションの行（ウォーターマークより前のupdated_atを持つ）や、ウォーターマークと同じupdated_atの行を
+取りこぼします。同期のたびにウォーターマークからINDEX_SYNC_OVERLAP_SECONDS秒さかのぼって読み直し、
+重なった範囲の行は前回反映したupdated_atと比べて重複を除きます。
+
+最初の全件の読み込みはバックグラウンドのスレッドで行い、リクエストは読み込みの完了を待ちません。
+"""
+import os
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+
+
+class IndexLoadingError(Exception):
+    """最初の全件の読み込みが完了していないため検索できない場合に送出される例外"""
+
+    def __init__(self, name, retry_after=5):
+        super().__init__(f'{name}のインデックスを構築中です')
+        self.name = name
+        self.retry_after = retry_after
+
+
+class IncrementalSync:
+    """
+    updated_atでデータベースと増分同期するインデックスの基底クラス。
+
+    サブクラスは_fetch_changesと_apply_changesを実装します。データベースの読み出しと
+    ドキュメントの組み立てはインデックスのロック（self._lock）の外で行い、_apply_changesの中で
+    ロックを取得してインデックスを更新します。同期を実行するのは同時に1スレッドのみです。
+
+    Args:
+        name (str): ログとエラーメッセージに使うインデックス名
+        sync_interval (float): 増分同期の最小間隔（秒）
+        overlap_seconds (float, optional): ウォーターマークからさかのぼって読み直す秒数
+    """
+
+    def __init__(self, name, sync_interval, overlap_seconds=None):
+        self.name = name
+        self.sync_interval = sync_interval
+        self.overlap = timedelta(seconds=float(overlap_seconds if overlap_seconds is not None
+                                               else os.getenv('INDEX_SYNC_OVERLAP_SECONDS', '60')))
+        self._watermark = None
+        # 読み直す範囲の行について、前回反映したupdated_atを記録する
+        self._seen = {}
+        self._loaded = False
+        self._loader = None
+        self._last_sync = 0.0
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._loader_lock = threading.Lock()
+
+    @property
+    def ready(self):
+        """最初の全件の読み込みが完了していればTrueを返します。"""
+        return self._loaded
+
+    def _fetch_changes(self, since):
+        """
+        since以降に更新された行を返します。
+
+        Args:
+            since (datetime): 更新日時の下限（この値を含む）。最初の読み込みではNone
+
+        Returns:
+            iterable: (行のキー, updated_at, _apply_changesに渡す値)のタプル
+        """
+        raise NotImplementedError
+
+    def _apply_changes(self, payloads, initial):
+        """
+        変更された行をインデックスに反映します。
+
+        Args:
+            payloads (iterable): _fetch_changesが返した値のうち、まだ反映していないもの
+            initial (bool): 最初の全件の読み込みの場合はTrue（新しいインデックスを作って置き換える）
+        """
+        raise NotImplementedError
+
+    def _run_sync(self):
+        """
+        変更された行を読み出して反映し、ウォーターマークを進めます。_sync_lockを保持した状態で呼び出します。
+        """
+        since = self._watermark - self.overlap if self._watermark is not None else None
+        applied = []
+
+        def changed():
+            for key, updated_at, payload in self._fetch_changes(since):
+                if updated_at is not None and self._seen.get(key) == updated_at:
+                    continue
+                applied.append((key, updated_at))
+                yield payload
+
+        self._apply_changes(changed(), initial=not self._loaded)
+
+        for key, updated_at in applied:
+            if updated_at is None:
+                continue
+            self._seen[key] = updated_at
+            if self._watermark is None or updated_at > self._watermark:
+                self._watermark = updated_at
+
+        # 次の同期で読み直す範囲より古い行は、もう読み出されないため記録から外す
+        if self._watermark is not None:
+            cutoff = self._watermark - self.overlap
+            self._seen = {key: updated_at for key, updated_at in self._seen.items() if updated_at >= cutoff}
+
+        self._loaded = True
+        self._last_sync = time.monotonic()
+
+    def _load(self, app):
+        """バックグラウンドのスレッドで最初の全件を読み込みます。"""
+        try:
+            with app.app_context():
+                with self._sync_lock:
+                    if not self._loaded:
+                        self._run_sync()
+        except Exception as e:
+            print(f"{self.name}インデックス読み込みエラー: {str(e)}")
+
+    def start(self, app):
+        """
+        最初の全件の読み込みをバックグラウンドで開始します。
+        読み込み済み、または読み込み中の場合は何もしません。
+
+        Args:
+            app (Flask): スレッドでアプリケーションコンテキストを作成するためのアプリケーション
+        """
+        with self._loader_lock:
+            if self._loaded or (self._loader is not None and self._loader.is_alive()):
+                return
+            self._loader = threading.Thread(target=self._load, args=(app,), name='index-load', daemon=True)
+            self._loader.start()
+
+    def sync(self, force=False):
+        """
+        データベースの更新をインデックスに反映します。
+
+        他のスレッドが同期中の場合は待たずに戻り、現在のインデックスをそのまま使います。
+
+        Args:
+            force (bool): 同期間隔に関係なく、他の同期の完了を待って同期する場合はTrue
+
+        Raises:
+            IndexLoadingError: forceでなく、最初の全件の読み込みが完了していない場合（読み込みを開始して送出します）
+        """
+        if not self._loaded and not force:
+            # フォーク後の子プロセスでは読み込みのスレッドが存在しないため、ここで開始する
+            self.start(current_app._get_current_object())
+            raise IndexLoadingError(self.name)
+
+        if not force and time.monotonic() - self._last_sync < self.sync_interval:
+            return
+
+        if not self._sync_lock.acquire(blocking=force):
+            return
+        try:
+            self._run_sync()
+        finally:
+            self._sync_lock.release()
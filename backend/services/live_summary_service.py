@@ -0,0 +1,201 @@
+"""
+ライブ配信要約サービス - 伸びていくトランスクリプトを新しい区間だけ要約して、ビデオごとの要約に畳み込む
+
+ライブ配信・プレミア公開中はトランスクリプトが途中までしか取得できず、要約し直すたびに配信の最初から
+送り直すことになります。ライブモードでは要約済みの最後のセグメントの位置を保存しておき、
+それより後のセグメントだけを区間に分けて、これまでの要約とともにモデルに渡して要約を更新します。
+1回の更新のコストは配信全体ではなく新しい区間の長さに比例します。
+"""
+import os
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
+
+from services.db_service import db
+from services.store_service import save_summary
+from services.qa_service import format_timestamp
+from models.live_summary_state import LiveSummaryState
+
+# 要約と同じ優先順位で取得する（GeminiService._get_transcriptと同じ言語コード）
+LIVE_LANGUAGE_CODES = ['ja', 'en']
+
+
+class LiveSummaryError(Exception):
+    """ライブ配信の要約を更新できない場合に送出される例外"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _settings():
+    """環境変数から区間の設定を取得します。"""
+    return {
+        # 配信中はこの文字数に満たない新しいトランスクリプトは次回に回す
+        'min_window_chars': int(os.getenv('LIVE_MIN_WINDOW_CHARS', '800')),
+        # 1区間あたりの最大文字数
+        'max_window_chars': int(os.getenv('LIVE_MAX_WINDOW_CHARS', '24000')),
+        # 1回の更新で畳み込む区間数の上限（途中から要約を始めた場合の遅れは次回以降に取り戻す）
+        'max_windows': int(os.getenv('LIVE_MAX_WINDOWS_PER_UPDATE', '3'))
+    }
+
+
+def get_live_state(video_id, language):
+    """保存済みのライブ配信要約の状態を取得します。存在しない場合はNoneを返します。"""
+    return LiveSummaryState.query.filter_by(video_id=video_id, language=language).first()
+
+
+def pending_segments(segments, processed_until):
+    """要約済みの位置より後のセグメントを返します。"""
+    if processed_until is None:
+        return list(segments)
+    return [segment for segment in segments if float(segment.get('start', 0)) > processed_until]
+
+
+def split_windows(segments, max_chars):
+    """
+    セグメントを連続した区間にまとめます。
+
+    Returns:
+        list: text、start、end、last_start（区間の最後のセグメントの開始秒数）、segment_countを持つ区間のリスト
+    """
+    windows = []
+    current = None
+
+    for segment in segments:
+        text = (segment.get('text') or '').strip()
+        start = float(segment.get('start', 0))
+
+        if current is not None and current['chars'] + len(text) > max_chars:
+            windows.append(current)
+            current = None
+
+        if current is None:
+            current = {'texts': [], 'chars': 0, 'start': start, 'end': start, 'last_start': start, 'segment_count': 0}
+
+        if text:
+            current['texts'].append(text)
+            current['chars'] += len(text) + 1
+        current['end'] = start + float(segment.get('duration', 0))
+        current['last_start'] = start
+        current['segment_count'] += 1
+
+    if current is not None:
+        windows.append(current)
+
+    return [
+        {
+            'text': ' '.join(window['texts']),
+            'chars': window['chars'],
+            'start': window['start'],
+            'end': window['end'],
+            'last_start': window['last_start'],
+            'segment_count': window['segment_count']
+        }
+        for window in windows
+    ]
+
+
+def update_live_summary(video_id, youtube_service, gemini_service, language='ja'):
+    """
+    ライブ配信の最新のトランスクリプトを取得し、要約済みの位置より後の区間を要約に畳み込みます。
+
+    配信中は新しいトランスクリプトがLIVE_MIN_WINDOW_CHARSに満たなければモデルを呼び出しません。
+    配信が終了して最後まで畳み込んだら状態を"completed"にし、通常の要約としても保存します。
+
+    Args:
+        video_id (str): YouTubeビデオID
+        youtube_service (YouTubeService): YouTubeServiceのインスタンス
+        gemini_service (GeminiService): GeminiServiceのインスタンス
+        language (str): 要約の言語
+
+    Returns:
+        dict: state（LiveSummaryState、まだ要約していない場合はNone）、windows（今回畳み込んだ区間数）、pending_chars（未要約の文字数）、
+              tokens（使用したトークン数）
+
+    Raises:
+        LiveSummaryError: ビデオやトランスクリプトが取得できない場合
+        CircuitOpenError: 上流サービスのサーキットがオープン状態の場合
+    """
+    settings = _settings()
+    state = get_live_state(video_id, language)
+    if state is not None and state.status == 'completed':
+        return {'state': state, 'windows': 0, 'pending_chars': 0, 'tokens': 0}
+
+    video_details = youtube_service._get_video_details(video_id)
+    if not video_details:
+        raise LiveSummaryError('ビデオが見つかりません', 404)
+    if video_details.get('live_broadcast_content') == 'upcoming':
+        raise LiveSummaryError('配信はまだ開始されていません', 409)
+    ended = video_details.get('live_broadcast_content') != 'live'
+
+    # 配信中のトランスクリプトは伸びていくためキャッシュを使わない
+    transcript = youtube_service.get_transcript(video_id, language_codes=LIVE_LANGUAGE_CODES, use_cache=False)
+    if not transcript['success']:
+        raise LiveSummaryError(f"トランスクリプトを取得できません: {transcript['error']}", 409)
+
+    pending = pending_segments(transcript.get('raw_data') or [], state.processed_until if state else None)
+    windows = split_windows(pending, settings['max_window_chars'])
+    pending_chars = sum(window['chars'] for window in windows)
+
+    # 配信中に新しい内容が少なければ、次回の更新にまとめる
+    if not ended and pending_chars < settings['min_window_chars']:
+        return {'state': state, 'windows': 0, 'pending_chars': pending_chars, 'tokens': 0}
+
+    if state is None:
+        state = LiveSummaryState(video_id=video_id, language=language, timeline=[], segment_offset=0, window_count=0, token_count=0)
+    state.video_title = video_details.get('title')
+    state.channel_id = video_details.get('channel_id')
+    state.channel_title = video_details.get('channel_title')
+
+    tokens = 0
+    folded = 0
+    timeline = list(state.timeline or [])
+    for window in windows[:settings['max_windows']]:
+        if window['text']:
+            result = gemini_service.fold_live_window(video_details, {
+                'brief_summary': state.brief_summary,
+                'key_points': state.key_points,
+                'main_topics': state.main_topics
+            }, window, language=language)
+            tokens += result.get('token_count') or 0
+            state.brief_summary = result.get('brief_summary')
+            state.key_points = result.get('key_points') or []
+            state.main_topics = result.get('main_topics') or []
+            state.model_id = result.get('model_id')
+            timeline.append({
+                'start': window['start'],
+                'end': window['end'],
+                'timestamp': format_timestamp(window['start']),
+                'summary': result.get('window_summary')
+            })
+            state.window_count += 1
+
+        state.processed_until = window['last_start']
+        state.segment_offset += window['segment_count']
+        pending_chars -= window['chars']
+        folded += 1
+
+    state.timeline = timeline
+    state.token_count += tokens
+
+    # 配信終了後に最後まで畳み込んだら完了とし、通常の要約・トランスクリプトキャッシュとしても使えるようにする
+    completed = ended and folded == len(windows) and state.brief_summary is not None
+    if completed:
+        state.status = 'completed'
+
+    try:
+        if state.id is None:
+            db.session.add(state)
+        db.session.commit()
+    except (IntegrityError, StaleDataError):
+        # 同時に更新された場合は、先に保存された状態を返す（今回の区間は破棄する）
+        db.session.rollback()
+        return {'state': get_live_state(video_id, language), 'windows': 0, 'pending_chars': pending_chars, 'tokens': tokens}
+
+    if completed:
+        save_summary(video_id, state.to_summary_result(), format_type='json', language=language)
+        if youtube_service.transcript_cache is not None:
+            youtube_service.transcript_cache.set(video_id, transcript)
+
+    return {'state': state, 'windows': folded, 'pending_chars': max(pending_chars, 0), 'tokens': tokens}
@@ -0,0 +1,259 @@
+"""
+モデルルーティングサービス - プロンプトの長さとフォーマットに応じたGeminiモデルの選択とヘッジリクエスト
+
+短いトランスクリプトは高速なモデル、長いものや詳細なMarkdown要約は標準モデルに振り分けます。
+モデルごとのレイテンシを記録し、SLOを超えたモデルを避ける判断とヘッジの遅延に利用します。
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextvars import copy_context
+
+# レイテンシ統計を保持するサンプル数
+LATENCY_WINDOW = 200
+
+# この秒数より古いサンプルはパーセンタイルに使わない（SLO超過で避けたモデルが回復したら再び選ばれるように）
+LATENCY_MAX_AGE_SECONDS = 300
+
+# パーセンタイルを信頼するために必要な最小サンプル数
+MIN_LATENCY_SAMPLES = 10
+
+# CJK文字（日本語は1文字あたり約1トークンとして見積もる）
+_CJK_RE = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af]')
+
+
+def estimate_tokens(text):
+    """
+    テキストのトークン数を概算します。
+
+    CJK文字は1文字1トークン、それ以外は4文字1トークンとして数えます。
+
+    Args:
+        text (str): 対象のテキスト
+
+    Returns:
+        int: 推定トークン数
+    """
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk) // 4
+
+
+class LatencyStats:
+    """
+    モデルごとの直近のレイテンシとエラー数を記録します。
+
+    呼び出されなくなったモデルの古いサンプルが残り続けないよう、max_age秒より古いサンプルは捨てます。
+    """
+
+    def __init__(self, window=LATENCY_WINDOW, max_age=LATENCY_MAX_AGE_SECONDS):
+        self._samples = deque(maxlen=window)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self.count = 0
+        self.errors = 0
+
+    def record(self, seconds, success=True):
+        """1回の呼び出し結果を記録します。"""
+        with self._lock:
+            self.count += 1
+            if success:
+                self._samples.append((time.monotonic(), seconds))
+            else:
+                self.errors += 1
+
+    def percentile(self, q):
+        """
+        直近のレイテンシのパーセンタイル（秒）を返します。
+
+        Args:
+            q (float): パーセンタイル（0〜100）
+
+        Returns:
+            float: レイテンシ（秒）。直近max_age秒のサンプルが不足している場合はNone（SLO超過とは見なさない）
+        """
+        cutoff = time.monotonic() - self.max_age
+        with self._lock:
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            samples = sorted(seconds for _, seconds in self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        index = min(int(len(samples) * q / 100), len(samples) - 1)
+        return samples[index]
+
+    def snapshot(self):
+        """統計情報を辞書で返します。"""
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+
+class ModelRouter:
+    """
+    プロンプトのトークン数とフォーマットからモデルを選択し、必要に応じてヘッジリクエストを行います。
+
+    ヘッジが有効な場合、選択したモデルの応答がp95レイテンシを超えても返らなければ
+    高速モデルに2つ目のリクエストを送り、先に成功した方の結果を使います。
+    ヘッジによる追加コストはプロンプトサイズと1分あたりのトークン数で制限します。
+    """
+
+    def __init__(self, primary_model=None, fast_model=None):
+        self.primary_model = primary_model or os.getenv('GEMINI_MODEL_ID', 'gemini-1.5-pro')
+        self.fast_model = fast_model or os.getenv('GEMINI_FAST_MODEL_ID', 'gemini-1.5-flash')
+
+        # フォーマットごとに高速モデルへ振り分けるトークン数の上限
+        self.fast_max_tokens = {
+            'json': int(os.getenv('GEMINI_FAST_MAX_TOKENS', '30000')),
+            'markdown': int(os.getenv('GEMINI_FAST_MAX_TOKENS_MARKDOWN', '8000'))
+        }
+        self.latency_slo = float(os.getenv('GEMINI_LATENCY_SLO_SECONDS', '30'))
+        self.latency_max_age = float(os.getenv('GEMINI_LATENCY_WINDOW_SECONDS', LATENCY_MAX_AGE_SECONDS))
+
+        # ヘッジリクエストの設定
+        self.hedge_enabled = os.getenv('GEMINI_HEDGE_ENABLED', 'false').lower() == 'true'
+        self.hedge_model = os.getenv('GEMINI_HEDGE_MODEL_ID', self.fast_model)
+        self.hedge_default_delay = float(os.getenv('GEMINI_HEDGE_DEFAULT_DELAY_SECONDS', '20'))
+        self.hedge_max_prompt_tokens = int(os.getenv('GEMINI_HEDGE_MAX_PROMPT_TOKENS', '50000'))
+        self.hedge_token_budget = int(os.getenv('GEMINI_HEDGE_TOKEN_BUDGET_PER_MINUTE', '200000'))
+
+        self.stats = {}
+        self._stats_lock = threading.Lock()
+        self._hedge_tokens = deque()
+        self._hedge_lock = threading.Lock()
+        self.hedges_issued = 0
+        self.hedges_won = 0
+
+        self._executor = None
+        if self.hedge_enabled:
+            self._executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('GEMINI_HEDGE_MAX_WORKERS', '8')),
+                thread_name_prefix='gemini-hedge'
+            )
+
+    def _stats_for(self, model_id):
+        with self._stats_lock:
+            if model_id not in self.stats:
+                self.stats[model_id] = LatencyStats(max_age=self.latency_max_age)
+            return self.stats[model_id]
+
+    def _breaches_slo(self, model_id):
+        p95 = self._stats_for(model_id).percentile(95)
+        return p95 is not None and p95 > self.latency_slo
+
+    def choose_model(self, prompt_tokens, format_type='json'):
+        """
+        プロンプトのトークン数とフォーマットからモデルを選択します。
+
+        選択したモデルのp95がSLOを超えていて、もう一方のモデルが超えていない場合はそちらを使います。
+
+        Args:
+            prompt_tokens (int): プロンプトの推定トークン数
+            format_type (str): 要約のフォーマット（"json"または"markdown"）
+
+        Returns:
+            str: モデルID
+        """
+        limit = self.fast_max_tokens.get(format_type, self.fast_max_tokens['json'])
+        model_id = self.fast_model if prompt_tokens <= limit else self.primary_model
+        alternative = self.primary_model if model_id == self.fast_model else self.fast_model
+
+        if model_id != alternative and self._breaches_slo(model_id) and not self._breaches_slo(alternative):
+            return alternative
+        return model_id
+
+    def hedge_delay(self, model_id):
+        """ヘッジリクエストを送るまでの待ち時間（モデルのp95、サンプル不足時はデフォルト値）を返します。"""
+        p95 = self._stats_for(model_id).percentile(95)
+        return p95 if p95 is not None else self.hedge_default_delay
+
+    def _reserve_hedge_budget(self, prompt_tokens):
+        """コスト上限内であればヘッジ用のトークンを予約します。"""
+        if prompt_tokens > self.hedge_max_prompt_tokens:
+            return False
+
+        now = time.monotonic()
+        with self._hedge_lock:
+            while self._hedge_tokens and now - self._hedge_tokens[0][0] > 60:
+                self._hedge_tokens.popleft()
+            used = sum(tokens for _, tokens in self._hedge_tokens)
+            if used + prompt_tokens > self.hedge_token_budget:
+                return False
+            self._hedge_tokens.append((now, prompt_tokens))
+            self.hedges_issued += 1
+            return True
+
+    def _timed_call(self, call, model_id):
+        """呼び出しのレイテンシをモデルの統計に記録します。"""
+        started = time.monotonic()
+        try:
+            result = call(model_id)
+        except Exception:
+            self._stats_for(model_id).record(time.monotonic() - started, success=False)
+            raise
+        self._stats_for(model_id).record(time.monotonic() - started)
+        return result
+
+    def execute(self, call, prompt_tokens, format_type='json', model_id=None):
+        """
+        選択したモデルで呼び出しを実行します。
+
+        Args:
+            call (callable): モデルIDを受け取ってAPIを呼び出す関数
+            prompt_tokens (int): プロンプトの推定トークン数
+            format_type (str): 要約のフォーマット
+            model_id (str, optional): 指定した場合はこのモデルに固定し、ヘッジも行わない
+                                      （モデルごとに作成したコンテキストキャッシュを使う場合など）
+
+        Returns:
+            tuple: (呼び出し結果, 結果を返したモデルID, ヘッジを行ったかどうか)
+        """
+        pinned = model_id is not None
+        if not pinned:
+            model_id = self.choose_model(prompt_tokens, format_type)
+
+        if pinned or not self.hedge_enabled or self.hedge_model == model_id:
+            return self._timed_call(call, model_id), model_id, False
+
+        # プロファイリングの待ち時間の記録がワーカースレッドにも引き継がれるよう、コンテキストをコピーして実行する
+        futures = {self._executor.submit(copy_context().run, self._timed_call, call, model_id): model_id}
+        done, _ = wait(futures, timeout=self.hedge_delay(model_id))
+
+        hedged = False
+        if not done and self._reserve_hedge_budget(prompt_tokens):
+            futures[self._executor.submit(copy_context().run, self._timed_call, call, self.hedge_model)] = self.hedge_model
+            hedged = True
+
+        # 先に成功した結果を使い、両方失敗した場合は最後の例外を送出する
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if futures[future] != model_id:
+                        with self._hedge_lock:
+                            self.hedges_won += 1
+                    return future.result(), futures[future], hedged
+                error = future.exception()
+        raise error
+
+    def snapshot(self):
+        """ルーティングとモデルごとのレイテンシ統計を辞書で返します。"""
+        with self._stats_lock:
+            models = {model_id: stats.snapshot() for model_id, stats in self.stats.items()}
+        return {
+            'primary_model': self.primary_model,
+            'fast_model': self.fast_model,
+            'hedge_enabled': self.hedge_enabled,
+            'hedges_issued': self.hedges_issued,
+            'hedges_won': self.hedges_won,
+            'models': models
+        }
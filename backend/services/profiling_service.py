@@ -0,0 +1,361 @@
+"""
+プロファイリングサービス - 指定したリクエストの統計的プロファイルと待ち時間の内訳を記録する
+
+X-Profileヘッダーと管理トークンを付けたリクエスト、またはPROFILE_SAMPLE_RATEの割合で抽出したリクエストについて、
+サンプリングスレッドが一定間隔でリクエストのスレッドのスタックを記録し、上流サービス（YouTube・トランスクリプト・
+Gemini・データベース）と待機キューの待ち時間、ローカルのCPU時間の内訳とともにリングバッファに保存します。
+スタックはフレームグラフのツール（flamegraph.pl、speedscopeなど）で読み込める折りたたみ形式で取得できます。
+プロファイルしないリクエストのオーバーヘッドは、待ち時間の記録箇所でのコンテキスト変数の参照のみです。
+"""
+import hmac
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from functools import wraps
+
+from flask import request, make_response
+
+# 現在のリクエストのプロファイル（プロファイルしていない場合はNone）
+_current_profile = ContextVar('current_profile', default=None)
+
+
+def _frame_label(frame):
+    """スタックのフレームを「モジュール名.関数名」にします。"""
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _union_seconds(intervals):
+    """重なりを除いた区間の合計秒数を返します（ヘッジリクエストなどの並行した待ちを二重に数えないため）。"""
+    total = 0.0
+    current_start = current_end = None
+    for start, end in sorted(intervals):
+        if current_end is None or start > current_end:
+            if current_end is not None:
+                total += current_end - current_start
+            current_start, current_end = start, end
+        else:
+            current_end = max(current_end, end)
+    if current_end is not None:
+        total += current_end - current_start
+    return total
+
+
+class RequestProfile:
+    """
+    1件のリクエストのプロファイル。
+
+    スタックのサンプルはルートを呼び出したフレームより下のみを記録し、
+    待ち時間は名前付きの区間（span）として記録します。
+    """
+
+    def __init__(self, profile_id, endpoint, method, path, trigger, root_frame):
+        self.id = profile_id
+        self.endpoint = endpoint
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.thread_id = threading.get_ident()
+        self.started_at = datetime.utcnow()
+        self.status_code = None
+        self.wall_seconds = None
+        self.cpu_seconds = None
+        self.samples = 0
+        self.stacks = Counter()
+        self._spans = []
+        self._root = root_frame
+        self._started = time.perf_counter()
+        self._cpu_started = time.thread_time()
+        self._lock = threading.Lock()
+
+    def add_span(self, name, started, ended):
+        """待ち時間の区間を記録します（time.perf_counterの値）。"""
+        with self._lock:
+            self._spans.append((name, started, ended))
+
+    def add_sample(self, frame):
+        """サンプリングスレッドから呼び出され、リクエストのスレッドの現在のスタックを記録します。"""
+        labels = []
+        while frame is not None and frame is not self._root:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+
+        # ルートのフレームまでたどれない場合はルートの呼び出しの前後なので数えない
+        if frame is None or not labels:
+            return
+
+        with self._lock:
+            self.stacks[';'.join(reversed(labels))] += 1
+            self.samples += 1
+
+    def finish(self, status_code):
+        """リクエストのスレッドで呼び出し、経過時間とCPU時間を確定します。"""
+        self.wall_seconds = time.perf_counter() - self._started
+        self.cpu_seconds = time.thread_time() - self._cpu_started
+        self.status_code = status_code
+        self._root = None
+
+    def breakdown(self):
+        """
+        経過時間の内訳を返します。
+
+        待ち時間は種類ごと（youtube、transcript、gemini、database、queue）に重なりを除いて合計し、
+        CPU時間はリクエストのスレッドのみを数えます。残りはロック待ちやGC、計測していないI/Oなどです。
+        """
+        with self._lock:
+            spans = list(self._spans)
+
+        by_name = {}
+        for name, started, ended in spans:
+            by_name.setdefault(name, []).append((started, ended))
+
+        wall = self.wall_seconds or 0.0
+        cpu = self.cpu_seconds or 0.0
+        waited = _union_seconds([(started, ended) for _, started, ended in spans])
+        return {
+            'wall_ms': round(wall * 1000, 1),
+            'cpu_ms': round(cpu * 1000, 1),
+            'wait_ms': round(waited * 1000, 1),
+            'other_ms': round(max(wall - cpu - waited, 0.0) * 1000, 1),
+            'waits': {
+                name: {
+                    'calls': len(intervals),
+                    'ms': round(_union_seconds(intervals) * 1000, 1)
+                }
+                for name, intervals in sorted(by_name.items())
+            }
+        }
+
+    def to_dict(self, top_stacks=0):
+        """
+        プロファイルを辞書に変換します。
+
+        Args:
+            top_stacks (int): 含めるサンプル数の多いスタックの件数（0の場合は含めない）
+        """
+        result = {
+            'profile_id': self.id,
+            'endpoint': self.endpoint,
+            'method': self.method,
+            'path': self.path,
+            'trigger': self.trigger,
+            'status_code': self.status_code,
+            'started_at': self.started_at.isoformat(),
+            'samples': self.samples,
+            **self.breakdown()
+        }
+        if top_stacks:
+            with self._lock:
+                result['top_stacks'] = [
+                    {'stack': stack.split(';'), 'samples': count}
+                    for stack, count in self.stacks.most_common(top_stacks)
+                ]
+        return result
+
+
+class RequestProfiler:
+    """
+    リクエストのプロファイリングを管理します。
+
+    プロファイル中のリクエストがある間だけサンプリングスレッドが動作し、
+    同時にプロファイルするリクエスト数はPROFILE_MAX_ACTIVEで制限します。
+    """
+
+    def __init__(self, sample_rate=None, interval_ms=None, buffer_size=None, max_active=None):
+        self.sample_rate = float(sample_rate if sample_rate is not None else os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.interval = float(interval_ms or os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+        self.max_active = int(max_active or os.getenv('PROFILE_MAX_ACTIVE', '4'))
+        self._profiles = deque(maxlen=int(buffer_size or os.getenv('PROFILE_BUFFER_SIZE', '50')))
+        self._active = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self.profiled = 0
+        self.skipped_busy = 0
+
+    def trigger(self):
+        """
+        現在のリクエストをプロファイルするかを判定します。
+
+        Returns:
+            str: "header"（X-Profileヘッダーと有効な管理トークン）または"sampled"（サンプリング）
+            None: プロファイルしない場合
+        """
+        if request.headers.get('X-Profile'):
+            admin_token = os.getenv('ADMIN_API_TOKEN')
+            provided = request.headers.get('X-Admin-Token', '')
+            if admin_token and hmac.compare_digest(provided.encode(), admin_token.encode()):
+                return 'header'
+
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, trigger, root_frame):
+        """
+        現在のスレッドのリクエストのプロファイルを開始します。
+
+        Returns:
+            RequestProfile: 開始したプロファイル
+            None: 同時にプロファイルしているリクエストが上限に達している場合
+        """
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                self.skipped_busy += 1
+                return None
+
+            profile = RequestProfile(
+                next(self._ids), request.endpoint, request.method, request.path, trigger, root_frame
+            )
+            self._active[profile.thread_id] = profile
+            self.profiled += 1
+
+            # フォーク後の子プロセスではスレッドが存在しないため、必要になった時点で起動する
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                self._thread.start()
+
+        self._wakeup.set()
+        return profile
+
+    def stop(self, profile, status_code):
+        """プロファイルを終了してリングバッファに保存します。"""
+        profile.finish(status_code)
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+            self._profiles.append(profile)
+
+    def _sample_loop(self):
+        """プロファイル中のリクエストのスレッドのスタックを一定間隔で記録します。"""
+        while True:
+            self._wakeup.clear()
+            with self._lock:
+                active = list(self._active.items())
+
+            if not active:
+                self._wakeup.wait()
+                continue
+
+            frames = sys._current_frames()
+            for thread_id, profile in active:
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.add_sample(frame)
+            del frames
+            time.sleep(self.interval)
+
+    def list_profiles(self, endpoint=None):
+        """保存しているプロファイルを新しい順に返します。"""
+        with self._lock:
+            profiles = list(self._profiles)
+        return [
+            profile for profile in reversed(profiles)
+            if endpoint is None or profile.endpoint == endpoint
+        ]
+
+    def get_profile(self, profile_id):
+        """保存しているプロファイルを取得します。存在しない場合はNoneを返します。"""
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+    def snapshot(self):
+        """プロファイラーの設定と件数を辞書で返します。"""
+        with self._lock:
+            return {
+                'sample_rate': self.sample_rate,
+                'interval_ms': round(self.interval * 1000, 2),
+                'active': len(self._active),
+                'stored': len(self._profiles),
+                'buffer_size': self._profiles.maxlen,
+                'profiled': self.profiled,
+                'skipped_busy': self.skipped_busy
+            }
+
+
+def collapsed_stacks(profiles):
+    """
+    プロファイルのスタックを折りたたみ形式（1行に「フレーム;フレーム;... サンプル数」）にします。
+    複数のプロファイルを渡した場合はエンドポイント名を先頭のフレームにして集計します。
+    """
+    totals = Counter()
+    for profile in profiles:
+        with profile._lock:
+            stacks = list(profile.stacks.items())
+        for stack, count in stacks:
+            totals[f'{profile.endpoint};{stack}'] += count
+    return ''.join(f'{stack} {count}\n' for stack, count in sorted(totals.items()))
+
+
+def current_profile():
+    """現在のリクエストのプロファイルを返します。プロファイルしていない場合はNoneを返します。"""
+    return _current_profile.get()
+
+
+def record_span(name, started, ended):
+    """現在のリクエストをプロファイルしている場合に待ち時間の区間を記録します。"""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add_span(name, started, ended)
+
+
+@contextmanager
+def profile_span(name):
+    """
+    ブロックの実行時間を待ち時間として記録するコンテキストマネージャー。
+
+    使用例:
+        with profile_span('youtube'):
+            response = request.execute()
+    """
+    if _current_profile.get() is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, started, time.perf_counter())
+
+
+# アプリケーション全体で共有するプロファイラー
+profiler = RequestProfiler()
+
+
+def profiled(f):
+    """
+    ルートをプロファイリングの対象にするデコレータ。
+    プロファイルしたリクエストのレスポンスにはX-Profile-Idヘッダーを付けます。
+    アドミッション制御の待ち時間も含めるため、admission_controlledより外側に適用します。
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        trigger = profiler.trigger()
+        profile = profiler.start(trigger, sys._getframe()) if trigger else None
+        if profile is None:
+            return f(*args, **kwargs)
+
+        token = _current_profile.set(profile)
+        status_code = 500
+        try:
+            response = make_response(f(*args, **kwargs))
+            status_code = response.status_code
+            response.headers['X-Profile-Id'] = str(profile.id)
+            return response
+        finally:
+            _current_profile.reset(token)
+            profiler.stop(profile, status_code)
+
+    return decorated_function
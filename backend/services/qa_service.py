@@ -0,0 +1,139 @@
+"""
+ビデオ質問応答サービス - トランスクリプトの関連部分だけを検索してモデルに渡す
+
+トランスクリプトのセグメント（raw_data）をタイムスタンプ付きのチャンクにまとめ、
+質問とのBM25スコアが高いチャンクだけをGeminiに送ります。
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from services.search_service import SearchIndex
+
+# 1チャンクあたりの最大文字数
+DEFAULT_CHUNK_CHARS = 600
+
+# 検索で取得するチャンク数
+DEFAULT_TOP_K = 4
+
+# チャンク化したインデックスを保持するビデオ数
+INDEX_CACHE_SIZE = 64
+
+
+def format_timestamp(seconds):
+    """秒数を「h:mm:ss」または「m:ss」形式の文字列に変換します。"""
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if hours:
+        return f'{hours}:{minutes:02d}:{seconds:02d}'
+    return f'{minutes}:{seconds:02d}'
+
+
+def chunk_segments(segments, max_chars=DEFAULT_CHUNK_CHARS):
+    """
+    トランスクリプトのセグメントを連続したタイムスタンプ付きチャンクにまとめます。
+
+    Args:
+        segments (list): text, start, durationを持つセグメントのリスト
+        max_chars (int): 1チャンクあたりの最大文字数
+
+    Returns:
+        list: text, start, endを持つチャンクのリスト
+    """
+    chunks = []
+    texts = []
+    length = 0
+    start = None
+    end = 0.0
+
+    for segment in segments:
+        text = (segment.get('text') or '').strip()
+        if not text:
+            continue
+
+        if texts and length + len(text) > max_chars:
+            chunks.append({'text': ' '.join(texts), 'start': start, 'end': end})
+            texts, length, start = [], 0, None
+
+        if start is None:
+            start = float(segment.get('start', 0))
+        texts.append(text)
+        length += len(text) + 1
+        end = float(segment.get('start', 0)) + float(segment.get('duration', 0))
+
+    if texts:
+        chunks.append({'text': ' '.join(texts), 'start': start, 'end': end})
+    return chunks
+
+
+class TranscriptRetriever:
+    """
+    ビデオごとのチャンクとBM25インデックスを保持し、質問に関連するチャンクを返します。
+
+    最近使ったビデオのインデックスのみをメモリに保持します。
+    """
+
+    def __init__(self, max_chars=None, cache_size=INDEX_CACHE_SIZE):
+        self.max_chars = int(max_chars or os.getenv('ASK_CHUNK_CHARS', DEFAULT_CHUNK_CHARS))
+        self.cache_size = cache_size
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_index(self, video_id, segments):
+        """ビデオのチャンクとインデックスを取得します（なければ作成します）。"""
+        with self._lock:
+            cached = self._indexes.get(video_id)
+            if cached is not None and cached[2] == len(segments):
+                self._indexes.move_to_end(video_id)
+                return cached[0], cached[1]
+
+        chunks = chunk_segments(segments, max_chars=self.max_chars)
+        index = SearchIndex()
+        for i, chunk in enumerate(chunks):
+            index.add_document(i, {'transcript': chunk['text']})
+
+        with self._lock:
+            self._indexes[video_id] = (chunks, index, len(segments))
+            self._indexes.move_to_end(video_id)
+            while len(self._indexes) > self.cache_size:
+                self._indexes.popitem(last=False)
+        return chunks, index
+
+    def retrieve(self, video_id, segments, question, top_k=DEFAULT_TOP_K):
+        """
+        質問に関連するチャンクを時系列順で返します。
+
+        語句が一致するチャンクがない場合は、ビデオ全体から均等にチャンクを選びます。
+
+        Args:
+            video_id (str): YouTubeビデオID
+            segments (list): トランスクリプトのセグメント
+            question (str): 質問
+            top_k (int): 取得するチャンク数
+
+        Returns:
+            tuple: (選択したチャンクのリスト, 全チャンク数)
+        """
+        chunks, index = self._get_index(video_id, segments)
+        if not chunks:
+            return [], 0
+
+        scores = index.score(question)
+        if scores:
+            selected = [(i, score) for i, score in scores.most_common(top_k)]
+        else:
+            step = max(len(chunks) // top_k, 1)
+            selected = [(i, 0.0) for i in range(0, len(chunks), step)[:top_k]]
+
+        results = []
+        for i, score in sorted(selected):
+            chunk = dict(chunks[i])
+            chunk['score'] = round(score, 4)
+            chunk['timestamp'] = format_timestamp(chunk['start'])
+            results.append(chunk)
+        return results, len(chunks)
+
+
+# アプリケーション全体で共有するリトリーバー
+transcript_retriever = TranscriptRetriever()
@@ -0,0 +1,325 @@
+"""
+関連ビデオサービス - キャッシュ済みトランスクリプトのTF-IDFベクトルによる類似ビデオ検索
+
+トークンは特徴ハッシングで固定次元に写像し、SciPyの疎行列として保持します。
+新しいトランスクリプトは行として追記され、重み付けは増分で行い、必要な場合のみ全体を再計算します。
+"""
+import os
+import zlib
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+import scipy.sparse as sp
+
+from models.video_summary import VideoSummary
+from models.video_transcript import VideoTranscript
+from services.index_sync_service import IncrementalSync
+from services.search_service import tokenize
+
+# ハッシュ特徴量の次元数
+DEFAULT_N_FEATURES = 2 ** 18
+
+# 1ドキュメントあたりに保持する特徴量の最大数（頻度上位のみ残す）
+DEFAULT_MAX_TERMS_PER_DOC = 256
+
+# 削除済み行がこの割合を超えたら行列を詰め直す
+COMPACTION_RATIO = 0.25
+
+# IDF計算時からドキュメント数がこの割合を超えて増えたら全体を再重み付けする
+REWEIGHT_RATIO = 0.1
+
+# 差分行列の行数がこれを超えたら基本行列に統合する
+DELTA_MERGE_ROWS = 2048
+
+
+@lru_cache(maxsize=2 ** 17)
+def hash_token(token, n_features):
+    """プロセス間で安定したハッシュでトークンを特徴量インデックスに変換します。"""
+    return zlib.crc32(token.encode('utf-8')) % n_features
+
+
+class TfidfIndex:
+    """
+    特徴ハッシングによるTF-IDFベクトルのインデックス。
+
+    生の（サブリニア）TF行列を追記型で保持し、IDFを掛けてL2正規化した行列をキャッシュします。
+    追加された行は現在のIDFで重み付けして小さな差分行列に追記し、ドキュメント数が一定割合
+    増えたときだけ全体を再重み付けします。コサイン類似度は疎行列積で一括計算します。
+    """
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES, max_terms_per_doc=DEFAULT_MAX_TERMS_PER_DOC):
+        self.n_features = n_features
+        self.max_terms_per_doc = max_terms_per_doc
+        self.doc_ids = []
+        self.rows = {}
+        self.active = np.zeros(0, dtype=bool)
+        self.doc_freq = np.zeros(n_features, dtype=np.int64)
+        self._matrix = sp.csr_matrix((0, n_features), dtype=np.float32)
+        self._pending = []
+        self._idf = None
+        self._idf_doc_count = 0
+        self._weighted = None
+        self._weighted_t = None
+        self._delta = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _vectorize(self, tokens):
+        """トークン列をサブリニアTFの疎な行ベクトル（インデックスと値）に変換します。"""
+        counts = Counter(hash_token(token, self.n_features) for token in tokens)
+        if self.max_terms_per_doc and len(counts) > self.max_terms_per_doc:
+            counts = dict(counts.most_common(self.max_terms_per_doc))
+
+        indices = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+        values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        order = np.argsort(indices)
+        return indices[order], values[order]
+
+    def add_tokens(self, doc_id, tokens):
+        """
+        トークン化済みのドキュメントを追加します。同じIDの既存ドキュメントは置き換えられます。
+
+        Args:
+            doc_id (str): ドキュメントID（ビデオID）
+            tokens (list): トークンのリスト
+        """
+        self.remove(doc_id)
+
+        indices, values = self._vectorize(tokens)
+        self.doc_freq[indices] += 1
+        self.rows[doc_id] = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self._pending.append((indices, values))
+
+    def add_document(self, doc_id, text):
+        """テキストをトークン化してドキュメントを追加します。"""
+        self.add_tokens(doc_id, tokenize(text))
+
+    def remove(self, doc_id):
+        """ドキュメントを無効化します。行はスコア計算から除外され、次回の詰め直しまで残ります。"""
+        row = self.rows.pop(doc_id, None)
+        if row is None:
+            return
+
+        self._flush()
+        start, end = self._matrix.indptr[row], self._matrix.indptr[row + 1]
+        self.doc_freq[self._matrix.indices[start:end]] -= 1
+        self.active[row] = False
+
+        # 削除済みの行が一定割合を超えたら、行が追加されなくても次の検索で詰め直して再重み付けする
+        if (~self.active).sum() > COMPACTION_RATIO * len(self.active):
+            self._weighted = None
+
+    def _flush(self):
+        """追記待ちの行を行列に結合します。"""
+        if not self._pending:
+            return
+
+        lengths = np.array([len(indices) for indices, _ in self._pending], dtype=np.int64)
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = np.concatenate([indices for indices, _ in self._pending])
+        values = np.concatenate([values for _, values in self._pending])
+        block = sp.csr_matrix((values, indices, indptr), shape=(len(self._pending), self.n_features))
+
+        self._matrix = sp.vstack([self._matrix, block], format='csr')
+        self.active = np.concatenate([self.active, np.ones(len(self._pending), dtype=bool)])
+        self._pending = []
+
+    def _compact(self):
+        """削除済みの行を取り除いて行列を詰め直します。"""
+        keep = np.flatnonzero(self.active)
+        self._matrix = self._matrix[keep]
+        self.doc_ids = [self.doc_ids[row] for row in keep]
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.doc_ids)}
+        self.active = np.ones(len(keep), dtype=bool)
+
+    def _weigh(self, matrix):
+        """現在のIDFを掛けて各行をL2正規化します。"""
+        weighted = matrix.multiply(self._idf).tocsr()
+        norms = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sp.diags((1.0 / norms).astype(np.float32)).dot(weighted).tocsr()
+
+    def _weighted_matrix(self):
+        """
+        重み付け済みの行列を最新の状態にします。
+
+        基本行列（とクエリ用の転置）と、それ以降に追加された行の差分行列に分けて保持するため、
+        少数の追加では大きな行列の転置や結合が発生しません。
+        """
+        self._flush()
+        base_rows = self._weighted.shape[0] if self._weighted is not None else 0
+        delta_rows = self._delta.shape[0] if self._delta is not None else 0
+        if self._weighted is not None and base_rows + delta_rows == self._matrix.shape[0]:
+            return
+
+        doc_count = max(int(self.active.sum()), 1)
+        needs_compaction = (~self.active).sum() > COMPACTION_RATIO * len(self.active)
+        needs_reweight = self._weighted is None or doc_count > (1 + REWEIGHT_RATIO) * self._idf_doc_count
+
+        if needs_compaction or needs_reweight:
+            if needs_compaction:
+                self._compact()
+            self._idf = (np.log((1.0 + doc_count) / (1.0 + self.doc_freq)) + 1.0).astype(np.float32)
+            self._idf_doc_count = doc_count
+            self._weighted = self._weigh(self._matrix)
+            self._weighted_t = self._weighted.T.tocsr()
+            self._delta = None
+            return
+
+        # 新しい行のみを現在のIDFで重み付けして差分行列に追記
+        new_rows = self._weigh(self._matrix[base_rows + delta_rows:])
+        self._delta = new_rows if self._delta is None else sp.vstack([self._delta, new_rows], format='csr')
+
+        if self._delta.shape[0] > DELTA_MERGE_ROWS:
+            self._weighted = sp.vstack([self._weighted, self._delta], format='csr')
+            self._weighted_t = self._weighted.T.tocsr()
+            self._delta = None
+
+    def _weighted_rows(self, rows):
+        """基本行列と差分行列から指定した行の重み付きベクトルを取り出します。"""
+        base_rows = self._weighted.shape[0]
+        if self._delta is None or rows.max() < base_rows:
+            return self._weighted[rows]
+        return sp.vstack([
+            self._weighted[row] if row < base_rows else self._delta[row - base_rows]
+            for row in rows
+        ], format='csr')
+
+    def most_similar_many(self, doc_ids, k=10):
+        """
+        複数のドキュメントについて、コサイン類似度の高い上位k件をまとめて計算します。
+
+        Args:
+            doc_ids (list): クエリとするドキュメントIDのリスト
+            k (int): 各ドキュメントについて返す件数
+
+        Returns:
+            dict: ドキュメントIDから(類似ドキュメントID, スコア)のリストへの辞書。
+                  インデックスにないIDは含まれません
+        """
+        known = [doc_id for doc_id in doc_ids if doc_id in self.rows]
+        if not known:
+            return {}
+
+        self._weighted_matrix()
+        query_rows = np.array([self.rows[doc_id] for doc_id in known])
+        queries = self._weighted_rows(query_rows)
+
+        # (クエリ数 x ドキュメント数) の類似度を一度の疎行列積で計算
+        # 転置行列はCSRで保持しているため、クエリに含まれる特徴量の行だけが参照される
+        scores = queries.dot(self._weighted_t).toarray()
+        if self._delta is not None:
+            scores = np.hstack([scores, queries.dot(self._delta.T).toarray()])
+        scores[:, ~self.active] = -np.inf
+        scores[np.arange(len(known)), query_rows] = -np.inf
+
+        k = min(k, scores.shape[1])
+        results = {}
+        for i, doc_id in enumerate(known):
+            row_scores = scores[i]
+            if k <= 0:
+                results[doc_id] = []
+                continue
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            top = top[np.argsort(-row_scores[top])]
+            results[doc_id] = [
+                (self.doc_ids[j], float(row_scores[j]))
+                for j in top
+                if np.isfinite(row_scores[j]) and row_scores[j] > 0
+            ]
+        return results
+
+    def most_similar(self, doc_id, k=10):
+        """1件のドキュメントについて類似ドキュメントを返します。"""
+        return self.most_similar_many([doc_id], k=k).get(doc_id, [])
+
+
+class RelatedVideos(IncrementalSync):
+    """
+    データベースにキャッシュされたトランスクリプトとTfidfIndexを同期するラッパー。
+
+    前回の同期以降に更新されたトランスクリプトのみを追加するため、更新は増分で行われます（IncrementalSyncを参照）。
+    """
+
+    def __init__(self, sync_interval=None):
+        super().__init__('関連ビデオ', float(sync_interval if sync_interval is not None
+                                                 else os.getenv('RELATED_SYNC_INTERVAL', '30')))
+        self.index = self._new_index()
+
+    @staticmethod
+    def _new_index():
+        return TfidfIndex(
+            n_features=int(os.getenv('RELATED_N_FEATURES', DEFAULT_N_FEATURES)),
+            max_terms_per_doc=int(os.getenv('RELATED_MAX_TERMS_PER_DOC', DEFAULT_MAX_TERMS_PER_DOC))
+        )
+
+    def _fetch_changes(self, since):
+        """更新されたトランスクリプトを(キー, updated_at, (ビデオID, トランスクリプト))で返します。"""
+        query = VideoTranscript.query
+        if since is not None:
+            query = query.filter(VideoTranscript.updated_at >= since)
+        for record in query.yield_per(500):
+            yield record.id, record.updated_at, (record.video_id, record.transcript)
+
+    def _apply_changes(self, records, initial):
+        """トランスクリプトをインデックスに追加します（同じビデオの既存ドキュメントは置き換えられます）。"""
+        if initial:
+            # 全件の読み込みはロックの外で新しいインデックスに行い、完成してから置き換える
+            index = self._new_index()
+            for video_id, transcript in records:
+                index.add_document(video_id, transcript)
+            with self._lock:
+                self.index = index
+            return
+
+        records = list(records)
+        with self._lock:
+            for video_id, transcript in records:
+                self.index.add_document(video_id, transcript)
+
+    def related(self, video_id, k=10):
+        """
+        指定したビデオに関連するビデオを返します。
+
+        Args:
+            video_id (str): YouTubeビデオID
+            k (int): 返す件数
+
+        Returns:
+            list: ビデオID、類似度、タイトル情報を含む辞書のリスト
+            None: ビデオのトランスクリプトがキャッシュされていない場合
+
+        Raises:
+            IndexLoadingError: 最初のインデックスの構築が完了していない場合
+        """
+        self.sync()
+        with self._lock:
+            if video_id not in self.index.rows:
+                return None
+            neighbours = self.index.most_similar(video_id, k=k)
+
+        titles = {}
+        if neighbours:
+            summaries = VideoSummary.query.with_entities(
+                VideoSummary.video_id, VideoSummary.video_title, VideoSummary.channel_title
+            ).filter(VideoSummary.video_id.in_([doc_id for doc_id, _ in neighbours]))
+            for summary_video_id, video_title, channel_title in summaries:
+                titles.setdefault(summary_video_id, (video_title, channel_title))
+
+        return [
+            {
+                'video_id': doc_id,
+                'score': round(score, 4),
+                'video_title': titles.get(doc_id, (None, None))[0],
+                'channel_title': titles.get(doc_id, (None, None))[1],
+                'video_url': f'https://www.youtube.com/watch?v={doc_id}'
+            }
+            for doc_id, score in neighbours
+        ]
+
+
+# アプリケーション全体で共有する関連ビデオインスタンス
+related_videos = RelatedVideos()
@@ -0,0 +1,219 @@
+"""
+要約スケジューラーサービス - ユーザーごとのキューを公平に処理する
+
+要約の同時実行数を制限し、待機中のリクエストをユーザーごとのキューに入れて
+ラウンドロビン（重み付き）で実行枠を割り当てます。1人のユーザーが大量のリクエストを
+送っても、他のユーザーのリクエストは各ラウンドで順番が回ってきます。
+"""
+import os
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+from services.profiling_service import profile_span
+
+
+class QueueTimeoutError(Exception):
+    """キューでの待機が制限時間を超えた場合に送出される例外"""
+
+
+class Ticket:
+    """キューに入れられた1件のリクエスト"""
+
+    def __init__(self, user_id, position):
+        self.user_id = user_id
+        self.position = position
+        self.event = threading.Event()
+        self.enqueued_at = time.monotonic()
+        self.granted_at = None
+
+    def to_dict(self):
+        """レスポンスに含めるキュー情報を返します。"""
+        waited = (self.granted_at or time.monotonic()) - self.enqueued_at
+        return {
+            'position_at_enqueue': self.position,
+            'waited_ms': round(waited * 1000, 1)
+        }
+
+
+class FairScheduler:
+    """
+    ユーザーごとのキューを重み付きラウンドロビンで処理するスケジューラー。
+
+    各ユーザーは1巡につき重み（デフォルト1）の数だけ実行枠を割り当てられます。
+    """
+
+    def __init__(self, max_concurrent=None, queue_timeout=None):
+        self.max_concurrent = int(max_concurrent or os.getenv('SUMMARY_MAX_CONCURRENT', '4'))
+        self.queue_timeout = float(queue_timeout or os.getenv('SUMMARY_QUEUE_TIMEOUT', '120'))
+        self._queues = {}
+        self._ring = deque()
+        self._weights = {}
+        self._credits = {}
+        self._running = Counter()
+        self._lock = threading.Lock()
+
+    def _waiting_count(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _estimate_position(self, user_id):
+        """
+        新しいチケットより先に実行される待機中のチケット数を見積もり、1始まりの順番を返します。
+
+        自分のキューでk番目のチケットは、他の各ユーザーのキューから最大k+1件ずつ後に回ります。
+        """
+        own = len(self._queues.get(user_id, ()))
+        ahead = own + sum(
+            min(len(queue), own + 1)
+            for other, queue in self._queues.items()
+            if other != user_id
+        )
+        return ahead + 1
+
+    def _live_positions(self, user_id):
+        """
+        ユーザーの待機中のチケットが、現在のキューで何番目に実行枠を割り当てられるか（1始まり）を返します。
+        ロックを保持した状態で呼び出します。
+
+        _dispatchと同じ順序（リングの先頭から重みの数ずつ）で割り当てをたどります。
+        後から他のユーザーがキューに入ると、順番が後ろに下がることがあります。
+        """
+        remaining = {other: len(queue) for other, queue in self._queues.items()}
+        own = remaining.get(user_id, 0)
+        ring = deque(self._ring)
+        credits = dict(self._credits)
+        positions = []
+        order = 0
+        while ring and len(positions) < own:
+            other = ring[0]
+            order += 1
+            remaining[other] -= 1
+            credits[other] -= 1
+            if other == user_id:
+                positions.append(order)
+
+            if not remaining[other]:
+                ring.popleft()
+            elif credits[other] <= 0:
+                ring.rotate(-1)
+                credits[other] = self._weights.get(other, 1)
+        return positions
+
+    def _dispatch(self):
+        """空いている実行枠をラウンドロビンで割り当てます。ロックを保持した状態で呼び出します。"""
+        while sum(self._running.values()) < self.max_concurrent and self._ring:
+            user_id = self._ring[0]
+            queue = self._queues[user_id]
+            ticket = queue.popleft()
+            ticket.granted_at = time.monotonic()
+            self._running[user_id] += 1
+            self._credits[user_id] -= 1
+            ticket.event.set()
+
+            if not queue:
+                self._ring.popleft()
+                del self._queues[user_id]
+                self._credits.pop(user_id, None)
+            elif self._credits[user_id] <= 0:
+                # このユーザーの今回の割り当てを使い切ったので次のユーザーに回す
+                self._ring.rotate(-1)
+                self._credits[user_id] = self._weights.get(user_id, 1)
+
+    def acquire(self, user_id, weight=1):
+        """
+        実行枠が割り当てられるまで待機します。
+
+        Args:
+            user_id (str): ユーザーID
+            weight (int): 1巡あたりに割り当てる実行枠の数
+
+        Returns:
+            Ticket: 割り当てられたチケット
+
+        Raises:
+            QueueTimeoutError: 制限時間内に実行枠が割り当てられなかった場合
+        """
+        with self._lock:
+            ticket = Ticket(user_id, self._estimate_position(user_id))
+            self._weights[user_id] = max(int(weight), 1)
+            if user_id not in self._queues:
+                self._queues[user_id] = deque()
+                self._ring.append(user_id)
+                self._credits[user_id] = self._weights[user_id]
+            self._queues[user_id].append(ticket)
+            self._dispatch()
+
+        with profile_span('queue'):
+            granted = ticket.event.wait(self.queue_timeout)
+        if granted:
+            return ticket
+
+        with self._lock:
+            # タイムアウトと同時に割り当てられた場合はそのまま実行する
+            if ticket.event.is_set():
+                return ticket
+
+            queue = self._queues.get(user_id)
+            if queue is not None:
+                queue.remove(ticket)
+                if not queue:
+                    self._ring.remove(user_id)
+                    del self._queues[user_id]
+                    self._credits.pop(user_id, None)
+        raise QueueTimeoutError('要約キューの待機時間が上限を超えました')
+
+    def release(self, ticket):
+        """実行枠を解放し、次のチケットに割り当てます。"""
+        with self._lock:
+            self._running[ticket.user_id] -= 1
+            if self._running[ticket.user_id] <= 0:
+                del self._running[ticket.user_id]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, user_id, weight=1):
+        """
+        実行枠を取得して処理を行うためのコンテキストマネージャー。
+
+        使用例:
+            with summary_scheduler.slot(user_id) as ticket:
+                ...
+        """
+        ticket = self.acquire(user_id, weight=weight)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    def queue_status(self, user_id):
+        """
+        ユーザーの現在のキューの状態を返します。
+
+        Returns:
+            dict: 待機中・実行中のリクエスト数、待機中のリクエストの現在の順番と全体の待機数
+        """
+        with self._lock:
+            positions = self._live_positions(user_id)
+            return {
+                'waiting': len(self._queues.get(user_id, ())),
+                'position': positions[0] if positions else None,
+                'positions': positions,
+                'running': self._running.get(user_id, 0),
+                'total_waiting': self._waiting_count(),
+                'max_concurrent': self.max_concurrent
+            }
+
+    def snapshot(self):
+        """スケジューラー全体の状態を返します。"""
+        with self._lock:
+            return {
+                'running': sum(self._running.values()),
+                'waiting': self._waiting_count(),
+                'waiting_users': len(self._queues),
+                'max_concurrent': self.max_concurrent
+            }
+
+
+# アプリケーション全体で共有する要約スケジューラー
+summary_scheduler = FairScheduler()
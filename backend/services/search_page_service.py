@@ -0,0 +1,191 @@
+"""
+YouTube検索のページングサービス - カーソルによる続きの取得と次のページの先読み
+
+検索結果の次のページは、現在のページのレスポンスを返した後にバックグラウンドで取得・補完しておき、
+カーソルで続きが要求されたときにそのまま返します。先読みの取得中に要求された場合は
+同じ呼び出しの完了を待つため、同じページを二度取得することはありません。
+先読みはYouTube APIのクォータを消費するため、1時間あたりのユニット数の上限内でのみ行います。
+"""
+import base64
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from services.circuit_breaker import CLOSED
+from services.youtube_service import youtube_breaker
+
+# 1ページの取得で消費するクォータ（search.list: 100、videos.list: 1）
+PAGE_QUOTA_UNITS = 101
+
+# カーソルに含める検索パラメータ
+CURSOR_PARAMS = ('query', 'max_results', 'channel_id', 'published_after')
+
+
+class InvalidCursorError(ValueError):
+    """検索カーソルが不正な場合に送出される例外"""
+
+
+def encode_search_cursor(params, page_token):
+    """検索パラメータとYouTube APIのnextPageTokenを不透明なカーソル文字列にします。"""
+    payload = json.dumps([{key: params.get(key) for key in CURSOR_PARAMS}, page_token], ensure_ascii=False)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(cursor):
+    """
+    カーソル文字列を(検索パラメータ, ページトークン)に戻します。
+
+    Raises:
+        InvalidCursorError: カーソルが不正な場合
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        params, page_token = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(params, dict) or not params.get('query') or not isinstance(page_token, str):
+            raise ValueError('missing fields')
+        return {key: params.get(key) for key in CURSOR_PARAMS}, page_token
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError('cursorパラメータが不正です') from e
+
+
+class SearchPager:
+    """
+    検索結果のページを取得し、次のページを先読みしてキャッシュします。
+
+    先読みしたページは一度返すとキャッシュから削除し、TTLを過ぎたものは使いません。
+    """
+
+    def __init__(self, max_entries=None, ttl=None, workers=None, quota_units_per_hour=None):
+        self.enabled = os.getenv('SEARCH_PREFETCH_ENABLED', 'true').lower() == 'true'
+        self.max_entries = int(max_entries or os.getenv('SEARCH_PREFETCH_MAX_ENTRIES', '256'))
+        self.ttl = float(ttl or os.getenv('SEARCH_PREFETCH_TTL', '300'))
+        self.quota_units_per_hour = int(quota_units_per_hour or os.getenv('SEARCH_PREFETCH_QUOTA_UNITS_PER_HOUR', '2020'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(workers or os.getenv('SEARCH_PREFETCH_WORKERS', '2')),
+            thread_name_prefix='search-prefetch'
+        )
+        self._pages = OrderedDict()
+        self._quota = deque()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped_quota = 0
+        self.skipped_circuit = 0
+
+    @staticmethod
+    def _key(params, page_token):
+        return json.dumps([{key: params.get(key) for key in CURSOR_PARAMS}, page_token], sort_keys=True)
+
+    def _reserve_quota(self):
+        """1時間あたりのクォータ上限内であれば先読み1ページ分を予約します。ロックを保持した状態で呼び出します。"""
+        now = time.monotonic()
+        while self._quota and now - self._quota[0] > 3600:
+            self._quota.popleft()
+        if (len(self._quota) + 1) * PAGE_QUOTA_UNITS > self.quota_units_per_hour:
+            return False
+        self._quota.append(now)
+        return True
+
+    def fetch_page(self, youtube_service, params, page_token=None):
+        """
+        検索結果の1ページを返します。先読み済み（または先読み中）のページがあればそれを使います。
+
+        Args:
+            youtube_service (YouTubeService): YouTubeServiceのインスタンス
+            params (dict): 検索パラメータ（query、max_results、channel_id、published_after）
+            page_token (str, optional): YouTube APIのページトークン
+
+        Returns:
+            tuple: (YouTubeService.search_videosの結果, 先読みしたページかどうか)
+        """
+        if page_token:
+            with self._lock:
+                entry = self._pages.pop(self._key(params, page_token), None)
+
+            if entry is not None:
+                created_at, future = entry
+                if time.monotonic() - created_at <= self.ttl:
+                    try:
+                        result = future.result()
+                        with self._lock:
+                            self.hits += 1
+                        return result, True
+                    except Exception as e:
+                        # 先読みに失敗した場合はこのリクエストで取得し直す
+                        print(f"検索結果の先読みエラー: {str(e)}")
+
+            with self._lock:
+                self.misses += 1
+
+        result = youtube_service.search_videos(
+            query=params['query'],
+            max_results=params['max_results'],
+            channel_id=params.get('channel_id'),
+            published_after=params.get('published_after'),
+            page_token=page_token
+        )
+        return result, False
+
+    def prefetch(self, youtube_service, params, page_token):
+        """
+        次のページをバックグラウンドで取得します。
+        YouTube APIのサーキットがクローズでない場合やクォータ上限に達した場合は何もしません。
+        """
+        if not self.enabled or not page_token:
+            return
+
+        if youtube_breaker.state != CLOSED:
+            with self._lock:
+                self.skipped_circuit += 1
+            return
+
+        key = self._key(params, page_token)
+        with self._lock:
+            if key in self._pages:
+                return
+            if not self._reserve_quota():
+                self.skipped_quota += 1
+                return
+
+            future = self._executor.submit(
+                youtube_service.search_videos,
+                query=params['query'],
+                max_results=params['max_results'],
+                channel_id=params.get('channel_id'),
+                published_after=params.get('published_after'),
+                page_token=page_token
+            )
+            self._pages[key] = (time.monotonic(), future)
+            self.issued += 1
+
+            # 古いページから削除する
+            while len(self._pages) > self.max_entries:
+                _, (_, evicted) = self._pages.popitem(last=False)
+                evicted.cancel()
+
+    def snapshot(self):
+        """先読みのヒット率とクォータの使用状況を辞書で返します。"""
+        with self._lock:
+            now = time.monotonic()
+            quota_used = sum(1 for reserved_at in self._quota if now - reserved_at <= 3600) * PAGE_QUOTA_UNITS
+            requests = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'cached_pages': len(self._pages),
+                'issued': self.issued,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests else None,
+                'skipped_quota': self.skipped_quota,
+                'skipped_circuit': self.skipped_circuit,
+                'quota_units_last_hour': quota_used,
+                'quota_units_per_hour': self.quota_units_per_hour
+            }
+
+
+# アプリケーション全体で共有する検索ページャー
+search_pager = SearchPager()
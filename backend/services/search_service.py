@@ -0,0 +1,340 @@
+"""
+ライブラリ検索サービス - 保存済みの要約とトランスクリプトに対する全文検索
+
+YouTube APIを呼び出さずに、プロセス内の転置インデックスで検索します。
+日本語などのCJK文字列はバイグラム、それ以外は単語単位でトークン化し、BM25でランキングします。
+"""
+import html
+import math
+import os
+import re
+import unicodedata
+from collections import Counter
+
+from models.video_summary import VideoSummary
+from models.video_transcript import VideoTranscript
+from services.index_sync_service import IncrementalSync
+
+# CJK（ひらがな・カタカナ・漢字・ハングル）の文字範囲
+_CJK_CHARS = r'\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af'
+_CJK_RE = re.compile(f'[{_CJK_CHARS}]+')
+_TOKEN_RE = re.compile(f'(?P<cjk>[{_CJK_CHARS}]+)|(?P<word>[^\\W_{_CJK_CHARS}]+)')
+
+# フィールドごとの重み（タイトル > 要約 > トランスクリプト）
+FIELD_WEIGHTS = {
+    'title': 3.0,
+    'summary': 2.0,
+    'transcript': 1.0
+}
+
+# BM25パラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# スニペットとして切り出す前後の文字数
+SNIPPET_RADIUS = 60
+
+
+def normalize(text):
+    """全角英数字などを正規化し、小文字に変換します。"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """
+    テキストを検索用のトークンに分割します。
+
+    CJK文字の連続はバイグラム（1文字の場合はそのまま）、それ以外は英数字の単語に分割します。
+
+    Args:
+        text (str): トークン化するテキスト
+
+    Returns:
+        list: トークンのリスト
+    """
+    tokens = []
+    for match in _TOKEN_RE.finditer(normalize(text)):
+        run = match.group()
+        if match.group('cjk') is None:
+            tokens.append(run)
+        elif len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def highlight_snippet(text, terms, radius=SNIPPET_RADIUS):
+    """
+    最初に一致した検索語の周辺を切り出し、一致箇所を<mark>で囲んだスニペットを返します。
+
+    Args:
+        text (str): 元のテキスト
+        terms (list): 正規化済みの検索語（空白区切りの語）
+        radius (int): 一致箇所の前後に含める文字数
+
+    Returns:
+        str: HTMLエスケープ済みのスニペット。一致がない場合はNone
+    """
+    text = unicodedata.normalize('NFKC', text or '')
+    lowered = text.lower()
+
+    positions = [lowered.find(term) for term in terms if term]
+    positions = [pos for pos in positions if pos >= 0]
+    if not positions:
+        return None
+
+    first = min(positions)
+    start = max(0, first - radius)
+    end = min(len(text), first + radius * 2)
+    window = text[start:end]
+
+    pattern = re.compile('|'.join(re.escape(term) for term in sorted(terms, key=len, reverse=True) if term), re.IGNORECASE)
+    parts = []
+    last = 0
+    for match in pattern.finditer(window):
+        parts.append(html.escape(window[last:match.start()]))
+        parts.append(f'<mark>{html.escape(match.group())}</mark>')
+        last = match.end()
+    parts.append(html.escape(window[last:]))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if end < len(text) else ''
+    return prefix + ''.join(parts) + suffix
+
+
+class SearchIndex:
+    """
+    ビデオ単位のドキュメントを保持するインメモリ転置インデックス。
+
+    各ドキュメントはtitle/summary/transcriptのフィールドを持ち、フィールドの重みを掛けた
+    単語頻度でBM25スコアを計算します。
+    """
+
+    def __init__(self):
+        self.postings = {}
+        self.documents = {}
+        self.total_length = 0.0
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add_document(self, doc_id, fields, metadata=None):
+        """
+        ドキュメントを追加します。同じIDのドキュメントは置き換えられます。
+
+        Args:
+            doc_id (str): ドキュメントID（ビデオID）
+            fields (dict): フィールド名からテキストへの辞書
+            metadata (dict, optional): 検索結果に含める付加情報
+        """
+        self.remove_document(doc_id)
+
+        term_freqs = Counter()
+        length = 0.0
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS.get(field, 1.0)
+            tokens = tokenize(text)
+            length += weight * len(tokens)
+            for token in tokens:
+                term_freqs[token] += weight
+
+        for term, freq in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = freq
+
+        self.documents[doc_id] = {
+            'fields': fields,
+            'metadata': metadata or {},
+            'length': length,
+            'terms': list(term_freqs)
+        }
+        self.total_length += length
+
+    def remove_document(self, doc_id):
+        """ドキュメントをインデックスから削除します。"""
+        document = self.documents.pop(doc_id, None)
+        if document is None:
+            return
+
+        for term in document['terms']:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self.postings[term]
+        self.total_length -= document['length']
+
+    def _expand_query_terms(self, query):
+        """
+        クエリをインデックスの語彙に合わせて展開します。
+
+        1文字のCJKトークンはバイグラムとして索引されていないため、その文字で始まる語彙に展開します。
+        """
+        terms = []
+        for token in tokenize(query):
+            if token in self.postings:
+                terms.append(token)
+            elif len(token) == 1 and _CJK_RE.fullmatch(token):
+                terms.extend(term for term in self.postings if term.startswith(token))
+        return list(dict.fromkeys(terms))
+
+    def score(self, query):
+        """
+        クエリに一致するドキュメントのBM25スコアを計算します。
+
+        Args:
+            query (str): 検索クエリ
+
+        Returns:
+            Counter: ドキュメントIDからスコアへの対応
+        """
+        scores = Counter()
+        terms = self._expand_query_terms(query)
+        if not terms or not self.documents:
+            return scores
+
+        doc_count = len(self.documents)
+        average_length = self.total_length / doc_count or 1.0
+
+        for term in terms:
+            posting = self.postings[term]
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, freq in posting.items():
+                length = self.documents[doc_id]['length']
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[doc_id] += idf * freq * (BM25_K1 + 1) / (freq + norm)
+        return scores
+
+    def search(self, query, limit=10):
+        """
+        クエリに一致するドキュメントをBM25スコア順に返します。
+
+        Args:
+            query (str): 検索クエリ
+            limit (int): 返す結果の最大数
+
+        Returns:
+            list: スコア、メタデータ、ハイライト済みスニペットを含む辞書のリスト
+        """
+        scores = self.score(query)
+
+        surface_terms = [term for term in normalize(query).split() if term]
+        results = []
+        for doc_id, score in scores.most_common(limit):
+            document = self.documents[doc_id]
+            snippet = None
+            matched_in = None
+            for field in ('title', 'summary', 'transcript'):
+                snippet = highlight_snippet(document['fields'].get(field), surface_terms)
+                if snippet:
+                    matched_in = field
+                    break
+
+            result = dict(document['metadata'])
+            result.update({
+                'video_id': doc_id,
+                'score': round(score, 4),
+                'snippet': snippet,
+                'matched_in': matched_in
+            })
+            results.append(result)
+        return results
+
+
+class LibrarySearch(IncrementalSync):
+    """
+    データベースに保存された要約・トランスクリプトとSearchIndexを同期するラッパー。
+
+    前回の同期以降に更新されたビデオのみを再インデックスします（IncrementalSyncを参照）。
+    同期は一定間隔に制限されるため、検索自体はメモリ内で完結します。
+    """
+
+    def __init__(self, sync_interval=None):
+        super().__init__('ライブラリ検索', float(sync_interval if sync_interval is not None
+                                                 else os.getenv('LIBRARY_SEARCH_SYNC_INTERVAL', '5')))
+        self.index = SearchIndex()
+
+    def _fetch_changes(self, since):
+        """更新された要約・トランスクリプトの行を(キー, updated_at, ビデオID)で返します。"""
+        rows = []
+        for model in (VideoSummary, VideoTranscript):
+            query = model.query.with_entities(model.id, model.video_id, model.updated_at)
+            if since is not None:
+                query = query.filter(model.updated_at >= since)
+            rows.extend(((model.__tablename__, row_id), updated_at, video_id)
+                        for row_id, video_id, updated_at in query)
+        return rows
+
+    def _build_document(self, video_id):
+        """ビデオIDの要約とトランスクリプトから検索用ドキュメントを組み立てます。"""
+        summaries = VideoSummary.query.filter_by(video_id=video_id).all()
+        transcript = VideoTranscript.query.filter_by(video_id=video_id).first()
+        if not summaries and not transcript:
+            return None, None
+
+        summary_texts = []
+        metadata = {
+            'video_url': f'https://www.youtube.com/watch?v={video_id}',
+            'video_title': None,
+            'channel_title': None,
+            'has_summary': bool(summaries),
+            'has_transcript': transcript is not None
+        }
+        for summary in summaries:
+            metadata['video_title'] = metadata['video_title'] or summary.video_title
+            metadata['channel_title'] = metadata['channel_title'] or summary.channel_title
+            summary_texts.append(summary.brief_summary or '')
+            summary_texts.extend(summary.key_points or [])
+            summary_texts.extend(summary.main_topics or [])
+            if summary.markdown_content:
+                summary_texts.append(summary.markdown_content)
+
+        fields = {
+            'title': metadata['video_title'] or '',
+            'summary': '\n'.join(summary_texts),
+            'transcript': transcript.transcript if transcript else ''
+        }
+        return fields, metadata
+
+    def _apply_changes(self, video_ids, initial):
+        """更新されたビデオのドキュメントを組み立て直してインデックスに反映します。"""
+        documents = [(video_id,) + self._build_document(video_id) for video_id in set(video_ids)]
+
+        if initial:
+            index = SearchIndex()
+            for video_id, fields, metadata in documents:
+                if fields is not None:
+                    index.add_document(video_id, fields, metadata)
+            with self._lock:
+                self.index = index
+            return
+
+        with self._lock:
+            for video_id, fields, metadata in documents:
+                if fields is None:
+                    self.index.remove_document(video_id)
+                else:
+                    self.index.add_document(video_id, fields, metadata)
+
+    def search(self, query, limit=10):
+        """
+        インデックスを同期してから検索します。
+
+        Args:
+            query (str): 検索クエリ
+            limit (int): 返す結果の最大数
+
+        Returns:
+            list: 検索結果のリスト
+
+        Raises:
+            IndexLoadingError: 最初のインデックスの構築が完了していない場合
+        """
+        self.sync()
+        with self._lock:
+            return self.index.search(query, limit=limit)
+
+
+# アプリケーション全体で共有する検索インスタンス
+library_search = LibrarySearch()
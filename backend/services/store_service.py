@@ -0,0 +1,174 @@
+"""
+要約ストアサービス - トランスクリプトと要約をデータベースに保存・取得する
+"""
+import re
+
+from services.db_service import db
+from models.video_transcript import VideoTranscript
+from models.video_summary import VideoSummary
+
+# 言語が指定されていない場合の要約言語（プロンプトが日本語のため）
+DEFAULT_SUMMARY_LANGUAGE = 'ja'
+
+# 要約の言語コード（例: ja、en、pt-BR）
+LANGUAGE_CODE_RE = re.compile(r'^[a-z]{2,3}(-[A-Za-z]{2,4})?$')
+
+
+class TranscriptCache:
+    """
+    YouTubeServiceに渡すデータベースバックエンドのトランスクリプトキャッシュ。
+
+    保存に失敗しても呼び出し元の処理を止めないよう、例外はログ出力のみ行います。
+    """
+
+    def get(self, video_id, language_codes=None):
+        """
+        キャッシュ済みのトランスクリプトを取得します。
+
+        Args:
+            video_id (str): YouTubeビデオID
+            language_codes (list, optional): 許容する言語コードのリスト
+
+        Returns:
+            dict: YouTubeService.get_transcriptと同じ形式の結果
+            None: キャッシュに存在しない場合
+        """
+        try:
+            record = VideoTranscript.query.filter_by(video_id=video_id).first()
+        except Exception as e:
+            print(f"トランスクリプトキャッシュ取得エラー: {str(e)}")
+            return None
+
+        if not record:
+            return None
+        if language_codes and record.language not in language_codes:
+            return None
+        return record.to_result()
+
+    def set(self, video_id, result):
+        """
+        取得したトランスクリプトを保存します。
+
+        Args:
+            video_id (str): YouTubeビデオID
+            result (dict): YouTubeService.get_transcriptの成功結果
+        """
+        try:
+            segments = [
+                {
+                    'text': item.get('text', ''),
+                    'start': item.get('start', 0),
+                    'duration': item.get('duration', 0)
+                }
+                for item in (result.get('raw_data') or [])
+            ]
+
+            record = VideoTranscript.query.filter_by(video_id=video_id).first()
+            if record is None:
+                record = VideoTranscript(video_id=video_id)
+                db.session.add(record)
+
+            record.language = result.get('language')
+            record.transcript = result.get('transcript') or ''
+            record.segments = segments
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"トランスクリプトキャッシュ保存エラー: {str(e)}")
+
+
+def save_summary(video_id, summary_data, format_type='json', language=None):
+    """
+    生成した要約を保存します。同じビデオ・フォーマット・言語の要約は上書きされます。
+
+    Args:
+        video_id (str): YouTubeビデオID
+        summary_data (dict): GeminiService.generate_summaryの結果
+        format_type (str): 要約のフォーマット（"json"または"markdown"）
+        language (str, optional): 要約の言語
+
+    Returns:
+        VideoSummary: 保存した要約
+        None: 保存に失敗した場合
+    """
+    language = language or DEFAULT_SUMMARY_LANGUAGE
+
+    try:
+        record = VideoSummary.query.filter_by(
+            video_id=video_id,
+            format_type=format_type,
+            language=language
+        ).first()
+        if record is None:
+            record = VideoSummary(video_id=video_id, format_type=format_type, language=language)
+            db.session.add(record)
+
+        record.video_title = summary_data.get('video_title')
+        record.channel_id = summary_data.get('channel_id')
+        record.channel_title = summary_data.get('channel_title')
+        record.brief_summary = summary_data.get('brief_summary')
+        record.key_points = summary_data.get('key_points') or []
+        record.main_topics = summary_data.get('main_topics') or []
+        record.markdown_content = summary_data.get('markdown_content')
+        db.session.commit()
+        return record
+    except Exception as e:
+        db.session.rollback()
+        print(f"要約保存エラー: {str(e)}")
+        return None
+
+
+def get_summary(video_id, format_type='json', language=None):
+    """
+    保存済みの要約を取得します。
+
+    Args:
+        video_id (str): YouTubeビデオID
+        format_type (str): 要約のフォーマット（"json"または"markdown"）
+        language (str, optional): 要約の言語
+
+    Returns:
+        VideoSummary: 保存済みの要約
+        None: 存在しない場合
+    """
+    return VideoSummary.query.filter_by(
+        video_id=video_id,
+        format_type=format_type,
+        language=language or DEFAULT_SUMMARY_LANGUAGE
+    ).first()
+
+
+def find_translation_source(video_id, format_type='json', language=None):
+    """
+    指定した言語以外で保存済みの要約から、翻訳元として使う要約を選びます。
+
+    JSON形式の要約にはどのフォーマットの要約も使えますが、Markdown形式の要約には
+    Markdown本文を持つ要約のみを使います。元の要約（DEFAULT_SUMMARY_LANGUAGE）を優先し、
+    次に更新日時が新しいものを選びます。
+
+    Args:
+        video_id (str): YouTubeビデオID
+        format_type (str): 翻訳後の要約のフォーマット（"json"または"markdown"）
+        language (str, optional): 翻訳先の言語
+
+    Returns:
+        VideoSummary: 翻訳元の要約
+        None: 存在しない場合
+    """
+    language = language or DEFAULT_SUMMARY_LANGUAGE
+    query = VideoSummary.query.filter(
+        VideoSummary.video_id == video_id,
+        VideoSummary.language != language
+    )
+    if format_type == 'markdown':
+        query = query.filter(VideoSummary.format_type == 'markdown')
+
+    candidates = query.all()
+    if not candidates:
+        return None
+
+    return min(candidates, key=lambda summary: (
+        summary.language != DEFAULT_SUMMARY_LANGUAGE,
+        summary.format_type != format_type,
+        -(summary.updated_at.timestamp() if summary.updated_at else 0)
+    ))
@@ -0,0 +1,197 @@
+"""
+トランスクリプト先読みサービス - 検索結果の上位のビデオのトランスクリプトを投機的に取得する
+
+検索の後にユーザーが要約するのはたいてい上位数件のビデオのため、それらのトランスクリプトを
+バックグラウンドで取得してトランスクリプトキャッシュに保存しておきます。
+先読みは少数のワーカーで行い、要約・検索が混雑している場合やトランスクリプト取得のサーキットが
+クローズでない場合、未使用の先読みが上限に達している場合は見送ります（実行待ちのものは開始時に取り消します）。
+先読みしたトランスクリプトが実際に要約に使われた割合を記録し、先読みする件数の調整に使います。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.admission_service import admission_controllers
+from services.circuit_breaker import CLOSED
+from services.youtube_service import transcript_breaker
+
+# 要約と同じ優先順位で取得する（GeminiService._get_transcriptと同じ言語コード）
+PREFETCH_LANGUAGE_CODES = ['ja', 'en']
+
+
+class TranscriptPrefetcher:
+    """
+    トランスクリプトの先読みを管理します。
+
+    先読みして未使用のトランスクリプトはTTLの間だけ追跡し、その間に要約に使われればヒット、
+    使われなければ無駄な取得として数えます。
+    """
+
+    def __init__(self, top_n=None, workers=None, max_pending=None, max_unused=None, ttl=None, wait_seconds=None):
+        self.top_n = int(top_n if top_n is not None else os.getenv('TRANSCRIPT_PREFETCH_TOP_N', '3'))
+        self.max_pending = int(max_pending or os.getenv('TRANSCRIPT_PREFETCH_MAX_PENDING', '16'))
+        self.max_unused = int(max_unused or os.getenv('TRANSCRIPT_PREFETCH_MAX_UNUSED', '500'))
+        self.ttl = float(ttl or os.getenv('TRANSCRIPT_PREFETCH_TTL', '3600'))
+        self.wait_seconds = float(wait_seconds or os.getenv('TRANSCRIPT_PREFETCH_WAIT_SECONDS', '10'))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(workers or os.getenv('TRANSCRIPT_PREFETCH_WORKERS', '2')),
+            thread_name_prefix='transcript-prefetch'
+        )
+        self._inflight = {}
+        self._unused = OrderedDict()
+        self._lock = threading.Lock()
+        self.issued = 0
+        self.fetched = 0
+        self.failed = 0
+        self.already_cached = 0
+        self.skipped_load = 0
+        self.skipped_full = 0
+        self.cancelled = 0
+        self.claims = 0
+        self.hits = 0
+        self.late_hits = 0
+        self.wasted = 0
+
+    def _overloaded(self):
+        """要約・検索の待機キューにリクエストがあるか、トランスクリプト取得のサーキットがクローズでない場合にTrueを返します。"""
+        if transcript_breaker.state != CLOSED:
+            return True
+        return any(
+            admission_controllers[name].snapshot()['queue_depth'] > 0
+            for name in ('summarize', 'search')
+        )
+
+    def _expire(self):
+        """TTLを過ぎても使われなかった先読みを無駄な取得として数えます。ロックを保持した状態で呼び出します。"""
+        now = time.monotonic()
+        while self._unused:
+            fetched_at = next(iter(self._unused.values()))
+            if now - fetched_at <= self.ttl:
+                break
+            self._unused.popitem(last=False)
+            self.wasted += 1
+
+    def schedule(self, app, youtube_service, video_ids, top_n=None):
+        """
+        上位のビデオのトランスクリプトの先読みを登録します。
+
+        Args:
+            app (Flask): ワーカースレッドでアプリケーションコンテキストを作成するためのアプリケーション
+            youtube_service (YouTubeService): トランスクリプトキャッシュを持つYouTubeServiceのインスタンス
+            video_ids (list): 検索結果のビデオID（順位順）
+            top_n (int, optional): 先読みする件数（デフォルトはTRANSCRIPT_PREFETCH_TOP_N）
+        """
+        if youtube_service.transcript_cache is None:
+            return
+
+        top_n = self.top_n if top_n is None else top_n
+        for video_id in video_ids[:top_n]:
+            overloaded = self._overloaded()
+            with self._lock:
+                self._expire()
+                if video_id in self._inflight or video_id in self._unused:
+                    continue
+                if overloaded:
+                    self.skipped_load += 1
+                    continue
+                if len(self._unused) >= self.max_unused or len(self._inflight) >= self.max_pending:
+                    self.skipped_full += 1
+                    continue
+
+                self._inflight[video_id] = self._executor.submit(self._run, app, youtube_service, video_id)
+                self.issued += 1
+
+    def _run(self, app, youtube_service, video_id):
+        """ワーカースレッドで1件のトランスクリプトを取得してキャッシュに保存します。"""
+        try:
+            # 実行待ちの間に混雑したり未使用の先読みが上限に達したりした場合は取り消す
+            overloaded = self._overloaded()
+            with self._lock:
+                if overloaded or len(self._unused) >= self.max_unused:
+                    self.cancelled += 1
+                    return False
+
+            with app.app_context():
+                if youtube_service.transcript_cache.get(video_id, PREFETCH_LANGUAGE_CODES):
+                    with self._lock:
+                        self.already_cached += 1
+                    return False
+                result = youtube_service.get_transcript(video_id, language_codes=PREFETCH_LANGUAGE_CODES)
+
+            with self._lock:
+                if result['success']:
+                    self.fetched += 1
+                    self._unused[video_id] = time.monotonic()
+                else:
+                    self.failed += 1
+            return result['success']
+
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            print(f"トランスクリプト先読みエラー: {str(e)}")
+            return False
+        finally:
+            with self._lock:
+                self._inflight.pop(video_id, None)
+
+    def claim(self, video_id):
+        """
+        トランスクリプトを使う直前に呼び出します。先読み中であれば完了を待ち、
+        同じトランスクリプトを重複して取得しないようにします。
+
+        Args:
+            video_id (str): YouTubeビデオID
+
+        Returns:
+            bool: 先読みしたトランスクリプトが使われた場合はTrue
+        """
+        with self._lock:
+            future = self._inflight.get(video_id)
+
+        if future is not None:
+            try:
+                future.result(timeout=self.wait_seconds)
+            except Exception:
+                # 待ちきれなかった場合や先読みに失敗した場合は通常どおり取得する
+                pass
+
+        with self._lock:
+            self._expire()
+            self.claims += 1
+            if self._unused.pop(video_id, None) is None:
+                return False
+            self.hits += 1
+            if future is not None:
+                self.late_hits += 1
+            return True
+
+    def snapshot(self):
+        """先読みの件数とヒット率を辞書で返します。"""
+        with self._lock:
+            self._expire()
+            return {
+                'top_n': self.top_n,
+                'in_flight': len(self._inflight),
+                'unused': len(self._unused),
+                'issued': self.issued,
+                'fetched': self.fetched,
+                'failed': self.failed,
+                'already_cached': self.already_cached,
+                'skipped_load': self.skipped_load,
+                'skipped_full': self.skipped_full,
+                'cancelled': self.cancelled,
+                'hits': self.hits,
+                'late_hits': self.late_hits,
+                'wasted': self.wasted,
+                # 先読みしたトランスクリプトのうち要約に使われた割合
+                'precision': round(self.hits / self.fetched, 3) if self.fetched else None,
+                # 要約のうち先読みしたトランスクリプトを使えた割合
+                'coverage': round(self.hits / self.claims, 3) if self.claims else None
+            }
+
+
+# アプリケーション全体で共有するトランスクリプト先読み
+transcript_prefetcher = TranscriptPrefetcher()
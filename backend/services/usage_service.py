@@ -0,0 +1,132 @@
+"""
+利用量サービス - ユーザーごとの1日あたりの要約リクエスト数とトークン予算を管理する
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from services.db_service import db
+from models.user_usage import UserUsage
+
+
+class BudgetExceededError(Exception):
+    """ユーザーの1日あたりの予算を超えた場合に送出される例外"""
+
+    def __init__(self, message, budget):
+        super().__init__(message)
+        self.budget = budget
+
+
+def _limits():
+    """環境変数から1日あたりのリクエスト数とトークン数の上限を取得します。"""
+    return (
+        int(os.getenv('SUMMARY_DAILY_REQUEST_LIMIT', '50')),
+        int(os.getenv('SUMMARY_DAILY_TOKEN_LIMIT', '2000000'))
+    )
+
+
+def _today():
+    return datetime.utcnow().date()
+
+
+def _ensure_row(user_id, usage_date):
+    """当日の利用量の行がなければ作成します（同時作成時の一意制約違反は無視します）。"""
+    if UserUsage.query.filter_by(user_id=user_id, usage_date=usage_date).first():
+        return
+    try:
+        db.session.add(UserUsage(user_id=user_id, usage_date=usage_date, request_count=0, token_count=0))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+
+
+def get_budget(user_id):
+    """
+    ユーザーの当日の利用量と残り予算を返します。
+
+    Args:
+        user_id (str): ユーザーID
+
+    Returns:
+        dict: 使用量、上限、残りのリクエスト数とトークン数
+    """
+    request_limit, token_limit = _limits()
+    usage = UserUsage.query.filter_by(user_id=user_id, usage_date=_today()).first()
+    requests_used = usage.request_count if usage else 0
+    tokens_used = usage.token_count if usage else 0
+
+    return {
+        'date': _today().isoformat(),
+        'requests_used': requests_used,
+        'requests_limit': request_limit,
+        'requests_remaining': max(request_limit - requests_used, 0),
+        'tokens_used': tokens_used,
+        'tokens_limit': token_limit,
+        'tokens_remaining': max(token_limit - tokens_used, 0)
+    }
+
+
+def reserve_request(user_id):
+    """
+    予算内であれば要約リクエストを1件分予約します。
+
+    上限の確認と加算を1つのUPDATE文で行うため、同時リクエストでも上限を超えません。
+
+    Args:
+        user_id (str): ユーザーID
+
+    Returns:
+        dict: 予約後の予算情報
+
+    Raises:
+        BudgetExceededError: リクエスト数またはトークン数の上限に達している場合
+    """
+    request_limit, token_limit = _limits()
+    today = _today()
+    _ensure_row(user_id, today)
+
+    updated = UserUsage.query.filter(
+        UserUsage.user_id == user_id,
+        UserUsage.usage_date == today,
+        UserUsage.request_count < request_limit,
+        UserUsage.token_count < token_limit
+    ).update({UserUsage.request_count: UserUsage.request_count + 1}, synchronize_session=False)
+    db.session.commit()
+
+    budget = get_budget(user_id)
+    if not updated:
+        raise BudgetExceededError('本日の要約の利用上限に達しました', budget)
+    return budget
+
+
+def release_request(user_id):
+    """要約に失敗した場合など、予約したリクエストを取り消します。"""
+    UserUsage.query.filter(
+        UserUsage.user_id == user_id,
+        UserUsage.usage_date == _today(),
+        UserUsage.request_count > 0
+    ).update({UserUsage.request_count: UserUsage.request_count - 1}, synchronize_session=False)
+    db.session.commit()
+
+
+def record_tokens(user_id, tokens):
+    """
+    要約で使用したトークン数を加算します。
+
+    Args:
+        user_id (str): ユーザーID
+        tokens (int): 使用したトークン数
+
+    Returns:
+        dict: 加算後の予算情報
+    """
+    if tokens:
+        today = _today()
+        _ensure_row(user_id, today)
+        UserUsage.query.filter_by(user_id=user_id, usage_date=today).update(
+            {UserUsage.token_count: UserUsage.token_count + int(tokens)},
+            synchronize_session=False
+        )
+        db.session.commit()
+    return get_budget(user_id)
@@ -1,22 +1,95 @@
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
+from youtube_transcript_api import (
+    YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable,
+    VideoUnavailable, InvalidVideoId
+)
 import json
+import threading
+from services.circuit_breaker import get_breaker, CircuitOpenError
+
+
+def _is_youtube_failure(error):
+    """Client errors (4xx except 429) are caused by the request, not by the YouTube API."""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        return status == 429 or status >= 500
+    return True
+
+
+def _is_transcript_failure(error):
+    """Videos without transcripts are a normal outcome, not a transcript source failure."""
+    return not isinstance(error, (TranscriptsDisabled, NoTranscriptFound, NoTranscriptAvailable,
+                                  VideoUnavailable, InvalidVideoId))
+
+
+# Circuit breakers shared by all YouTubeService instances
+youtube_breaker = get_breaker('youtube', is_failure=_is_youtube_failure)
+transcript_breaker = get_breaker('transcript', is_failure=_is_transcript_failure)
 
 
 class YouTubeService:
     """Service class for handling YouTube API operations."""
     
-    def __init__(self, api_key):
-        """Initialize the service with an API key."""
+    def __init__(self, api_key, transcript_cache=None):
+        """
+        Initialize the service with an API key.
+        
+        Args:
+            api_key (str): YouTube Data API key
+            transcript_cache (optional): Object with get(video_id, language_codes) and
+                                         set(video_id, result) used to reuse fetched transcripts
+        """
         self.api_key = api_key
-        self.youtube = self._create_youtube_client()
+        self.transcript_cache = transcript_cache
+        self._local = threading.local()
     
     def _create_youtube_client(self):
         """Create and return a YouTube API client."""
         return build('youtube', 'v3', developerKey=self.api_key)
     
-    def search_videos(self, query, max_results=10, channel_id=None, published_after=None):
+    @property
+    def youtube(self):
+        """
+        YouTube API client of the current thread.
+        
+        The httplib2 transport of a client is not thread-safe, so request threads and the
+        background prefetch threads each build their own client on first use.
+        """
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._create_youtube_client()
+        return client
+    
+    def _execute(self, request):
+        """
+        Execute a YouTube API request through the YouTube circuit breaker.
+        
+        Raises:
+            CircuitOpenError: If the YouTube API circuit is open
+            HttpError: If there's an error with the YouTube API
+        """
+        return youtube_breaker.call(request.execute)
+    
+    def _fetch_transcript(self, video_id, language_codes):
+        """Find and fetch the best matching transcript. Returns (transcript, transcript_data)."""
+        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        
+        # If language_codes is not provided, get all available transcripts
+        if language_codes is None:
+            # Try to get the transcript in the original language first
+            try:
+                transcript = transcript_list.find_transcript(['ja', 'en'])
+            except NoTranscriptFound:
+                # If original language not found, get the first available transcript
+                transcript = next(transcript_list._transcripts.values().__iter__())
+        else:
+            # Try to get transcript in one of the specified languages
+            transcript = transcript_list.find_transcript(language_codes)
+        
+        return transcript, transcript.fetch()
+    
+    def search_videos(self, query, max_results=10, channel_id=None, published_after=None, page_token=None):
         """
         Search for YouTube videos based on parameters.
         
@@ -25,11 +98,13 @@ class YouTubeService:
             max_results (int): Maximum number of results to return
             channel_id (str, optional): Filter by channel ID
             published_after (str, optional): Filter videos published after this date (ISO 8601 format)
+            page_token (str, optional): nextPageToken of the previous page
             
         Returns:
-            dict: Search results with video information
+            dict: Search results with video information and the token of the next page
         
         Raises:
+            CircuitOpenError: If the YouTube API circuit is open
             HttpError: If there's an error with the YouTube API
             Exception: For any other errors
         """
@@ -51,18 +126,22 @@ class YouTubeService:
             if published_after:
                 search_params['publishedAfter'] = published_after
             
+            if page_token:
+                search_params['pageToken'] = page_token
+            
             # Call the search.list method to retrieve results
-            search_response = self.youtube.search().list(**search_params
-            ).execute()
+            search_response = self._execute(self.youtube.search().list(**search_params))
+            items = search_response.get('items', [])
+            
+            # Get detailed information for all videos on the page in a single call
+            details = self._get_videos_details([item['id']['videoId'] for item in items])
             
             # Extract relevant information from the response
             videos = []
-            for item in search_response.get('items', []):
+            for item in items:
                 video_id = item['id']['videoId']
                 video_url = f"https://www.youtube.com/watch?v={video_id}"
-                
-                # Get detailed video information
-                video_details = self._get_video_details(video_id)
+                video_details = details.get(video_id, {})
                 
                 video = {
                     'id': video_id,
@@ -82,7 +161,8 @@ class YouTubeService:
             return {
                 'query': query,
                 'count': len(videos),
-                'videos': videos
+                'videos': videos,
+                'next_page_token': search_response.get('nextPageToken')
             }
             
         except HttpError as e:
@@ -90,7 +170,7 @@ class YouTubeService:
         except Exception as e:
             raise e
     
-    def get_transcript(self, video_id, language_codes=None):
+    def get_transcript(self, video_id, language_codes=None, use_cache=True):
         """
         Get transcript for a YouTube video.
         
@@ -98,6 +178,8 @@ class YouTubeService:
             video_id (str): The YouTube video ID
             language_codes (list, optional): List of language codes to prioritize, e.g. ['ja', 'en']
                                             If None, will try to get the default transcript
+            use_cache (bool, optional): Read and write the transcript cache. Disable for live streams,
+                                        whose transcript is still growing
         
         Returns:
             dict: {
@@ -106,30 +188,23 @@ class YouTubeService:
                 'language': str or None,
                 'error': str or None
             }
+        
+        Raises:
+            CircuitOpenError: If the transcript source circuit is open
         """
+        # Serve from the transcript cache when available
+        if use_cache and self.transcript_cache is not None:
+            cached = self.transcript_cache.get(video_id, language_codes)
+            if cached:
+                return cached
+        
         try:
-            # If language_codes is not provided, get all available transcripts
-            if language_codes is None:
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-                
-                # Try to get the transcript in the original language first
-                try:
-                    transcript = transcript_list.find_transcript(['ja', 'en'])
-                except NoTranscriptFound:
-                    # If original language not found, get the first available transcript
-                    transcript = next(transcript_list._transcripts.values().__iter__())
-            else:
-                # Try to get transcript in one of the specified languages
-                transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
-                transcript = transcript_list.find_transcript(language_codes)
-            
-            # Get the transcript data
-            transcript_data = transcript.fetch()
+            transcript, transcript_data = transcript_breaker.call(self._fetch_transcript, video_id, language_codes)
             
             # Combine all transcript parts into a single string
             full_transcript = ' '.join([item['text'] for item in transcript_data])
             
-            return {
+            result = {
                 'success': True,
                 'transcript': full_transcript,
                 'language': transcript.language_code,
@@ -137,6 +212,11 @@ class YouTubeService:
                 'raw_data': transcript_data  # Include raw data for more detailed processing if needed
             }
             
+            if use_cache and self.transcript_cache is not None:
+                self.transcript_cache.set(video_id, result)
+            
+            return result
+            
         except TranscriptsDisabled:
             return {
                 'success': False,
@@ -151,6 +231,8 @@ class YouTubeService:
                 'language': None,
                 'error': 'No transcript found for the specified languages'
             }
+        except CircuitOpenError:
+            raise
         except Exception as e:
             return {
                 'success': False,
@@ -167,25 +249,174 @@ class YouTubeService:
             video_id (str): The YouTube video ID
             
         Returns:
-            dict: Video statistics
+            dict: Video snippet fields, statistics and live broadcast status
         """
-        video_response = self.youtube.videos().list(
-            part='snippet,statistics',
+        video_response = self._execute(self.youtube.videos().list(
+            part='snippet,statistics,liveStreamingDetails',
             id=video_id
-        ).execute()
+        ))
         
         if not video_response.get('items'):
             return {}
             
         video_info = video_response['items'][0]
+        snippet = video_info.get('snippet', {})
         statistics = video_info.get('statistics', {})
+        live_details = video_info.get('liveStreamingDetails', {})
         
         return {
+            'title': snippet.get('title'),
+            'channel_id': snippet.get('channelId'),
+            'channel_title': snippet.get('channelTitle'),
+            'published_at': snippet.get('publishedAt'),
             'view_count': statistics.get('viewCount', 'N/A'),
             'like_count': statistics.get('likeCount', 'N/A'),
-            'comment_count': statistics.get('commentCount', 'N/A')
+            'comment_count': statistics.get('commentCount', 'N/A'),
+            # "live" or "upcoming" while a live stream or premiere has not ended, otherwise "none"
+            'live_broadcast_content': snippet.get('liveBroadcastContent', 'none'),
+            'actual_end_time': live_details.get('actualEndTime')
         }
     
+    def _get_videos_details(self, video_ids):
+        """
+        Get statistics for several videos with one videos.list call per 50 IDs.
+        
+        Args:
+            video_ids (list): YouTube video IDs
+            
+        Returns:
+            dict: Video statistics keyed by video ID
+        """
+        details = {}
+        unique_ids = list(dict.fromkeys(video_ids))
+        
+        for i in range(0, len(unique_ids), 50):
+            video_response = self._execute(self.youtube.videos().list(
+                part='statistics',
+                id=','.join(unique_ids[i:i + 50])
+            ))
+            
+            for video_info in video_response.get('items', []):
+                statistics = video_info.get('statistics', {})
+                details[video_info['id']] = {
+                    'view_count': statistics.get('viewCount', 'N/A'),
+                    'like_count': statistics.get('likeCount', 'N/A'),
+                    'comment_count': statistics.get('commentCount', 'N/A')
+                }
+        
+        return details
+    
+    def get_playlist_video_ids(self, playlist_id, max_results=None):
+        """
+        Get the video IDs in a playlist, following pagination.
+        
+        Args:
+            playlist_id (str): The YouTube playlist ID
+            max_results (int, optional): Maximum number of video IDs to return
+            
+        Returns:
+            list: Video IDs in playlist order
+            
+        Raises:
+            HttpError: If there's an error with the YouTube API
+        """
+        video_ids = []
+        page_token = None
+        
+        while True:
+            response = self._execute(self.youtube.playlistItems().list(
+                part='contentDetails',
+                playlistId=playlist_id,
+                maxResults=50,
+                pageToken=page_token
+            ))
+            
+            for item in response.get('items', []):
+                video_ids.append(item['contentDetails']['videoId'])
+                if max_results and len(video_ids) >= max_results:
+                    return video_ids
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return video_ids
+    
+    def get_channel_uploads_playlist_id(self, channel_id):
+        """
+        Get the ID of the playlist that contains all uploads of a channel.
+        
+        Args:
+            channel_id (str): The YouTube channel ID
+            
+        Returns:
+            str: Uploads playlist ID, or None if the channel was not found
+            
+        Raises:
+            HttpError: If there's an error with the YouTube API
+        """
+        response = self._execute(self.youtube.channels().list(
+            part='contentDetails',
+            id=channel_id
+        ))
+        
+        if not response.get('items'):
+            return None
+        
+        return response['items'][0]['contentDetails']['relatedPlaylists']['uploads']
+    
+    def get_recent_uploads(self, channel_id, published_after, max_results=200):
+        """
+        Get the uploads of a channel published after a given time, newest first.
+        
+        Args:
+            channel_id (str): The YouTube channel ID
+            published_after (datetime): Only return videos published after this time (UTC)
+            max_results (int, optional): Maximum number of videos to return
+            
+        Returns:
+            list: Dicts with video_id, title and published_at, or None if the channel was not found
+            
+        Raises:
+            CircuitOpenError: If the YouTube API circuit is open
+            HttpError: If there's an error with the YouTube API
+        """
+        uploads_playlist_id = self.get_channel_uploads_playlist_id(channel_id)
+        if not uploads_playlist_id:
+            return None
+        
+        cutoff = published_after.strftime('%Y-%m-%dT%H:%M:%SZ')
+        videos = []
+        page_token = None
+        
+        while True:
+            response = self._execute(self.youtube.playlistItems().list(
+                part='snippet,contentDetails',
+                playlistId=uploads_playlist_id,
+                maxResults=50,
+                pageToken=page_token
+            ))
+            
+            items = response.get('items', [])
+            for item in items:
+                published_at = item['contentDetails'].get('videoPublishedAt') or item['snippet'].get('publishedAt')
+                if published_at and published_at > cutoff:
+                    videos.append({
+                        'video_id': item['contentDetails']['videoId'],
+                        'title': item['snippet'].get('title'),
+                        'published_at': published_at
+                    })
+            
+            # The uploads playlist is ordered newest first, so stop at the first page that reaches the cutoff
+            page_token = response.get('nextPageToken')
+            reached_cutoff = any(
+                (item['contentDetails'].get('videoPublishedAt') or item['snippet'].get('publishedAt') or '') <= cutoff
+                for item in items
+            )
+            if not page_token or reached_cutoff or len(videos) >= max_results:
+                break
+        
+        videos.sort(key=lambda video: video['published_at'], reverse=True)
+        return videos[:max_results]
+    
     def get_channel_info(self, channel_id):
         """
         チャンネルの詳細情報を取得します。
@@ -196,44 +427,40 @@ class YouTubeService:
         Returns:
             dict: チャンネル情報（タイトル、サムネイル、説明など）
             None: チャンネルが見つからない場合
-        """
-        try:
-            # チャンネル情報を取得
-            channel_response = self.youtube.channels().list(
-                part='snippet,statistics',
-                id=channel_id
-            ).execute()
-            
-            # チャンネルが見つからない場合
-            if not channel_response.get('items'):
-                return None
-                
-            channel_info = channel_response['items'][0]
-            snippet = channel_info.get('snippet', {})
-            statistics = channel_info.get('statistics', {})
-            
-            # サムネイル画像のURLを取得（利用可能な最高品質）
-            thumbnails = snippet.get('thumbnails', {})
-            thumbnail_url = None
-            for quality in ['high', 'medium', 'default']:
-                if quality in thumbnails:
-                    thumbnail_url = thumbnails[quality]['url']
-                    break
-            
-            return {
-                'id': channel_id,
-                'title': snippet.get('title', '不明なチャンネル'),
-                'description': snippet.get('description', ''),
-                'thumbnail': thumbnail_url,
-                'published_at': snippet.get('publishedAt'),
-                'subscriber_count': statistics.get('subscriberCount', 'N/A'),
-                'video_count': statistics.get('videoCount', 'N/A'),
-                'view_count': statistics.get('viewCount', 'N/A')
-            }
             
-        except HttpError as e:
-            print(f"YouTube API エラー: {str(e)}")
-            return None
-        except Exception as e:
-            print(f"チャンネル情報取得エラー: {str(e)}")
+        Raises:
+            CircuitOpenError: YouTube APIのサーキットがオープン状態の場合
+            HttpError: YouTube APIでエラーが発生した場合
+        """
+        # チャンネル情報を取得
+        channel_response = self._execute(self.youtube.channels().list(
+            part='snippet,statistics',
+            id=channel_id
+        ))
+        
+        # チャンネルが見つからない場合
+        if not channel_response.get('items'):
             return None
+            
+        channel_info = channel_response['items'][0]
+        snippet = channel_info.get('snippet', {})
+        statistics = channel_info.get('statistics', {})
+        
+        # サムネイル画像のURLを取得（利用可能な最高品質）
+        thumbnails = snippet.get('thumbnails', {})
+        thumbnail_url = None
+        for quality in ['high', 'medium', 'default']:
+            if quality in thumbnails:
+                thumbnail_url = thumbnails[quality]['url']
+                break
+        
+        return {
+            'id': channel_id,
+            'title': snippet.get('title', '不明なチャンネル'),
+            'description': snippet.get('description', ''),
+            'thumbnail': thumbnail_url,
+            'published_at': snippet.get('publishedAt'),
+            'subscriber_count': statistics.get('subscriberCount', 'N/A'),
+            'video_count': statistics.get('videoCount', 'N/A'),
+            'view_count': statistics.get('viewCount', 'N/A')
+        }
@@ -0,0 +1,172 @@
+"""
+アドミッション制御（AdmissionController, admission_controlled）のテスト
+
+実行方法:
+    python -m unittest test_admission
+"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from flask import Flask, Response, jsonify
+
+import services.admission_service as admission_service
+from services.admission_service import AdmissionController, AdmissionRejected, admission_controlled
+
+
+class AdmissionControllerTest(unittest.TestCase):
+
+    def _wait_for_queue(self, controller, depth):
+        deadline = time.monotonic() + 5
+        while controller.snapshot()['queue_depth'] != depth:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def test_admits_up_to_max_concurrent(self):
+        controller = AdmissionController('test', max_concurrent=2, max_queue=0, queue_timeout=1)
+        controller.acquire()
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire()
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['running'], snapshot['admitted'], snapshot['shed']), (2, 2, 1))
+
+    def test_queued_request_is_admitted_on_release(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=1, queue_timeout=5)
+        controller.acquire()
+        thread = threading.Thread(target=controller.acquire)
+        thread.start()
+        self._wait_for_queue(controller, 1)
+
+        controller.release(0.5)
+        thread.join(5)
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['running'], snapshot['queue_depth'], snapshot['admitted']), (1, 0, 2))
+
+    def test_full_queue_is_rejected_with_retry_after(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=1, queue_timeout=5)
+        controller.acquire()
+        controller.release(4.0)
+        controller.acquire()
+        thread = threading.Thread(target=controller.acquire)
+        thread.start()
+        self._wait_for_queue(controller, 1)
+
+        with self.assertRaises(AdmissionRejected) as rejected:
+            controller.acquire()
+        # 待機中1件と自分の分を、平均処理時間4秒・同時実行数1で処理する見込み
+        self.assertEqual(rejected.exception.retry_after, 8)
+        self.assertEqual(rejected.exception.route_class, 'test')
+
+        controller.release(4.0)
+        thread.join(5)
+
+    def test_queue_timeout(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=1, queue_timeout=0.05)
+        controller.acquire()
+        with self.assertRaises(AdmissionRejected):
+            controller.acquire()
+        snapshot = controller.snapshot()
+        self.assertEqual((snapshot['queue_timeouts'], snapshot['shed'], snapshot['queue_depth']), (1, 1, 0))
+
+    def test_average_service_time(self):
+        controller = AdmissionController('test', max_concurrent=1, max_queue=0, queue_timeout=1)
+        for seconds in (1.0, 2.0):
+            controller.acquire()
+            controller.release(seconds)
+        self.assertEqual(controller.snapshot()['avg_service_ms'], 1200.0)
+
+    def test_export_has_its_own_route_class(self):
+        controllers = admission_service.admission_controllers
+        self.assertIsNot(controllers['export'], controllers['crud'])
+        self.assertLess(controllers['export'].max_concurrent, controllers['crud'].max_concurrent)
+
+
+class AdmissionControlledTest(unittest.TestCase):
+
+    def setUp(self):
+        self.controller = AdmissionController('test', max_concurrent=1, max_queue=0, queue_timeout=1)
+        patcher = mock.patch.dict(admission_service.admission_controllers, {'test': self.controller})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.app = Flask(__name__)
+        self.finish = threading.Event()
+
+        @self.app.route('/json')
+        @admission_controlled('test')
+        def json_route():
+            return jsonify({'running': self.controller.snapshot()['running']})
+
+        @self.app.route('/error')
+        @admission_controlled('test')
+        def error_route():
+            raise RuntimeError('error')
+
+        @self.app.route('/stream')
+        @admission_controlled('test')
+        def stream_route():
+            def body():
+                yield 'first\n'
+                self.finish.wait(5)
+                yield 'last\n'
+            return Response(body(), mimetype='text/plain')
+
+        self.client = self.app.test_client()
+
+    def test_slot_is_held_during_request_and_released_after(self):
+        response = self.client.get('/json')
+        self.assertEqual(response.get_json(), {'running': 1})
+        self.assertEqual(self.controller.snapshot()['running'], 0)
+
+    def test_slot_is_released_on_exception(self):
+        self.app.testing = False
+        self.app.logger.disabled = True
+        self.assertEqual(self.client.get('/error').status_code, 500)
+        self.assertEqual(self.controller.snapshot()['running'], 0)
+
+    def test_rejected_request_returns_503_with_retry_after(self):
+        self.controller.acquire()
+        response = self.client.get('/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers['Retry-After'], str(response.get_json()['retry_after']))
+        self.controller.release(0)
+
+    def test_unauthenticated_request_does_not_take_a_slot(self):
+        from services.auth_service import auth_required
+
+        @self.app.route('/private')
+        @auth_required
+        @admission_controlled('test')
+        def private_route():
+            return jsonify({})
+
+        # 実行枠がすべて使用中でも、認証されていないリクエストは503ではなく401になる
+        self.controller.acquire()
+        response = self.client.get('/private')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.controller.snapshot()['admitted'], 1)
+        self.controller.release(0)
+
+    def test_streaming_response_holds_slot_until_closed(self):
+        response = self.client.get('/stream', buffered=False)
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks), b'first\n')
+        self.assertEqual(self.controller.snapshot()['running'], 1)
+        self.assertEqual(self.client.get('/json').status_code, 503)
+
+        self.finish.set()
+        self.assertEqual(list(chunks), [b'last\n'])
+        response.close()
+        self.assertEqual(self.controller.snapshot()['running'], 0)
+
+    def test_streaming_slot_is_released_when_client_disconnects(self):
+        response = self.client.get('/stream', buffered=False)
+        next(iter(response.response))
+        response.close()
+        self.assertEqual(self.controller.snapshot()['running'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+オフライン一括要約スクリプト（batch_summarize）のテスト
+
+実行方法:
+    python -m unittest test_batch_summarize
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import batch_summarize
+
+SUMMARY = {'video_id': 'abcdefghijk', 'brief_summary': 'summary', 'model_id': 'model', 'token_count': 100}
+
+
+class FakeGemini:
+
+    def __init__(self, result):
+        self.result = result
+
+    def generate_summary(self, video_id, youtube_service, format_type='json'):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+class SummarizeTest(unittest.TestCase):
+
+    def _run(self, result, store, saved=object()):
+        worker = {'gemini': FakeGemini(result), 'youtube': None, 'store': store}
+        with mock.patch.dict(batch_summarize._worker, worker), \
+                mock.patch('services.store_service.save_summary', return_value=saved) as save_summary:
+            return batch_summarize._summarize('abcdefghijk', 'json'), save_summary
+
+    def test_success_without_store(self):
+        result, save_summary = self._run(SUMMARY, store=False)
+        self.assertEqual(result['status'], 'ok')
+        self.assertEqual(result['summary'], SUMMARY)
+        save_summary.assert_not_called()
+
+    def test_success_with_store(self):
+        result, save_summary = self._run(SUMMARY, store=True)
+        self.assertEqual(result['status'], 'ok')
+        save_summary.assert_called_once_with('abcdefghijk', SUMMARY, format_type='json')
+
+    def test_store_failure_is_an_error(self):
+        result, _ = self._run(SUMMARY, store=True, saved=None)
+        self.assertEqual(result['status'], 'error')
+        self.assertEqual(result['error'], '要約の保存に失敗しました')
+        self.assertNotIn('summary', result)
+
+    def test_summary_error(self):
+        result, save_summary = self._run({'error': 'no transcript'}, store=True)
+        self.assertEqual((result['status'], result['error']), ('error', 'no transcript'))
+        save_summary.assert_not_called()
+
+    def test_exception(self):
+        result, _ = self._run(RuntimeError('quota'), store=False)
+        self.assertEqual((result['status'], result['error']), ('error', 'quota'))
+
+
+class CheckpointTest(unittest.TestCase):
+
+    def test_only_successful_videos_are_completed(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'batch.checkpoint')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({'video_id': 'ok_video', 'status': 'ok'}) + '\n')
+                f.write(json.dumps({'video_id': 'failed', 'status': 'error'}) + '\n')
+                f.write('{"video_id": "trunc')
+            self.assertEqual(batch_summarize.load_checkpoint(path), {'ok_video'})
+
+    def test_missing_checkpoint(self):
+        self.assertEqual(batch_summarize.load_checkpoint('/nonexistent/batch.checkpoint'), set())
+
+
+class ParseVideoIdTest(unittest.TestCase):
+
+    def test_urls_and_ids(self):
+        self.assertEqual(batch_summarize.parse_video_id('https://www.youtube.com/watch?v=abcdefghijk&t=1'), 'abcdefghijk')
+        self.assertEqual(batch_summarize.parse_video_id('https://youtu.be/abcdefghijk'), 'abcdefghijk')
+        self.assertEqual(batch_summarize.parse_video_id(' abcdefghijk \n'), 'abcdefghijk')
+        self.assertIsNone(batch_summarize.parse_video_id('# comment'))
+        self.assertIsNone(batch_summarize.parse_video_id('  '))
+
+
+if __name__ == '__main__':
+    unittest.main()
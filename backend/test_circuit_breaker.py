@@ -0,0 +1,131 @@
+"""
+サーキットブレーカーのテスト
+
+実行方法:
+    python -m unittest test_circuit_breaker
+"""
+import threading
+import time
+import unittest
+
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+
+
+def _fail():
+    raise RuntimeError('upstream error')
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def _breaker(self, **kwargs):
+        options = {'window_size': 4, 'min_calls': 2, 'open_seconds': 0.05, 'slow_call_seconds': 10.0}
+        options.update(kwargs)
+        return CircuitBreaker('test', **options)
+
+    def _trip(self, breaker):
+        for _ in range(breaker.min_calls):
+            with self.assertRaises(RuntimeError):
+                breaker.call(_fail)
+        self.assertEqual(breaker.state, OPEN)
+
+    def _start_blocking_call(self, breaker, outcome):
+        """breakerを通してreleaseがセットされるまで待つ呼び出しをスレッドで開始します。"""
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking():
+            started.set()
+            release.wait(5)
+            if outcome == 'fail':
+                raise RuntimeError('late failure')
+            return 'late success'
+
+        def run():
+            try:
+                breaker.call(blocking)
+            except RuntimeError:
+                pass
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(started.wait(5))
+        return release, thread
+
+    def test_opens_after_failures_and_rejects(self):
+        breaker = self._breaker()
+        self._trip(breaker)
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'ok')
+        self.assertEqual(breaker.snapshot()['rejected_count'], 1)
+
+    def test_probe_success_closes(self):
+        breaker = self._breaker()
+        self._trip(breaker)
+        time.sleep(breaker.open_seconds * 2)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_probe_failure_reopens(self):
+        breaker = self._breaker()
+        self._trip(breaker)
+        time.sleep(breaker.open_seconds * 2)
+        with self.assertRaises(RuntimeError):
+            breaker.call(_fail)
+        self.assertEqual(breaker.state, OPEN)
+
+    def test_stale_success_does_not_close_half_open(self):
+        breaker = self._breaker()
+        release, thread = self._start_blocking_call(breaker, 'success')
+
+        # 実行中の呼び出しを残したままクローズ→オープン→ハーフオープンに進める
+        self._trip(breaker)
+        time.sleep(breaker.open_seconds * 2)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        release.set()
+        thread.join(5)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker._half_open_calls, 0)
+
+        # 試行の枠は残っており、本来の試行呼び出しで判定される
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_stale_failure_does_not_reopen_or_leak_probe_slots(self):
+        breaker = self._breaker()
+        release, thread = self._start_blocking_call(breaker, 'fail')
+
+        self._trip(breaker)
+        time.sleep(breaker.open_seconds * 2)
+        self.assertEqual(breaker.state, HALF_OPEN)
+
+        release.set()
+        thread.join(5)
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertEqual(breaker._half_open_calls, 0)
+
+        # 同時に許可される試行はhalf_open_max_callsまで
+        probe_release, probe_thread = self._start_blocking_call(breaker, 'success')
+        with self.assertRaises(CircuitOpenError):
+            breaker.call(lambda: 'ok')
+        probe_release.set()
+        probe_thread.join(5)
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_stale_outcome_not_counted_after_recovery(self):
+        breaker = self._breaker()
+        release, thread = self._start_blocking_call(breaker, 'fail')
+
+        self._trip(breaker)
+        time.sleep(breaker.open_seconds * 2)
+        breaker.call(lambda: 'ok')
+        self.assertEqual(breaker.state, CLOSED)
+
+        release.set()
+        thread.join(5)
+        self.assertEqual(breaker.snapshot()['recent_calls'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
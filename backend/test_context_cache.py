@@ -0,0 +1,168 @@
+"""
+コンテキストキャッシュのレジストリ（ContextCacheRegistry）のテスト
+
+実行方法:
+    python -m unittest test_context_cache
+"""
+import os
+import unittest
+from unittest import mock
+
+import services.context_cache_service as context_cache_service
+from services.context_cache_service import ContextCacheRegistry
+
+MODEL = 'model'
+
+
+class FakeCacheApi:
+    """作成・削除したキャッシュ名を記録するGemini APIの代わり"""
+
+    def __init__(self):
+        self.created = []
+        self.deleted = []
+        self.fail = False
+
+    def create(self, ttl):
+        if self.fail:
+            raise RuntimeError('create failed')
+        name = f'cachedContents/{len(self.created)}'
+        self.created.append((name, ttl))
+        return name, 50000
+
+    def delete(self, name):
+        self.deleted.append(name)
+
+
+class ContextCacheRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = FakeCacheApi()
+        self.now = 1000.0
+        patcher = mock.patch.object(context_cache_service.time, 'monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _registry(self, **kwargs):
+        options = {'enabled': True, 'min_tokens': 1000, 'min_uses': 2, 'ttl': 600, 'max_entries': 2,
+                   'expiry_margin': 60, 'retry_seconds': 300}
+        options.update(kwargs)
+        return ContextCacheRegistry(**options)
+
+    def _acquire(self, registry, video_id, model_id=MODEL, prompt_tokens=5000):
+        return registry.acquire(video_id, model_id, prompt_tokens, self.api.create, self.api.delete)
+
+    def test_short_transcript_is_not_cached(self):
+        registry = self._registry(min_uses=1)
+        self.assertIsNone(self._acquire(registry, 'v1', prompt_tokens=999))
+        self.assertEqual(self.api.created, [])
+
+    def test_disabled(self):
+        registry = self._registry(enabled=False, min_uses=1)
+        self.assertIsNone(self._acquire(registry, 'v1'))
+
+    def test_cache_is_created_on_min_uses(self):
+        registry = self._registry()
+        self.assertIsNone(self._acquire(registry, 'v1'))
+        handle = self._acquire(registry, 'v1')
+        self.assertEqual(handle.name, 'cachedContents/0')
+        self.assertEqual(handle.model_id, MODEL)
+        self.assertEqual(handle.refcount, 1)
+        self.assertEqual(self.api.created, [('cachedContents/0', 600)])
+
+    def test_uses_outside_ttl_are_not_counted(self):
+        registry = self._registry()
+        self._acquire(registry, 'v1')
+        self.now += 601
+        self.assertIsNone(self._acquire(registry, 'v1'))
+
+    def test_handle_is_reused(self):
+        registry = self._registry(min_uses=1)
+        first = self._acquire(registry, 'v1')
+        second = self._acquire(registry, 'v1')
+        self.assertIs(first, second)
+        self.assertEqual(first.refcount, 2)
+        self.assertEqual((registry.created, registry.hits), (1, 1))
+
+        registry.release(first)
+        registry.release(second)
+        self.assertEqual(registry.snapshot()['in_use'], 0)
+
+    def test_caches_are_per_model(self):
+        registry = self._registry(min_uses=1)
+        first = self._acquire(registry, 'v1', model_id='fast')
+        second = self._acquire(registry, 'v1', model_id='pro')
+        self.assertIsNot(first, second)
+        self.assertEqual(second.model_id, 'pro')
+
+    def test_handle_near_expiry_is_replaced(self):
+        registry = self._registry(min_uses=1)
+        old = self._acquire(registry, 'v1')
+        self.now += 541
+        new = self._acquire(registry, 'v1')
+        self.assertIsNot(old, new)
+        self.assertEqual(registry.expired, 1)
+        self.assertEqual(len(self.api.created), 2)
+
+    def test_lru_eviction_deletes_unused_cache(self):
+        registry = self._registry(min_uses=1)
+        for video_id in ('v1', 'v2'):
+            registry.release(self._acquire(registry, video_id))
+        # v1を使うと、v2が最も古いハンドルになる
+        registry.release(self._acquire(registry, 'v1'))
+        self._acquire(registry, 'v3')
+        self.assertEqual(self.api.deleted, ['cachedContents/1'])
+        self.assertEqual(registry.evicted, 1)
+        self.assertEqual(registry.snapshot()['entries'], 2)
+
+    def test_handle_in_use_is_not_evicted(self):
+        registry = self._registry(min_uses=1)
+        in_use = self._acquire(registry, 'v1')
+        registry.release(self._acquire(registry, 'v2'))
+        self._acquire(registry, 'v3')
+        self.assertEqual(self.api.deleted, ['cachedContents/1'])
+        self.assertEqual(in_use.refcount, 1)
+
+    def test_create_failure_disables_model_for_retry_seconds(self):
+        registry = self._registry(min_uses=1)
+        self.api.fail = True
+        with mock.patch('builtins.print'):
+            self.assertIsNone(self._acquire(registry, 'v1'))
+        self.api.fail = False
+        self.assertIsNone(self._acquire(registry, 'v2'))
+        self.assertIsNotNone(self._acquire(registry, 'v2', model_id='other'))
+
+        self.now += 301
+        self.assertIsNotNone(self._acquire(registry, 'v2'))
+        self.assertEqual(registry.create_failures, 1)
+
+    def test_invalidate(self):
+        registry = self._registry(min_uses=1)
+        handle = self._acquire(registry, 'v1')
+        registry.invalidate(handle)
+        self.assertIsNot(self._acquire(registry, 'v1'), handle)
+        self.assertEqual(registry.expired, 1)
+
+    def test_zero_arguments_are_not_replaced_by_environment(self):
+        env = {
+            'GEMINI_CONTEXT_CACHE_MIN_TOKENS': '32768',
+            'GEMINI_CONTEXT_CACHE_MIN_USES': '2',
+            'GEMINI_CONTEXT_CACHE_EXPIRY_MARGIN_SECONDS': '60',
+            'GEMINI_CONTEXT_CACHE_RETRY_SECONDS': '300'
+        }
+        with mock.patch.dict(os.environ, env):
+            registry = ContextCacheRegistry(enabled=True, min_tokens=0, min_uses=0, expiry_margin=0, retry_seconds=0)
+        self.assertEqual(
+            (registry.min_tokens, registry.min_uses, registry.expiry_margin, registry.retry_seconds),
+            (0, 0, 0.0, 0.0)
+        )
+
+    def test_environment_defaults(self):
+        with mock.patch.dict(os.environ, {'GEMINI_CONTEXT_CACHE_ENABLED': 'false',
+                                          'GEMINI_CONTEXT_CACHE_MAX_ENTRIES': '5'}):
+            registry = ContextCacheRegistry()
+        self.assertFalse(registry.enabled)
+        self.assertEqual(registry.max_entries, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
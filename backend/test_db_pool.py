@@ -0,0 +1,97 @@
+"""
+コネクションプールのメトリクス（InstrumentedQueuePool, get_pool_stats）のテスト
+
+実行方法:
+    python -m unittest test_db_pool
+"""
+import os
+import tempfile
+import unittest
+
+from flask import Flask
+from sqlalchemy import exc, text
+
+from services.db_service import InstrumentedQueuePool, _instrument_engine, db, get_pool_stats
+
+
+class PoolStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _app(self, max_overflow, pool_timeout=1):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(self.directory.name, "pool.db")}'
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'poolclass': InstrumentedQueuePool,
+            'pool_size': 2,
+            'max_overflow': max_overflow,
+            'pool_timeout': pool_timeout
+        }
+        db.init_app(app)
+        with app.app_context():
+            for engine in db.engines.values():
+                _instrument_engine(engine)
+            self.addCleanup(self._dispose, app)
+        return app
+
+    def _dispose(self, app):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+
+    def test_utilization_against_pool_size_and_overflow(self):
+        app = self._app(max_overflow=2)
+        with app.app_context():
+            engine = db.engines[None]
+            with engine.connect() as connection:
+                connection.execute(text('select 1'))
+                stats = get_pool_stats()['primary']
+                self.assertEqual((stats['checked_out'], stats['utilization']), (1, 0.25))
+
+    def test_unlimited_overflow_has_no_utilization(self):
+        app = self._app(max_overflow=-1)
+        with app.app_context():
+            with db.engines[None].connect():
+                stats = get_pool_stats()['primary']
+        self.assertEqual(stats['checked_out'], 1)
+        self.assertIsNone(stats['utilization'])
+
+    def test_events_record_checkouts_holds_and_connections(self):
+        app = self._app(max_overflow=2)
+        with app.app_context():
+            engine = db.engines[None]
+            for _ in range(3):
+                with engine.connect() as connection:
+                    connection.execute(text('select 1'))
+            stats = get_pool_stats()['primary']
+        self.assertEqual(stats['checkouts'], 3)
+        self.assertEqual(stats['connections_opened'], 1)
+        self.assertIsNotNone(stats['hold_p50_ms'])
+        self.assertEqual(stats['timeouts'], 0)
+
+    def test_metrics_survive_dispose(self):
+        app = self._app(max_overflow=2)
+        with app.app_context():
+            engine = db.engines[None]
+            with engine.connect():
+                pass
+            engine.dispose()
+            with engine.connect():
+                pass
+            stats = get_pool_stats()['primary']
+        self.assertEqual((stats['checkouts'], stats['connections_opened']), (2, 2))
+
+    def test_checkout_timeout_is_counted(self):
+        app = self._app(max_overflow=0, pool_timeout=0.05)
+        with app.app_context():
+            engine = db.engines[None]
+            with engine.connect(), engine.connect():
+                with self.assertRaises(exc.TimeoutError):
+                    engine.connect()
+            self.assertEqual(get_pool_stats()['primary']['timeouts'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
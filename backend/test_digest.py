@@ -0,0 +1,233 @@
+"""
+チャンネルダイジェスト（get_recent_uploads, digest_service）のテスト
+
+実行方法:
+    python -m unittest test_digest
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from flask import Flask
+
+from models.channel_digest import ChannelDigest
+from models.video_summary import VideoSummary
+from services.db_service import db
+from services.digest_service import build_digest, get_cached_digest, get_stored_summaries, is_fresh
+from services.youtube_service import YouTubeService
+
+CHANNEL = 'UCchannel'
+
+
+class FakeRequest:
+
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class FakePlaylistItems:
+    """ページトークンごとの応答を返すplaylistItems().list()の代わり"""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def list(self, part, playlistId, maxResults, pageToken=None):
+        self.requested.append(pageToken)
+        return FakeRequest(self.pages[pageToken])
+
+
+class FakeClient:
+
+    def __init__(self, pages):
+        self.playlist_items = FakePlaylistItems(pages)
+
+    def channels(self):
+        return self
+
+    def playlistItems(self):
+        return self.playlist_items
+
+    def list(self, part, id):
+        return FakeRequest({'items': [{'contentDetails': {'relatedPlaylists': {'uploads': 'UUchannel'}}}]})
+
+
+def item(video_id, published_at=None, snippet_published_at=None):
+    content_details = {'videoId': video_id}
+    if published_at:
+        content_details['videoPublishedAt'] = published_at
+    return {
+        'contentDetails': content_details,
+        'snippet': {'title': f'title {video_id}', 'publishedAt': snippet_published_at or published_at}
+    }
+
+
+class RecentUploadsTest(unittest.TestCase):
+
+    def _uploads(self, pages, max_results=200):
+        service = YouTubeService('key')
+        client = FakeClient(pages)
+        service._local.client = client
+        uploads = service.get_recent_uploads(CHANNEL, datetime(2026, 1, 10), max_results=max_results)
+        return uploads, client.playlist_items.requested
+
+    def test_stops_at_first_page_reaching_cutoff(self):
+        pages = {
+            None: {'items': [item('v1', '2026-01-12T00:00:00Z'), item('v2', '2026-01-11T00:00:00Z')],
+                   'nextPageToken': 'p2'},
+            'p2': {'items': [item('v3', '2026-01-10T12:00:00Z'), item('old', '2026-01-09T00:00:00Z')],
+                   'nextPageToken': 'p3'},
+            'p3': {'items': [item('older', '2026-01-01T00:00:00Z')]}
+        }
+        uploads, requested = self._uploads(pages)
+        self.assertEqual([upload['video_id'] for upload in uploads], ['v1', 'v2', 'v3'])
+        self.assertEqual(requested, [None, 'p2'])
+
+    def test_falls_back_to_snippet_published_at(self):
+        pages = {None: {'items': [
+            # 予約公開前などでvideoPublishedAtがない場合は再生リストへの追加日時を使う
+            item('scheduled', snippet_published_at='2026-01-11T00:00:00Z'),
+            item('v1', '2026-01-12T00:00:00Z'),
+            item('old', snippet_published_at='2026-01-09T00:00:00Z')
+        ]}}
+        uploads, _ = self._uploads(pages)
+        self.assertEqual([upload['video_id'] for upload in uploads], ['v1', 'scheduled'])
+        self.assertEqual(uploads[1]['published_at'], '2026-01-11T00:00:00Z')
+
+    def test_max_results(self):
+        pages = {None: {'items': [item(f'v{day}', f'2026-01-{day}T00:00:00Z') for day in range(11, 16)],
+                        'nextPageToken': 'p2'}}
+        uploads, requested = self._uploads(pages, max_results=3)
+        self.assertEqual([upload['video_id'] for upload in uploads], ['v15', 'v14', 'v13'])
+        self.assertEqual(requested, [None])
+
+
+class FakeGemini:
+    """要約とダイジェストの呼び出しを記録するGeminiServiceの代わり"""
+
+    def __init__(self, unavailable=()):
+        self.unavailable = set(unavailable)
+        self.summarized = []
+        self.digests = []
+
+    def generate_summary(self, video_id, youtube_service, language='ja', format_type='json'):
+        self.summarized.append(video_id)
+        if video_id in self.unavailable:
+            return {'error': 'トランスクリプトがありません'}
+        return {'video_id': video_id, 'brief_summary': f'new {video_id}', 'token_count': 100}
+
+    def generate_digest(self, channel_title, summaries, language='ja', window_days=7):
+        self.digests.append([summary['video_id'] for summary in summaries])
+        return {'overview': f'{len(summaries)} videos', 'themes': [], 'highlights': [],
+                'model_id': 'model', 'token_count': 10}
+
+
+class DigestTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory.name, "digest.db")}'
+        db.init_app(self.app)
+
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+
+    def _summary(self, video_id, language='ja', format_type='json', updated_at=datetime(2026, 1, 1)):
+        summary = VideoSummary(video_id=video_id, language=language, format_type=format_type,
+                               brief_summary=f'{video_id} {language} {format_type}', updated_at=updated_at)
+        db.session.add(summary)
+        db.session.commit()
+        return summary
+
+    def _uploads(self, *video_ids):
+        return [{'video_id': video_id, 'title': video_id, 'published_at': '2026-01-10T00:00:00Z'}
+                for video_id in video_ids]
+
+    def _build(self, gemini, uploads, previous=None, max_new=3):
+        return build_digest(CHANNEL, 'Channel', uploads, None, gemini,
+                            language='ja', window_days=7, max_new=max_new, previous=previous)
+
+    def test_one_stored_summary_per_video(self):
+        self._summary('v1', language='en')
+        self._summary('v1', format_type='markdown')
+        ja_json = self._summary('v2', updated_at=datetime(2026, 1, 1))
+        self._summary('v2', language='en', updated_at=datetime(2026, 1, 5))
+        self._summary('v3', language='en', format_type='markdown', updated_at=datetime(2026, 1, 1))
+        en_json = self._summary('v3', language='en', updated_at=datetime(2026, 1, 2))
+
+        stored = get_stored_summaries(['v1', 'v2', 'v3', 'missing'], 'ja')
+        self.assertEqual(sorted(stored), ['v1', 'v2', 'v3'])
+        # 言語が一致するものを優先し、次にJSON形式、新しいものの順
+        self.assertEqual((stored['v1'].language, stored['v1'].format_type), ('ja', 'markdown'))
+        self.assertEqual(stored['v2'].id, ja_json.id)
+        self.assertEqual(stored['v3'].id, en_json.id)
+
+    def test_missing_summaries_are_filled_up_to_max_new(self):
+        self._summary('v2')
+        gemini = FakeGemini()
+        digest, tokens = self._build(gemini, self._uploads('v1', 'v2', 'v3', 'v4'), max_new=1)
+        self.assertEqual(gemini.summarized, ['v1'])
+        self.assertEqual(gemini.digests, [['v1', 'v2']])
+        self.assertEqual(tokens, 110)
+        self.assertEqual(digest.pending_video_ids, ['v3', 'v4'])
+        self.assertFalse(is_fresh(digest, ['v1', 'v2', 'v3', 'v4']))
+
+        # 次のリクエストで残りを補う
+        digest, _ = self._build(gemini, self._uploads('v1', 'v2', 'v3', 'v4'), previous=digest, max_new=3)
+        self.assertEqual(gemini.summarized, ['v1', 'v3', 'v4'])
+        self.assertEqual(digest.summarized_video_ids, ['v1', 'v2', 'v3', 'v4'])
+        self.assertTrue(is_fresh(digest, ['v1', 'v2', 'v3', 'v4']))
+
+    def test_unchanged_summaries_do_not_call_the_model(self):
+        for video_id in ('v1', 'v2'):
+            self._summary(video_id)
+        gemini = FakeGemini()
+        digest, _ = self._build(gemini, self._uploads('v1', 'v2'))
+
+        digest, tokens = self._build(gemini, self._uploads('v1', 'v2'), previous=digest)
+        self.assertEqual(tokens, 0)
+        self.assertEqual(len(gemini.digests), 1)
+        self.assertEqual(ChannelDigest.query.count(), 1)
+
+    def test_new_upload_makes_digest_stale(self):
+        self._summary('v1')
+        gemini = FakeGemini()
+        digest, _ = self._build(gemini, self._uploads('v1'))
+        self.assertTrue(is_fresh(get_cached_digest(CHANNEL, 'ja', 7), ['v1']))
+        self.assertFalse(is_fresh(digest, ['v2', 'v1']))
+
+        digest, _ = self._build(gemini, self._uploads('v2', 'v1'), previous=digest)
+        self.assertEqual(gemini.digests, [['v1'], ['v2', 'v1']])
+        self.assertEqual(digest.video_ids, ['v2', 'v1'])
+
+    def test_unavailable_video_is_not_retried(self):
+        self._summary('v1')
+        gemini = FakeGemini(unavailable=['v2'])
+        digest, _ = self._build(gemini, self._uploads('v1', 'v2'))
+        self.assertEqual(digest.unavailable_video_ids, ['v2'])
+        self.assertTrue(is_fresh(digest, ['v1', 'v2']))
+
+        self._build(gemini, self._uploads('v3', 'v1', 'v2'), previous=digest)
+        self.assertEqual(gemini.summarized, ['v2', 'v3'])
+
+    def test_digests_are_cached_per_window(self):
+        self._summary('v1')
+        digest, _ = self._build(FakeGemini(), self._uploads('v1'))
+        self.assertEqual(get_cached_digest(CHANNEL, 'ja', 7).id, digest.id)
+        self.assertIsNone(get_cached_digest(CHANNEL, 'ja', 30))
+        self.assertIsNone(get_cached_digest(CHANNEL, 'en', 7))
+
+
+if __name__ == '__main__':
+    unittest.main()
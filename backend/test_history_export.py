@@ -0,0 +1,115 @@
+"""
+要約履歴のエクスポート（iter_history_for_export, /api/history/export）のテスト
+
+実行方法:
+    python -m unittest test_history_export
+"""
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from unittest import mock
+
+from flask import Flask
+
+from controllers.history_controller import history_bp
+from models.user_summary_history import UserSummaryHistory
+from models.video_summary import VideoSummary
+from services.db_service import db
+from services.history_service import iter_history_for_export
+
+USER = 'user-1'
+
+
+class HistoryExportTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.app = Flask(__name__)
+        self.app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(directory.name, "history.db")}'
+        db.init_app(self.app)
+        self.app.register_blueprint(history_bp)
+
+        context = self.app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.engine.dispose)
+        self.addCleanup(db.session.remove)
+
+        # 1月1日〜5日に1件ずつ記録した履歴（チャンネルは交互）と、他のユーザーの履歴
+        self.ids = []
+        for day in range(1, 6):
+            summary = VideoSummary(video_id=f'video{day}', channel_id='ch-a' if day % 2 else 'ch-b',
+                                   video_title=f'Video {day}', brief_summary=f'summary {day}')
+            db.session.add(summary)
+            db.session.flush()
+            entry = UserSummaryHistory(user_id=USER, summary_id=summary.id, created_at=datetime(2026, 1, day, 12))
+            db.session.add(entry)
+            db.session.add(UserSummaryHistory(user_id='other', summary_id=summary.id,
+                                              created_at=datetime(2026, 1, day, 12)))
+            db.session.flush()
+            self.ids.append(entry.id)
+        db.session.commit()
+
+        patcher = mock.patch('services.auth_service.auth.verify_id_token', lambda token: {'uid': token})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = self.app.test_client()
+
+    def _videos(self, **kwargs):
+        return [row.video_id for row in iter_history_for_export(USER, batch_size=2, **kwargs)]
+
+    def _export(self, query=''):
+        response = self.client.get(f'/api/history/export{query}', headers={'Authorization': f'Bearer {USER}'})
+        lines = response.get_data(as_text=True).splitlines()
+        return response, [json.loads(line) for line in lines if response.status_code == 200]
+
+    def test_all_history_in_id_order(self):
+        self.assertEqual(self._videos(), ['video1', 'video2', 'video3', 'video4', 'video5'])
+
+    def test_resume_after_history_id(self):
+        self.assertEqual(self._videos(after=self.ids[2]), ['video4', 'video5'])
+        self.assertEqual(self._videos(after=self.ids[-1]), [])
+
+    def test_since_and_until(self):
+        self.assertEqual(self._videos(since=datetime(2026, 1, 2, 12)), ['video2', 'video3', 'video4', 'video5'])
+        # untilは指定した日時を含まない
+        self.assertEqual(self._videos(until=datetime(2026, 1, 3, 12)), ['video1', 'video2'])
+        self.assertEqual(self._videos(since=datetime(2026, 1, 2), until=datetime(2026, 1, 4)), ['video2', 'video3'])
+
+    def test_channel_filter_with_resume(self):
+        self.assertEqual(self._videos(channel_id='ch-a'), ['video1', 'video3', 'video5'])
+        self.assertEqual(self._videos(channel_id='ch-a', after=self.ids[0]), ['video3', 'video5'])
+
+    def test_rows_include_history_columns(self):
+        row = next(iter_history_for_export(USER))
+        self.assertEqual(row.history_id, self.ids[0])
+        self.assertEqual(row.recorded_at, datetime(2026, 1, 1, 12))
+        self.assertEqual(row.brief_summary, 'summary 1')
+
+    def test_endpoint_date_only_until_includes_whole_day(self):
+        response, records = self._export('?since=2026-01-02&until=2026-01-03')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([record['video_id'] for record in records], ['video2', 'video3'])
+
+    def test_endpoint_timezone_aware_dates_are_converted_to_utc(self):
+        # 2026-01-03T21:00+09:00 は 2026-01-03T12:00 UTC
+        _, records = self._export('?since=2026-01-03T21:00:00%2B09:00')
+        self.assertEqual([record['video_id'] for record in records], ['video3', 'video4', 'video5'])
+
+    def test_endpoint_resume_and_channel(self):
+        _, records = self._export(f'?after={self.ids[1]}&channel_id=ch-a')
+        self.assertEqual([record['video_id'] for record in records], ['video3', 'video5'])
+
+    def test_endpoint_invalid_parameters(self):
+        for query in ('?since=yesterday', '?after=x', '?format=csv'):
+            response, _ = self._export(query)
+            self.assertEqual(response.status_code, 400, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+インデックスの増分同期（IncrementalSync）のテスト
+
+実行方法:
+    python -m unittest test_index_sync
+"""
+import unittest
+from datetime import datetime, timedelta
+
+from flask import Flask
+
+from services.index_sync_service import IncrementalSync, IndexLoadingError
+
+T0 = datetime(2026, 1, 1, 12, 0, 0)
+
+
+class FakeIndex(IncrementalSync):
+    """メモリ上の行（キー, updated_at, 値）と同期するインデックス"""
+
+    def __init__(self, overlap_seconds=60):
+        super().__init__('fake', sync_interval=0, overlap_seconds=overlap_seconds)
+        self.committed = {}
+        self.applied = []
+        self.initial_loads = 0
+
+    def commit(self, key, updated_at, value):
+        self.committed[key] = (updated_at, value)
+
+    def _fetch_changes(self, since):
+        return [
+            (key, updated_at, value)
+            for key, (updated_at, value) in self.committed.items()
+            if since is None or updated_at >= since
+        ]
+
+    def _apply_changes(self, payloads, initial):
+        payloads = list(payloads)
+        if initial:
+            self.initial_loads += 1
+        self.applied.extend(payloads)
+
+
+class IncrementalSyncTest(unittest.TestCase):
+
+    def test_initial_load_applies_all_rows(self):
+        index = FakeIndex()
+        index.commit(1, T0, 'a')
+        index.commit(2, T0 + timedelta(seconds=1), 'b')
+        index.sync(force=True)
+        self.assertTrue(index.ready)
+        self.assertEqual(index.initial_loads, 1)
+        self.assertEqual(sorted(index.applied), ['a', 'b'])
+
+    def test_rows_are_not_applied_twice(self):
+        index = FakeIndex()
+        index.commit(1, T0, 'a')
+        index.sync(force=True)
+        index.sync(force=True)
+        self.assertEqual(index.applied, ['a'])
+
+    def test_late_commit_with_earlier_timestamp_is_picked_up(self):
+        index = FakeIndex()
+        index.commit(1, T0 + timedelta(seconds=10), 'a')
+        index.sync(force=True)
+
+        # ウォーターマークより前のupdated_atで遅れてコミットされた行
+        index.commit(2, T0 + timedelta(seconds=5), 'late')
+        index.sync(force=True)
+        self.assertEqual(index.applied, ['a', 'late'])
+
+    def test_row_with_same_timestamp_as_watermark_is_picked_up(self):
+        index = FakeIndex()
+        index.commit(1, T0, 'a')
+        index.sync(force=True)
+        index.commit(2, T0, 'same')
+        index.sync(force=True)
+        self.assertEqual(index.applied, ['a', 'same'])
+
+    def test_updated_row_is_applied_again(self):
+        index = FakeIndex()
+        index.commit(1, T0, 'a')
+        index.sync(force=True)
+        index.commit(1, T0 + timedelta(seconds=1), 'a2')
+        index.sync(force=True)
+        self.assertEqual(index.applied, ['a', 'a2'])
+
+    def test_seen_rows_outside_overlap_are_forgotten(self):
+        index = FakeIndex(overlap_seconds=60)
+        index.commit(1, T0, 'old')
+        index.commit(2, T0 + timedelta(minutes=10), 'new')
+        index.sync(force=True)
+        self.assertEqual(set(index._seen), {2})
+
+    def test_sync_before_load_starts_loading_without_blocking(self):
+        index = FakeIndex()
+        started = []
+        index.start = started.append
+        app = Flask(__name__)
+        with app.app_context():
+            with self.assertRaises(IndexLoadingError):
+                index.sync()
+        self.assertEqual(started, [app])
+        self.assertFalse(index.ready)
+
+    def test_background_load(self):
+        index = FakeIndex()
+        index.commit(1, T0, 'a')
+        index.start(Flask(__name__))
+        index._loader.join(5)
+        self.assertTrue(index.ready)
+        self.assertEqual(index.applied, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+ライブ配信要約の区間分割（pending_segments, split_windows）のテスト
+
+実行方法:
+    python -m unittest test_live_summary
+"""
+import unittest
+
+from services.live_summary_service import pending_segments, split_windows
+
+
+def _segment(start, text, duration=2.0):
+    return {'start': start, 'duration': duration, 'text': text}
+
+
+class PendingSegmentsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.segments = [_segment(0, 'a'), _segment(2.5, 'b'), _segment(5, 'c')]
+
+    def test_all_segments_when_nothing_processed(self):
+        self.assertEqual(pending_segments(self.segments, None), self.segments)
+
+    def test_segments_after_processed_position(self):
+        self.assertEqual(pending_segments(self.segments, 2.5), [self.segments[2]])
+
+    def test_processed_position_zero(self):
+        # 最初のセグメント（開始0秒）だけを要約済みの場合
+        self.assertEqual(pending_segments(self.segments, 0.0), self.segments[1:])
+
+    def test_nothing_new(self):
+        self.assertEqual(pending_segments(self.segments, 5), [])
+
+    def test_string_start(self):
+        self.assertEqual(pending_segments([{'start': '3.0', 'text': 'x'}], 2.5), [{'start': '3.0', 'text': 'x'}])
+
+
+class SplitWindowsTest(unittest.TestCase):
+
+    def test_empty(self):
+        self.assertEqual(split_windows([], 100), [])
+
+    def test_single_window(self):
+        windows = split_windows([_segment(0, 'hello'), _segment(2, ' world ')], 100)
+        self.assertEqual(windows, [{
+            'text': 'hello world',
+            'chars': 12,
+            'start': 0.0,
+            'end': 4.0,
+            'last_start': 2.0,
+            'segment_count': 2
+        }])
+
+    def test_split_at_max_chars(self):
+        segments = [_segment(i * 2, 'x' * 9) for i in range(5)]
+        windows = split_windows(segments, 20)
+        self.assertEqual([window['segment_count'] for window in windows], [2, 2, 1])
+        self.assertEqual([(window['start'], window['last_start']) for window in windows],
+                         [(0.0, 2.0), (4.0, 6.0), (8.0, 8.0)])
+        self.assertTrue(all(window['chars'] <= 20 for window in windows))
+
+    def test_windows_are_contiguous(self):
+        segments = [_segment(i * 2, f'segment{i}') for i in range(20)]
+        windows = split_windows(segments, 40)
+        self.assertEqual(sum(window['segment_count'] for window in windows), 20)
+        self.assertEqual(' '.join(window['text'] for window in windows),
+                         ' '.join(f'segment{i}' for i in range(20)))
+        for previous, window in zip(windows, windows[1:]):
+            self.assertEqual(window['start'], previous['last_start'] + 2)
+
+    def test_long_segment_gets_its_own_window(self):
+        windows = split_windows([_segment(0, 'short'), _segment(2, 'y' * 50), _segment(4, 'tail')], 20)
+        self.assertEqual([window['text'] for window in windows], ['short', 'y' * 50, 'tail'])
+
+    def test_empty_text_segment_advances_position(self):
+        windows = split_windows([_segment(0, 'a'), _segment(2, '', duration=3.0)], 100)
+        self.assertEqual(windows[0]['text'], 'a')
+        self.assertEqual(windows[0]['last_start'], 2.0)
+        self.assertEqual(windows[0]['end'], 5.0)
+        self.assertEqual(windows[0]['segment_count'], 2)
+
+    def test_last_start_resumes_pending_segments(self):
+        segments = [_segment(i * 2, 'x' * 9) for i in range(5)]
+        first = split_windows(segments, 20)[0]
+        remaining = pending_segments(segments, first['last_start'])
+        self.assertEqual(remaining, segments[2:])
+
+
+if __name__ == '__main__':
+    unittest.main()
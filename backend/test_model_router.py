@@ -0,0 +1,149 @@
+"""
+モデルルーティング（ModelRouter）のテスト
+
+実行方法:
+    python -m unittest test_model_router
+"""
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+from services.model_router import MIN_LATENCY_SAMPLES, ModelRouter, estimate_tokens
+
+PRIMARY = 'primary-model'
+FAST = 'fast-model'
+
+
+class EstimateTokensTest(unittest.TestCase):
+
+    def test_latin_text(self):
+        self.assertEqual(estimate_tokens('a' * 40), 10)
+
+    def test_cjk_text(self):
+        self.assertEqual(estimate_tokens('日本語のテキスト'), 8)
+        self.assertEqual(estimate_tokens('日本語 abcd'), 4)
+
+
+class ModelRouterTest(unittest.TestCase):
+
+    def _router(self, **env):
+        with mock.patch.dict(os.environ, env):
+            return ModelRouter(primary_model=PRIMARY, fast_model=FAST)
+
+    def _record(self, router, model_id, seconds):
+        for _ in range(MIN_LATENCY_SAMPLES):
+            router._stats_for(model_id).record(seconds)
+
+    def test_choose_model_by_prompt_size_and_format(self):
+        router = self._router(GEMINI_FAST_MAX_TOKENS='1000', GEMINI_FAST_MAX_TOKENS_MARKDOWN='100')
+        self.assertEqual(router.choose_model(1000, 'json'), FAST)
+        self.assertEqual(router.choose_model(1001, 'json'), PRIMARY)
+        self.assertEqual(router.choose_model(500, 'markdown'), PRIMARY)
+        self.assertEqual(router.choose_model(100, 'markdown'), FAST)
+
+    def test_unknown_format_uses_json_limit(self):
+        router = self._router(GEMINI_FAST_MAX_TOKENS='1000')
+        self.assertEqual(router.choose_model(500, 'text'), FAST)
+
+    def test_model_breaching_slo_is_avoided(self):
+        router = self._router(GEMINI_LATENCY_SLO_SECONDS='1')
+        self._record(router, FAST, 5.0)
+        self.assertEqual(router.choose_model(10), PRIMARY)
+
+    def test_no_fallback_when_both_models_breach_slo(self):
+        router = self._router(GEMINI_LATENCY_SLO_SECONDS='1')
+        self._record(router, FAST, 5.0)
+        self._record(router, PRIMARY, 5.0)
+        self.assertEqual(router.choose_model(10), FAST)
+
+    def test_too_few_samples_do_not_trigger_fallback(self):
+        router = self._router(GEMINI_LATENCY_SLO_SECONDS='1')
+        router._stats_for(FAST).record(5.0)
+        self.assertEqual(router.choose_model(10), FAST)
+
+    def test_demoted_model_gets_traffic_again_after_samples_age_out(self):
+        router = self._router(GEMINI_LATENCY_SLO_SECONDS='1', GEMINI_LATENCY_WINDOW_SECONDS='300',
+                              GEMINI_FAST_MAX_TOKENS='100')
+        with mock.patch('services.model_router.time.monotonic', return_value=1000.0):
+            self._record(router, PRIMARY, 5.0)
+            self.assertEqual(router.choose_model(1000), FAST)
+
+        # 高速モデルに切り替えている間、標準モデルには新しいサンプルが記録されない
+        with mock.patch('services.model_router.time.monotonic', return_value=1299.0):
+            self.assertEqual(router.choose_model(1000), FAST)
+        with mock.patch('services.model_router.time.monotonic', return_value=1301.0):
+            self.assertIsNone(router._stats_for(PRIMARY).percentile(95))
+            self.assertEqual(router.choose_model(1000), PRIMARY)
+            result = router.execute(lambda model: 'ok', 1000)
+        self.assertEqual(result, ('ok', PRIMARY, False))
+
+    def test_execute_records_latency_and_errors(self):
+        router = self._router()
+        result, model_id, hedged = router.execute(lambda model: f'ok:{model}', 10)
+        self.assertEqual((result, model_id, hedged), (f'ok:{FAST}', FAST, False))
+
+        def fail(model):
+            raise RuntimeError('error')
+
+        with self.assertRaises(RuntimeError):
+            router.execute(fail, 10)
+        self.assertEqual(router.snapshot()['models'][FAST]['count'], 2)
+        self.assertEqual(router.snapshot()['models'][FAST]['errors'], 1)
+
+    def test_pinned_model_skips_routing_and_hedging(self):
+        router = self._router(GEMINI_HEDGE_ENABLED='true', GEMINI_HEDGE_DEFAULT_DELAY_SECONDS='0')
+        calls = []
+
+        def call(model):
+            calls.append(model)
+            time.sleep(0.05)
+            return 'ok'
+
+        result = router.execute(call, 10, model_id=PRIMARY)
+        self.assertEqual(result, ('ok', PRIMARY, False))
+        self.assertEqual(calls, [PRIMARY])
+        self.assertEqual(router.hedges_issued, 0)
+
+    def test_hedge_wins_when_primary_is_slow(self):
+        router = self._router(GEMINI_HEDGE_ENABLED='true', GEMINI_HEDGE_DEFAULT_DELAY_SECONDS='0.05',
+                              GEMINI_FAST_MAX_TOKENS='0')
+        release = threading.Event()
+
+        def call(model):
+            if model == PRIMARY:
+                release.wait(5)
+            return f'ok:{model}'
+
+        try:
+            result = router.execute(call, 10)
+        finally:
+            release.set()
+        self.assertEqual(result, (f'ok:{FAST}', FAST, True))
+        self.assertEqual((router.hedges_issued, router.hedges_won), (1, 1))
+
+    def test_hedge_budget_limits_extra_requests(self):
+        router = self._router(GEMINI_HEDGE_ENABLED='true', GEMINI_HEDGE_MAX_PROMPT_TOKENS='100',
+                              GEMINI_HEDGE_TOKEN_BUDGET_PER_MINUTE='150')
+        self.assertFalse(router._reserve_hedge_budget(101))
+        self.assertTrue(router._reserve_hedge_budget(100))
+        self.assertFalse(router._reserve_hedge_budget(100))
+        self.assertTrue(router._reserve_hedge_budget(50))
+        self.assertEqual(router.hedges_issued, 2)
+
+    def test_hedge_budget_window_expires(self):
+        router = self._router(GEMINI_HEDGE_ENABLED='true', GEMINI_HEDGE_TOKEN_BUDGET_PER_MINUTE='100')
+        with mock.patch('services.model_router.time.monotonic', return_value=1000.0):
+            self.assertTrue(router._reserve_hedge_budget(100))
+        with mock.patch('services.model_router.time.monotonic', return_value=1061.0):
+            self.assertTrue(router._reserve_hedge_budget(100))
+
+    def test_no_hedge_when_hedge_model_is_selected_model(self):
+        router = self._router(GEMINI_HEDGE_ENABLED='true', GEMINI_HEDGE_DEFAULT_DELAY_SECONDS='0')
+        self.assertEqual(router.execute(lambda model: 'ok', 10), ('ok', FAST, False))
+        self.assertEqual(router.hedges_issued, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+関連ビデオのTF-IDFインデックス（TfidfIndex）のテスト
+
+実行方法:
+    python -m unittest test_related
+"""
+import unittest
+
+import services.related_service as related_service
+from services.related_service import TfidfIndex
+
+DOCUMENTS = {
+    'py1': 'python programming tutorial for beginners python basics',
+    'py2': 'advanced python programming decorators generators',
+    'cook': 'cooking curry recipe with rice and spices',
+    'curry': 'easy curry recipe spices onion rice',
+    'guitar': 'guitar chords lesson for beginners'
+}
+
+
+class TfidfIndexTest(unittest.TestCase):
+
+    def _index(self, documents=DOCUMENTS):
+        index = TfidfIndex(n_features=2 ** 12)
+        for doc_id, text in documents.items():
+            index.add_document(doc_id, text)
+        return index
+
+    def _related_ids(self, index, doc_id, k=10):
+        return [other for other, _ in index.most_similar(doc_id, k=k)]
+
+    def test_most_similar_ranks_shared_terms_first(self):
+        index = self._index()
+        self.assertEqual(self._related_ids(index, 'py1', k=1), ['py2'])
+        self.assertEqual(self._related_ids(index, 'cook', k=1), ['curry'])
+
+    def test_query_document_and_unrelated_documents_are_excluded(self):
+        index = self._index()
+        related = self._related_ids(index, 'curry')
+        self.assertNotIn('curry', related)
+        self.assertNotIn('py1', related)
+
+    def test_unknown_document(self):
+        index = self._index()
+        self.assertEqual(index.most_similar('missing'), [])
+        self.assertEqual(index.most_similar_many(['missing']), {})
+
+    def test_removed_document_is_not_returned(self):
+        index = self._index()
+        index.most_similar('py1')
+        index.remove('py2')
+        self.assertEqual(len(index), 4)
+        self.assertNotIn('py2', self._related_ids(index, 'py1'))
+        self.assertEqual(index.most_similar('py2'), [])
+
+    def test_replaced_document_uses_new_text(self):
+        index = self._index()
+        index.add_document('guitar', 'curry recipe with spices')
+        self.assertEqual(len(index), 5)
+        self.assertIn('guitar', self._related_ids(index, 'curry', k=2))
+
+    def test_compaction_drops_removed_rows(self):
+        index = self._index()
+        index.most_similar('py1')
+        for doc_id in ('cook', 'guitar'):
+            index.remove(doc_id)
+
+        # 削除済み行の割合がCOMPACTION_RATIOを超えているため、次の検索で詰め直される
+        self.assertEqual(self._related_ids(index, 'py1', k=1), ['py2'])
+        self.assertEqual(index._matrix.shape[0], 3)
+        self.assertEqual(index.doc_ids, ['py1', 'py2', 'curry'])
+        self.assertEqual(index.rows, {'py1': 0, 'py2': 1, 'curry': 2})
+        self.assertTrue(index.active.all())
+
+    def test_compaction_keeps_document_frequencies(self):
+        index = self._index()
+        index.remove('cook')
+        index.remove('guitar')
+        index.most_similar('py1')
+        expected = self._index({doc_id: DOCUMENTS[doc_id] for doc_id in ('py1', 'py2', 'curry')}).doc_freq
+        self.assertEqual(index.doc_freq.tolist(), expected.tolist())
+
+    def test_added_rows_go_to_delta_then_merge(self):
+        # ドキュメント数の増加がREWEIGHT_RATIO以下になるよう、無関係なドキュメントを加える
+        filler = {f'filler{i}': f'topic{i} words{i}' for i in range(20)}
+        index = self._index({**DOCUMENTS, **filler})
+        index.most_similar('py1')
+        base_rows = index._weighted.shape[0]
+
+        index.add_document('py3', 'python programming tips')
+        self.assertIn('py3', self._related_ids(index, 'py1'))
+        self.assertEqual(index._weighted.shape[0], base_rows)
+        self.assertEqual(index._delta.shape[0], 1)
+        self.assertEqual(self._related_ids(index, 'py3', k=1)[0][:2], 'py')
+
+        original = related_service.DELTA_MERGE_ROWS
+        related_service.DELTA_MERGE_ROWS = 1
+        try:
+            index.add_document('py4', 'python programming basics')
+            index.most_similar('py1')
+        finally:
+            related_service.DELTA_MERGE_ROWS = original
+        self.assertIsNone(index._delta)
+        self.assertEqual(index._weighted.shape[0], base_rows + 2)
+
+    def test_results_match_full_rebuild(self):
+        index = self._index()
+        index.most_similar('py1')
+        index.remove('guitar')
+        index.add_document('guitar', 'guitar lesson for beginners chords')
+
+        rebuilt = self._index({**{k: v for k, v in DOCUMENTS.items() if k != 'guitar'},
+                               'guitar': 'guitar lesson for beginners chords'})
+        self.assertEqual(self._related_ids(index, 'py1'), self._related_ids(rebuilt, 'py1'))
+
+
+if __name__ == '__main__':
+    unittest.main()
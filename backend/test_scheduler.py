@@ -0,0 +1,124 @@
+"""
+要約スケジューラー（FairScheduler）のテスト
+
+実行方法:
+    python -m unittest test_scheduler
+"""
+import threading
+import time
+import unittest
+
+from services.scheduler_service import FairScheduler, QueueTimeoutError
+
+
+class FairSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = FairScheduler(max_concurrent=1, queue_timeout=5)
+        self.order = []
+        self.threads = []
+        # 実行枠を1つ占有し、以降のリクエストをキューに入れる
+        self.blocker = self.scheduler.acquire('blocker')
+
+    def tearDown(self):
+        if self.blocker is not None:
+            self.scheduler.release(self.blocker)
+        for thread in self.threads:
+            thread.join(5)
+
+    def _enqueue(self, user_id, weight=1, hold=None):
+        """別のスレッドでリクエストをキューに入れ、キューに入るまで待ちます。"""
+        def run():
+            with self.scheduler.slot(user_id, weight=weight):
+                self.order.append(user_id)
+                if hold is not None:
+                    hold.wait(5)
+
+        waiting = self.scheduler.snapshot()['waiting']
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        self._wait_until(lambda: self.scheduler.snapshot()['waiting'] > waiting)
+
+    def _wait_until(self, condition):
+        deadline = time.monotonic() + 5
+        while not condition():
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.001)
+
+    def _drain(self):
+        """占有していた実行枠を解放し、キューのリクエストがすべて実行されるまで待ちます。"""
+        self.scheduler.release(self.blocker)
+        self.blocker = None
+        for thread in self.threads:
+            thread.join(5)
+
+    def test_round_robin_between_users(self):
+        for user_id in ['a', 'a', 'a', 'b', 'c']:
+            self._enqueue(user_id)
+        self._drain()
+        self.assertEqual(self.order, ['a', 'b', 'c', 'a', 'a'])
+
+    def test_weight_gives_more_slots_per_round(self):
+        for user_id, weight in [('a', 2), ('a', 2), ('a', 2), ('b', 1), ('b', 1)]:
+            self._enqueue(user_id, weight=weight)
+        self._drain()
+        self.assertEqual(self.order, ['a', 'a', 'b', 'a', 'b'])
+
+    def test_position_at_enqueue_estimate(self):
+        for user_id in ['a', 'a', 'b']:
+            self._enqueue(user_id)
+        with self.scheduler._lock:
+            # aの3件目はbの1件目の後、新しいユーザーcの1件目はa・bの1件目の後に回る
+            self.assertEqual(self.scheduler._estimate_position('a'), 4)
+            self.assertEqual(self.scheduler._estimate_position('c'), 3)
+
+    def test_live_positions_follow_dispatch_order(self):
+        for user_id in ['a', 'a', 'a', 'b', 'c']:
+            self._enqueue(user_id)
+
+        status = self.scheduler.queue_status('a')
+        self.assertEqual(status['waiting'], 3)
+        self.assertEqual(status['positions'], [1, 4, 5])
+        self.assertEqual(status['position'], 1)
+        self.assertEqual(self.scheduler.queue_status('b')['positions'], [2])
+        self.assertEqual(self.scheduler.queue_status('c')['positions'], [3])
+        self.assertIsNone(self.scheduler.queue_status('d')['position'])
+
+    def test_live_position_moves_forward(self):
+        hold = threading.Event()
+        self._enqueue('a', hold=hold)
+        self._enqueue('b')
+        self.assertEqual(self.scheduler.queue_status('b')['position'], 2)
+
+        # aに実行枠が割り当てられると、bの順番が1つ進む
+        self.scheduler.release(self.blocker)
+        self.blocker = None
+        self._wait_until(lambda: self.scheduler.queue_status('a')['running'] == 1)
+        self.assertEqual(self.scheduler.queue_status('b')['position'], 1)
+
+        hold.set()
+        for thread in self.threads:
+            thread.join(5)
+        self.assertEqual(self.order, ['a', 'b'])
+        self.assertIsNone(self.scheduler.queue_status('b')['position'])
+
+    def test_queue_timeout_removes_ticket(self):
+        self.scheduler.queue_timeout = 0.05
+        with self.assertRaises(QueueTimeoutError):
+            self.scheduler.acquire('a')
+        self.assertEqual(self.scheduler.snapshot(), {
+            'running': 1, 'waiting': 0, 'waiting_users': 0, 'max_concurrent': 1
+        })
+
+    def test_release_frees_slot(self):
+        self.scheduler.release(self.blocker)
+        self.blocker = None
+        self.assertEqual(self.scheduler.snapshot()['running'], 0)
+        ticket = self.scheduler.acquire('a')
+        self.assertEqual(ticket.to_dict()['position_at_enqueue'], 1)
+        self.scheduler.release(ticket)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+ライブラリ検索のトークン化とBM25ランキングのテスト
+
+実行方法:
+    python -m unittest test_search
+"""
+import unittest
+
+from services.search_service import SearchIndex, highlight_snippet, tokenize
+
+
+class TokenizeTest(unittest.TestCase):
+
+    def test_words_are_lowercased(self):
+        self.assertEqual(tokenize('Hello, World'), ['hello', 'world'])
+
+    def test_fullwidth_characters_are_normalized(self):
+        self.assertEqual(tokenize('ＰＹＴＨＯＮ３'), ['python3'])
+
+    def test_cjk_runs_become_bigrams(self):
+        self.assertEqual(tokenize('機械学習'), ['機械', '械学', '学習'])
+
+    def test_single_cjk_character_is_kept(self):
+        self.assertEqual(tokenize('猫 cat'), ['猫', 'cat'])
+
+    def test_mixed_text(self):
+        self.assertEqual(tokenize('Pythonで機械学習'), ['python', 'で機', '機械', '械学', '学習'])
+
+    def test_empty_text(self):
+        self.assertEqual(tokenize(None), [])
+        self.assertEqual(tokenize(''), [])
+
+
+class SearchIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add_document('a', {'title': 'Python入門', 'transcript': 'pythonの基本を学びます'})
+        self.index.add_document('b', {'title': '料理の基本', 'transcript': 'カレーの作り方 python'})
+        self.index.add_document('c', {'title': 'ギター講座', 'transcript': 'コードの押さえ方'})
+
+    def test_title_match_ranks_above_transcript_match(self):
+        results = self.index.search('python')
+        self.assertEqual([result['video_id'] for result in results], ['a', 'b'])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_cjk_query(self):
+        results = self.index.search('カレー')
+        self.assertEqual([result['video_id'] for result in results], ['b'])
+
+    def test_single_cjk_character_query_is_expanded(self):
+        scores = self.index.score('料')
+        self.assertEqual(set(scores), {'b'})
+
+    def test_rare_term_has_higher_idf(self):
+        # 「基本」は2件、「ギター」は1件のドキュメントにのみ含まれる
+        common = self.index.score('基本')
+        rare = self.index.score('ギター')
+        self.assertGreater(rare['c'], max(common.values()))
+
+    def test_no_match(self):
+        self.assertEqual(self.index.search('javascript'), [])
+        self.assertEqual(SearchIndex().search('python'), [])
+
+    def test_replacing_document_updates_postings(self):
+        self.index.add_document('a', {'title': 'JavaScript入門'})
+        self.assertEqual(len(self.index), 3)
+        self.assertEqual([result['video_id'] for result in self.index.search('python')], ['b'])
+        self.assertEqual([result['video_id'] for result in self.index.search('javascript')], ['a'])
+
+    def test_remove_document(self):
+        total_length = self.index.total_length
+        length = self.index.documents['c']['length']
+        self.index.remove_document('c')
+        self.index.remove_document('missing')
+        self.assertEqual(len(self.index), 2)
+        self.assertNotIn('ギタ', self.index.postings)
+        self.assertAlmostEqual(self.index.total_length, total_length - length)
+
+    def test_result_contains_metadata_and_snippet(self):
+        self.index.add_document('d', {'title': 'Rust', 'summary': 'rustの所有権'}, metadata={'channel': 'x'})
+        result = self.index.search('rust')[0]
+        self.assertEqual(result['channel'], 'x')
+        self.assertEqual(result['matched_in'], 'title')
+        self.assertEqual(result['snippet'], '<mark>Rust</mark>')
+
+
+class HighlightSnippetTest(unittest.TestCase):
+
+    def test_match_is_marked_and_escaped(self):
+        snippet = highlight_snippet('<b>Python</b> tips', ['python'])
+        self.assertEqual(snippet, '&lt;b&gt;<mark>Python</mark>&lt;/b&gt; tips')
+
+    def test_long_text_is_trimmed_around_first_match(self):
+        text = 'a' * 100 + 'python' + 'b' * 200
+        snippet = highlight_snippet(text, ['python'], radius=10)
+        self.assertTrue(snippet.startswith('…'))
+        self.assertTrue(snippet.endswith('…'))
+        self.assertIn('<mark>python</mark>', snippet)
+
+    def test_no_match(self):
+        self.assertIsNone(highlight_snippet('hello', ['python']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+"""
+YouTube検索のページング（SearchPager）と検索カーソルのテスト
+
+実行方法:
+    python -m unittest test_search_pager
+"""
+import threading
+import unittest
+from unittest import mock
+
+import services.search_page_service as search_page_service
+from services.circuit_breaker import CLOSED, OPEN
+from services.search_page_service import (
+    PAGE_QUOTA_UNITS, InvalidCursorError, SearchPager, decode_search_cursor, encode_search_cursor
+)
+
+PARAMS = {'query': 'python', 'max_results': 10, 'channel_id': None, 'published_after': None}
+
+
+class FakeYouTube:
+    """search_videosの呼び出しを記録するYouTubeServiceの代わり"""
+
+    def __init__(self, release=None, fail=False):
+        self.calls = []
+        self.release = release
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def search_videos(self, query, max_results, channel_id=None, published_after=None, page_token=None):
+        with self._lock:
+            self.calls.append(page_token)
+        if self.release is not None:
+            self.release.wait(5)
+        if self.fail:
+            raise RuntimeError('quota exceeded')
+        return {'videos': [f'{query}:{page_token}'], 'next_page_token': f'{page_token or "p1"}+'}
+
+
+class SearchCursorTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        cursor = encode_search_cursor({**PARAMS, 'query': '日本語', 'extra': 'ignored'}, 'TOKEN')
+        params, page_token = decode_search_cursor(cursor)
+        self.assertEqual(params, {**PARAMS, 'query': '日本語'})
+        self.assertEqual(page_token, 'TOKEN')
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', encode_search_cursor({'query': ''}, 'TOKEN'), 'W10'):
+            with self.assertRaises(InvalidCursorError):
+                decode_search_cursor(cursor)
+
+
+class SearchPagerTest(unittest.TestCase):
+
+    def setUp(self):
+        breaker = mock.Mock(state=CLOSED)
+        patcher = mock.patch.object(search_page_service, 'youtube_breaker', breaker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = breaker
+
+    def _pager(self, **kwargs):
+        options = {'max_entries': 8, 'ttl': 300, 'workers': 1, 'quota_units_per_hour': PAGE_QUOTA_UNITS * 10}
+        options.update(kwargs)
+        pager = SearchPager(**options)
+        pager.enabled = True
+        self.addCleanup(pager._executor.shutdown)
+        return pager
+
+    def test_first_page_is_fetched_directly(self):
+        pager = self._pager()
+        youtube = FakeYouTube()
+        result, prefetched = pager.fetch_page(youtube, PARAMS)
+        self.assertFalse(prefetched)
+        self.assertEqual(youtube.calls, [None])
+        self.assertEqual(pager.snapshot()['misses'], 0)
+
+    def test_prefetched_page_is_served_once(self):
+        pager = self._pager()
+        youtube = FakeYouTube()
+        pager.prefetch(youtube, PARAMS, 'p2')
+        result, prefetched = pager.fetch_page(youtube, PARAMS, 'p2')
+        self.assertTrue(prefetched)
+        self.assertEqual(result['videos'], ['python:p2'])
+        self.assertEqual(youtube.calls, ['p2'])
+
+        # 一度返したページはキャッシュから削除される
+        _, prefetched = pager.fetch_page(youtube, PARAMS, 'p2')
+        self.assertFalse(prefetched)
+        self.assertEqual(youtube.calls, ['p2', 'p2'])
+        self.assertEqual((pager.hits, pager.misses), (1, 1))
+
+    def test_request_during_prefetch_waits_for_same_call(self):
+        pager = self._pager()
+        release = threading.Event()
+        youtube = FakeYouTube(release=release)
+        pager.prefetch(youtube, PARAMS, 'p2')
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(pager.fetch_page(youtube, PARAMS, 'p2')))
+        thread.start()
+        release.set()
+        thread.join(5)
+        self.assertEqual(results[0][1], True)
+        self.assertEqual(youtube.calls, ['p2'])
+
+    def test_other_params_do_not_share_pages(self):
+        pager = self._pager()
+        youtube = FakeYouTube()
+        pager.prefetch(youtube, PARAMS, 'p2')
+        _, prefetched = pager.fetch_page(youtube, {**PARAMS, 'channel_id': 'UC1'}, 'p2')
+        self.assertFalse(prefetched)
+
+    def test_duplicate_prefetch_is_ignored(self):
+        pager = self._pager()
+        youtube = FakeYouTube()
+        pager.prefetch(youtube, PARAMS, 'p2')
+        pager.prefetch(youtube, PARAMS, 'p2')
+        self.assertEqual(pager.issued, 1)
+
+    def test_quota_limits_prefetch(self):
+        pager = self._pager(quota_units_per_hour=PAGE_QUOTA_UNITS * 2)
+        youtube = FakeYouTube()
+        for page_token in ('p2', 'p3', 'p4'):
+            pager.prefetch(youtube, PARAMS, page_token)
+        snapshot = pager.snapshot()
+        self.assertEqual((snapshot['issued'], snapshot['skipped_quota']), (2, 1))
+        self.assertEqual(snapshot['quota_units_last_hour'], PAGE_QUOTA_UNITS * 2)
+
+    def test_quota_window_expires(self):
+        pager = self._pager(quota_units_per_hour=PAGE_QUOTA_UNITS)
+        youtube = FakeYouTube()
+        with mock.patch.object(search_page_service.time, 'monotonic', return_value=1000.0):
+            pager.prefetch(youtube, PARAMS, 'p2')
+            pager.prefetch(youtube, PARAMS, 'p3')
+        with mock.patch.object(search_page_service.time, 'monotonic', return_value=4601.0):
+            pager.prefetch(youtube, PARAMS, 'p3')
+        self.assertEqual((pager.issued, pager.skipped_quota), (2, 1))
+
+    def test_no_prefetch_while_circuit_is_not_closed(self):
+        pager = self._pager()
+        self.breaker.state = OPEN
+        pager.prefetch(FakeYouTube(), PARAMS, 'p2')
+        self.assertEqual((pager.issued, pager.skipped_circuit), (0, 1))
+
+    def test_failed_prefetch_is_fetched_again(self):
+        pager = self._pager()
+        pager.prefetch(FakeYouTube(fail=True), PARAMS, 'p2')
+        youtube = FakeYouTube()
+        with mock.patch('builtins.print'):
+            result, prefetched = pager.fetch_page(youtube, PARAMS, 'p2')
+        self.assertFalse(prefetched)
+        self.assertEqual(youtube.calls, ['p2'])
+
+    def test_expired_page_is_not_used(self):
+        pager = self._pager(ttl=60)
+        youtube = FakeYouTube()
+        with mock.patch.object(search_page_service.time, 'monotonic', return_value=1000.0):
+            pager.prefetch(youtube, PARAMS, 'p2')
+        pager._executor.submit(lambda: None).result()
+        with mock.patch.object(search_page_service.time, 'monotonic', return_value=1061.0):
+            _, prefetched = pager.fetch_page(youtube, PARAMS, 'p2')
+        self.assertFalse(prefetched)
+
+    def test_oldest_page_is_evicted(self):
+        pager = self._pager(max_entries=2)
+        youtube = FakeYouTube()
+        for page_token in ('p2', 'p3', 'p4'):
+            pager.prefetch(youtube, PARAMS, page_token)
+        self.assertEqual(pager.snapshot()['cached_pages'], 2)
+        _, prefetched = pager.fetch_page(youtube, PARAMS, 'p2')
+        self.assertFalse(prefetched)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+"""
+トランスクリプト先読み（TranscriptPrefetcher）のテスト
+
+実行方法:
+    python -m unittest test_transcript_prefetch
+"""
+import threading
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import services.transcript_prefetch_service as transcript_prefetch_service
+from services.circuit_breaker import CLOSED, OPEN
+from services.transcript_prefetch_service import PREFETCH_LANGUAGE_CODES, TranscriptPrefetcher
+
+
+class FakeTranscriptCache:
+
+    def __init__(self, cached=()):
+        self.cached = set(cached)
+
+    def get(self, video_id, language_codes):
+        return {'success': True} if video_id in self.cached else None
+
+
+class FakeYouTube:
+    """get_transcriptの呼び出しを記録するYouTubeServiceの代わり"""
+
+    def __init__(self, cached=(), release=None, success=True):
+        self.transcript_cache = FakeTranscriptCache(cached)
+        self.release = release
+        self.success = success
+        self.calls = []
+
+    def get_transcript(self, video_id, language_codes=None):
+        self.calls.append((video_id, language_codes))
+        if self.release is not None:
+            self.release.wait(5)
+        return {'success': self.success}
+
+
+class TranscriptPrefetcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = Flask(__name__)
+        self.breaker = mock.Mock(state=CLOSED)
+        self.queue_depth = {'summarize': 0, 'search': 0}
+        controllers = {
+            name: mock.Mock(snapshot=lambda name=name: {'queue_depth': self.queue_depth[name]})
+            for name in self.queue_depth
+        }
+        for patcher in (mock.patch.object(transcript_prefetch_service, 'transcript_breaker', self.breaker),
+                        mock.patch.object(transcript_prefetch_service, 'admission_controllers', controllers)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _prefetcher(self, **kwargs):
+        options = {'top_n': 3, 'workers': 1, 'max_pending': 16, 'max_unused': 100, 'ttl': 300, 'wait_seconds': 5}
+        options.update(kwargs)
+        prefetcher = TranscriptPrefetcher(**options)
+        self.addCleanup(prefetcher._executor.shutdown)
+        return prefetcher
+
+    def _drain(self, prefetcher):
+        prefetcher._executor.submit(lambda: None).result()
+
+    def test_top_results_are_prefetched(self):
+        prefetcher = self._prefetcher(top_n=2)
+        youtube = FakeYouTube()
+        prefetcher.schedule(self.app, youtube, ['v1', 'v2', 'v3'])
+        self._drain(prefetcher)
+        self.assertEqual(youtube.calls, [('v1', PREFETCH_LANGUAGE_CODES), ('v2', PREFETCH_LANGUAGE_CODES)])
+        self.assertEqual(prefetcher.snapshot()['unused'], 2)
+
+    def test_claim_of_fetched_transcript(self):
+        prefetcher = self._prefetcher()
+        prefetcher.schedule(self.app, FakeYouTube(), ['v1', 'v2'])
+        self._drain(prefetcher)
+        self.assertTrue(prefetcher.claim('v1'))
+        # 一度使った先読みは再び数えない
+        self.assertFalse(prefetcher.claim('v1'))
+        self.assertFalse(prefetcher.claim('unknown'))
+
+        snapshot = prefetcher.snapshot()
+        self.assertEqual((snapshot['hits'], snapshot['late_hits']), (1, 0))
+        self.assertEqual((snapshot['precision'], snapshot['coverage']), (0.5, round(1 / 3, 3)))
+
+    def test_claim_waits_for_inflight_prefetch(self):
+        prefetcher = self._prefetcher()
+        release = threading.Event()
+        youtube = FakeYouTube(release=release)
+        prefetcher.schedule(self.app, youtube, ['v1'], top_n=1)
+
+        results = []
+        thread = threading.Thread(target=lambda: results.append(prefetcher.claim('v1')))
+        thread.start()
+        release.set()
+        thread.join(5)
+        self.assertEqual(results, [True])
+        self.assertEqual(len(youtube.calls), 1)
+        self.assertEqual((prefetcher.hits, prefetcher.late_hits), (1, 1))
+
+    def test_claim_gives_up_after_wait_seconds(self):
+        prefetcher = self._prefetcher(wait_seconds=0.05)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        prefetcher.schedule(self.app, FakeYouTube(release=release), ['v1'], top_n=1)
+        self.assertFalse(prefetcher.claim('v1'))
+
+    def test_failed_prefetch_is_not_a_hit(self):
+        prefetcher = self._prefetcher()
+        prefetcher.schedule(self.app, FakeYouTube(success=False), ['v1'], top_n=1)
+        self.assertFalse(prefetcher.claim('v1'))
+        self.assertEqual(prefetcher.failed, 1)
+
+    def test_cached_transcript_is_not_fetched(self):
+        prefetcher = self._prefetcher()
+        youtube = FakeYouTube(cached=['v1'])
+        prefetcher.schedule(self.app, youtube, ['v1'], top_n=1)
+        self._drain(prefetcher)
+        self.assertEqual(youtube.calls, [])
+        self.assertEqual(prefetcher.already_cached, 1)
+
+    def test_no_prefetch_without_transcript_cache(self):
+        prefetcher = self._prefetcher()
+        youtube = FakeYouTube()
+        youtube.transcript_cache = None
+        prefetcher.schedule(self.app, youtube, ['v1'])
+        self.assertEqual(prefetcher.issued, 0)
+
+    def test_skipped_while_overloaded(self):
+        prefetcher = self._prefetcher()
+        self.queue_depth['summarize'] = 1
+        prefetcher.schedule(self.app, FakeYouTube(), ['v1'], top_n=1)
+        self.queue_depth['summarize'] = 0
+        self.breaker.state = OPEN
+        prefetcher.schedule(self.app, FakeYouTube(), ['v2'], top_n=1)
+        self.assertEqual((prefetcher.issued, prefetcher.skipped_load), (0, 2))
+
+    def test_queued_prefetch_is_cancelled_when_overloaded(self):
+        prefetcher = self._prefetcher()
+        release = threading.Event()
+        youtube = FakeYouTube(release=release)
+        prefetcher.schedule(self.app, youtube, ['v1', 'v2'], top_n=2)
+        # v1の取得中に混雑した場合、実行待ちのv2は開始時に取り消される
+        self.queue_depth['search'] = 1
+        release.set()
+        self._drain(prefetcher)
+        self.assertEqual([video_id for video_id, _ in youtube.calls], ['v1'])
+        self.assertEqual(prefetcher.cancelled, 1)
+
+    def test_unused_limit(self):
+        prefetcher = self._prefetcher(max_unused=1)
+        youtube = FakeYouTube()
+        prefetcher.schedule(self.app, youtube, ['v1'], top_n=1)
+        self._drain(prefetcher)
+        prefetcher.schedule(self.app, youtube, ['v2'], top_n=1)
+        self.assertEqual((prefetcher.issued, prefetcher.skipped_full), (1, 1))
+
+    def test_pending_limit(self):
+        prefetcher = self._prefetcher(max_pending=1)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        prefetcher.schedule(self.app, FakeYouTube(release=release), ['v1', 'v2'], top_n=2)
+        self.assertEqual((prefetcher.issued, prefetcher.skipped_full), (1, 1))
+
+    def test_expired_prefetch_is_wasted(self):
+        prefetcher = self._prefetcher(ttl=60)
+        with mock.patch.object(transcript_prefetch_service.time, 'monotonic', return_value=1000.0):
+            prefetcher.schedule(self.app, FakeYouTube(), ['v1'], top_n=1)
+            self._drain(prefetcher)
+        with mock.patch.object(transcript_prefetch_service.time, 'monotonic', return_value=1061.0):
+            self.assertFalse(prefetcher.claim('v1'))
+        self.assertEqual(prefetcher.snapshot()['wasted'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()